@@ -1,6 +1,10 @@
 import sys
+
+# 最先导入，开始记录启动耗时
+import wechat.startup as startup
 from ctypes import windll
 
+from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QApplication
 
 from view.main_window import MainWindow
@@ -13,7 +17,11 @@ except ImportError:
     pass
 
 if __name__ == "__main__":
+    startup.mark("imports")
     app = QApplication()
     window = MainWindow()
+    startup.mark("ui_setup")
     window.show()
+    # 事件循环开始处理时，窗口已经显示出来
+    QTimer.singleShot(0, lambda: startup.mark("show"))
     sys.exit(app.exec())
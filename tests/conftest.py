@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  测试公共设置：从任意目录运行 pytest 时都能导入 wechat 包
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  聊天记录分类：规则表与原来逐条判断的结果一致
+
+import pytest
+
+from wechat.chat_records import classify, match_rule
+from wechat.simulator import SimBackend, SimControl
+from wechat.snapshot import snapshot
+
+BACKEND = SimBackend(contacts=list(), wait_scale=0)
+
+
+def control(control_type: str, name: str = "", *children) -> SimControl:
+    return SimControl(BACKEND, control_type, name, children=children)
+
+
+def message(msg: str, *children) -> dict:
+    """一条消息控件的快照分类结果"""
+    return classify(snapshot(control("ListItemControl", msg, *children)))
+
+
+def content_pane(*texts) -> SimControl:
+    """消息内容面板：没有名称，其中是若干文字"""
+    return control("PaneControl", "", *(control("TextControl", text) for text in texts))
+
+
+def sender(name: str) -> SimControl:
+    return control("ButtonControl", name)
+
+
+def test_empty_message_is_dropped():
+    assert message("") is None
+
+
+def test_time_separator():
+    assert message("昨天 20:01", control("PaneControl", "昨天 20:01")) == {
+        "type": "Time",
+        "name": "System",
+        "msg": "昨天 20:01",
+    }
+
+
+@pytest.mark.parametrize(
+    "msg",
+    [
+        "以下为新消息",
+        "查看更多消息",
+        "该类型文件可能存在安全风险，建议先检查文件安全性后再打开。",
+        "你已添加了张三，现在可以开始聊天了。",
+    ],
+)
+def test_system_messages(msg):
+    assert message(msg) == {"type": "System", "name": "System", "msg": msg}
+
+
+@pytest.mark.parametrize(
+    "msg, name, text",
+    [
+        ("张三 撤回了一条消息", "张三", "撤回了一条消息"),
+        ("张 三 撤回了一条消息", "张三", "撤回了一条消息"),
+        ("你 尝试撤回上一条消息", "你", "尝试撤回上一条消息"),
+    ],
+)
+def test_recall(msg, name, text):
+    assert message(msg) == {"type": "Other", "name": name, "msg": text}
+
+
+@pytest.mark.parametrize(
+    "msg",
+    [
+        "发出红包，请在手机上查看",
+        "收到红包，请在手机上查看",
+        "你发送了一次转账收款提醒，请在手机上查看",
+        "你收到了一次转账收款提醒，请在手机上查看",
+    ],
+)
+def test_red_envelope_notices(msg):
+    assert message(msg) == {"type": "RedEnvelope", "name": "System", "msg": msg}
+
+
+def test_red_envelope_taken():
+    assert message("张三领取了你的红包，红包已被领完") == {
+        "type": "RedEnvelope",
+        "name": "张三",
+        "msg": "，红包已被领完",
+    }
+
+
+def test_file():
+    record = message(
+        "[文件]", sender("张三"), content_pane("报价单.xlsx", "12.5K", "微信电脑版")
+    )
+    assert record == {
+        "type": "File",
+        "name": "张三",
+        "msg": "size: 12.5K  ---  file_name: 报价单.xlsx",
+    }
+
+
+def test_transfer():
+    record = message(
+        "微信转账", sender("张三"), content_pane("微信转账", "已收款", "￥88.00")
+    )
+    assert record == {
+        "type": "RedEnvelope",
+        "name": "张三",
+        "msg": "微信转账    已收款    ￥88.00",
+    }
+
+
+def test_cited():
+    msg = "好的\n引用 李四 的消息 : 明天开会"
+    assert message(msg, sender("张三"), content_pane(msg)) == {
+        "type": "Cited",
+        "name": "张三",
+        "msg": msg,
+    }
+
+
+def test_forwarded_sender_on_second_button():
+    assert message("[聊天记录]", sender(""), sender("张三"), content_pane()) == {
+        "type": "Content",
+        "name": "张三",
+        "msg": "[聊天记录]",
+    }
+
+
+def test_plain_content():
+    assert message("新年快乐", sender("张三"), content_pane("新年快乐")) == {
+        "type": "Content",
+        "name": "张三",
+        "msg": "新年快乐",
+    }
+
+
+def test_rule_order_follows_old_checks():
+    # 同时满足两条规则时以先检查的为准：撤回在引用之前
+    assert match_rule("张三 撤回了一条消息").__name__ == "_recall"
+    assert match_rule("引用 张三 撤回了一条消息 的消息").__name__ == "_recall"
+    # 只有整条消息完全相同才按完全匹配的规则判断
+    assert match_rule("[文件] 报价单").__name__ == "_content"
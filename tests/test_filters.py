@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  接收人筛选条件：运算优先级、名单文件和错误提示
+
+import csv
+
+import pytest
+
+from wechat.filters import compile_filter, filter_key
+from wechat.plan import iter_plan
+
+HEADER = ["昵称", "备注名", "微信名", "地区", "标签", "称谓", "敬语", "标志"]
+
+ROWS = [
+    ["张三", "张总", "wxid_a", "广东 广州", "客户", "", "", ""],
+    ["李四", "", "wxid_b", "广东 深圳", "老客户", "", "", ""],
+    ["王五", "", "wxid_c", "北京 朝阳", "客户,同学", "", "", ""],
+    ["赵六", "赵老师", "wxid_d", "上海 浦东", "同学", "", "", "N"],
+    ["孙七", "", "wxid_e", "广东 广州", "", "", "", ""],
+]
+
+
+@pytest.fixture
+def contacts(tmp_path) -> str:
+    path = tmp_path / "客户.csv"
+    with open(path, mode="w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        writer.writerows(ROWS)
+    return str(path)
+
+
+def select(expression: str, csvfile: str) -> set:
+    return set(compile_filter(expression, csvfile).rows(csvfile))
+
+
+def test_tag_contains_matches_whole_tags(contacts):
+    assert select('标签 contains "客户"', contacts) == {0, 2}
+
+
+def test_and_binds_tighter_than_or(contacts):
+    a = select('地区 startswith "北京"', contacts)
+    b = select('地区 startswith "广东"', contacts)
+    c = select('标签 == ""', contacts)
+
+    expression = '地区 startswith "北京" or 地区 startswith "广东" and 标签 == ""'
+    assert select(expression, contacts) == a | (b & c) == {2, 4}
+    grouped = '(地区 startswith "北京" or 地区 startswith "广东") and 标签 == ""'
+    assert select(grouped, contacts) == (a | b) & c == {4}
+    assert select('标签 contains "客户" or 昵称 == 孙七 and 备注名 == ""', contacts) == {
+        0,
+        2,
+        4,
+    }
+
+
+def test_not_binds_tighter_than_and(contacts):
+    assert select('not 标签 contains "客户" and 地区 startswith "广东"', contacts) == {
+        1,
+        4,
+    }
+    assert select('not (标签 contains "客户" and 地区 startswith "广东")', contacts) == {
+        1,
+        2,
+        3,
+        4,
+    }
+
+
+def test_chinese_keywords(contacts):
+    assert select('标签 包含 客户 且 非 地区 开头是 北京', contacts) == {0}
+
+
+def test_in_list_and_not_in(contacts):
+    assert select('地区 in ("广东 广州", "上海 浦东")', contacts) == {0, 3, 4}
+    assert select('地区 not in ("广东 广州", "上海 浦东")', contacts) == {1, 2}
+
+
+def test_in_txt_file_next_to_csv(contacts, tmp_path, monkeypatch):
+    (tmp_path / "blacklist.txt").write_text(
+        "# 不发送的人\n张总\n\n赵老师\n", encoding="utf-8"
+    )
+    # 相对路径在当前目录找不到时按联系人 csv 所在的目录查找
+    monkeypatch.chdir(tmp_path.parent)
+    assert select("备注名 in blacklist.txt", contacts) == {0, 3}
+    assert select("not 备注名 in blacklist.txt", contacts) == {1, 2, 4}
+
+
+def test_in_csv_file_uses_same_column(contacts, tmp_path):
+    names = tmp_path / "名单.csv"
+    names.write_text("序号,昵称\n1,李四\n2,王五\n", encoding="utf-8")
+    assert select("昵称 in " + str(names), contacts) == {1, 2}
+
+
+def test_rows_feed_iter_plan(contacts):
+    selected = compile_filter('地区 startswith "广东"', contacts).rows(contacts)
+    names = [task["nickname"] for task in iter_plan(contacts, selected=selected)]
+    assert names == ["张三", "李四", "孙七"]
+
+
+def test_planned_skips_marked_rows(contacts):
+    recipients = compile_filter('标签 contains "同学"', contacts)
+    assert recipients.rows(contacts) == {2, 3}
+    # 赵六 标志为 N，不计入进度的总数
+    assert recipients.planned(contacts) == 1
+
+
+def test_empty_expression_selects_everything(contacts):
+    recipients = compile_filter("  ", contacts)
+    assert recipients.empty
+    assert recipients.rows(contacts) is None
+    assert recipients.planned(contacts) is None
+    assert filter_key("") == ""
+
+
+def test_unknown_column(contacts):
+    with pytest.raises(ValueError, match="筛选条件中有csv不存在的列：城市"):
+        compile_filter("城市 == 广州", contacts)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ['标签 contains "客户" and', "(标签 == 客户", "标签 客户", '标签 == "客户" )'],
+)
+def test_syntax_errors(contacts, expression):
+    with pytest.raises(ValueError, match="筛选条件"):
+        compile_filter(expression, contacts)
+
+
+def test_syntax_error_message(contacts):
+    with pytest.raises(ValueError, match="筛选条件有误，标签 后面应为比较运算符：客户"):
+        compile_filter("标签 客户", contacts)
+
+
+def test_missing_list_file(contacts):
+    with pytest.raises(OSError):
+        compile_filter("备注名 in 不存在.txt", contacts)
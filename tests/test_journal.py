@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  发送流水的重放：续发时跳过已发出和未确认的接收人
+
+from wechat.journal import (
+    CANCELLED,
+    DELIVERED,
+    ERROR,
+    SendJournal,
+    journal_path,
+    replay,
+)
+
+
+def test_replay_resume_state(tmp_path):
+    path = str(tmp_path / "客户.journal.csv")
+    with SendJournal(path) as journal:
+        journal.begin_send("a")
+        journal.record("a", DELIVERED)
+        journal.begin_send("b")
+        journal.record("b", ERROR)
+        journal.begin_send("c")
+        journal.record("c", CANCELLED)
+
+    with SendJournal(path, resume=True) as journal:
+        assert journal.delivered == {"a"}
+        assert journal.state.failed == {"b"}
+        # 按回车之前停止的接收人什么也没有发出，续发时照常发送
+        assert journal.uncertain == set()
+        assert not journal.state.finished
+
+
+def test_partial_send_stays_uncertain(tmp_path):
+    """发出一部分后出错只留下 P，续发时作为未确认跳过，不会再发一遍"""
+    path = str(tmp_path / "客户.journal.csv")
+    with SendJournal(path) as journal:
+        journal.begin_send("a")
+        journal.record("a", DELIVERED)
+        journal.begin_send("b")
+
+    with SendJournal(path, resume=True) as journal:
+        assert journal.delivered == {"a"}
+        assert journal.uncertain == {"b"}
+        assert journal.state.failed == set()
+
+    # 续发中没有再记录 b，再次续发时 b 仍然是未确认
+    assert replay(path).pending == {"b"}
+
+
+def test_retry_after_error_is_delivered(tmp_path):
+    path = str(tmp_path / "客户.journal.csv")
+    with SendJournal(path) as journal:
+        journal.begin_send("a")
+        journal.record("a", ERROR)
+    with SendJournal(path, resume=True) as journal:
+        journal.begin_send("a")
+        journal.record("a", DELIVERED)
+        journal.finish()
+
+    state = replay(path)
+    assert state.delivered == {"a"}
+    assert state.failed == set()
+    assert state.finished
+
+
+def test_new_send_starts_over(tmp_path):
+    path = str(tmp_path / "客户.journal.csv")
+    with SendJournal(path) as journal:
+        journal.begin_send("a")
+        journal.record("a", DELIVERED)
+    with SendJournal(path) as journal:
+        assert journal.delivered == set()
+
+    state = replay(path)
+    assert state.started
+    assert state.delivered == set()
+
+
+def test_half_written_line_is_ignored(tmp_path):
+    path = str(tmp_path / "客户.journal.csv")
+    with SendJournal(path) as journal:
+        journal.begin_send("a")
+        journal.record("a", DELIVERED)
+    with open(path, mode="a", encoding="utf-8") as file:
+        file.write("2024-02-09 20:00:00,D")
+
+    assert replay(path).delivered == {"a"}
+
+
+def test_replay_missing_file(tmp_path):
+    state = replay(str(tmp_path / "没有.journal.csv"))
+    assert not state.started
+    assert state.delivered == set()
+
+
+def test_journal_path_segments():
+    assert journal_path("客户.csv", False) == "客户.journal.csv"
+    assert journal_path("客户.csv", True) == "客户.dryrun.journal.csv"
+    assert (
+        journal_path("客户.csv", False, "账号1", "0a1b2c3d")
+        == "客户.0a1b2c3d.账号1.journal.csv"
+    )
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  发送节奏：令牌桶限速、失败和变慢时降速、成功后逐步恢复
+
+import pytest
+
+from wechat.pacing import (
+    BACKOFF_FACTOR,
+    LATENCY_COOLDOWN,
+    MIN_RATE,
+    RECOVER_STEP,
+    Pacer,
+)
+
+
+class FakeClock:
+    """不真正睡眠的时钟，sleep 只把时间往前拨"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def make_pacer(**kwargs) -> tuple:
+    clock = FakeClock()
+    return Pacer(clock=clock, sleep=clock.sleep, **kwargs), clock
+
+
+def test_token_bucket_spacing():
+    pacer, clock = make_pacer(per_minute=60)
+    assert pacer.acquire()
+    assert clock.now == 0
+    assert pacer.acquire()
+    assert clock.now == pytest.approx(1.0, abs=0.01)
+
+
+def test_stricter_limit_wins():
+    pacer, _ = make_pacer(per_minute=60, per_hour=600)
+    assert pacer.max_rate == pytest.approx(600 / 3600)
+
+
+def test_acquire_stops_while_waiting():
+    pacer, clock = make_pacer(per_minute=1)
+    assert pacer.acquire()
+    assert not pacer.acquire(should_stop=lambda: True)
+    assert clock.now < 1
+
+
+def test_failure_backs_off_to_floor():
+    pacer, _ = make_pacer(per_minute=60)
+    pacer.record(False, 0.1)
+    assert pacer.rate == pytest.approx(1 * BACKOFF_FACTOR)
+    assert pacer.backoffs == 1
+    for _ in range(20):
+        pacer.record(False, 0.1)
+    assert pacer.rate == MIN_RATE
+
+
+def recover(pacer: Pacer, limit: int = 100) -> int:
+    """连续成功直到不再降速，返回成功的次数"""
+    for count in range(1, limit + 1):
+        pacer.record(True, 0.1)
+        if pacer.rate == pacer.max_rate:
+            return count
+    return limit
+
+
+def test_recovers_to_limit():
+    pacer, _ = make_pacer(per_minute=60)
+    pacer.record(False, 0.1)
+    # 每次回升上限的 RECOVER_STEP，浮点误差可能多一步
+    steps = round((1 - BACKOFF_FACTOR) / RECOVER_STEP)
+    assert recover(pacer) in (steps, steps + 1)
+
+
+def test_latency_spike_backs_off_once_per_cooldown():
+    pacer, _ = make_pacer(per_minute=60)
+    for _ in range(10):
+        pacer.record(True, 0.1)
+    assert pacer.backoffs == 0
+
+    pacer.record(True, 1.0)
+    assert pacer.backoffs == 1
+    # 降速刚生效，冷却期内仍然慢也不再降速
+    for _ in range(LATENCY_COOLDOWN - 1):
+        pacer.record(True, 1.0)
+    assert pacer.backoffs == 1
+
+
+def test_unlimited_backs_off_from_observed_speed():
+    pacer, clock = make_pacer()
+    for _ in range(5):
+        assert pacer.acquire()
+        clock.now += 0.5
+    assert pacer.rate is None
+
+    pacer.record(False, 0.1)
+    # 没有上限时以实际的发送速度（每秒 2 条）为基准降速
+    assert pacer.ceiling == pytest.approx(2.0)
+    assert pacer.rate == pytest.approx(2.0 * BACKOFF_FACTOR)
+    # 恢复到降速前的速度后重新不限速
+    steps = round((1 - BACKOFF_FACTOR) / RECOVER_STEP)
+    assert recover(pacer) in (steps, steps + 1)
+    assert pacer.rate is None
+
+
+def test_not_adaptive_ignores_failures():
+    pacer, _ = make_pacer(per_minute=60, adaptive=False)
+    pacer.record(False, 0.1)
+    assert pacer.rate == pacer.max_rate
+    assert pacer.backoffs == 0
+
+
+def test_clone_has_fresh_state():
+    pacer, _ = make_pacer(per_minute=30, burst=3)
+    pacer.record(False, 0.1)
+    clone = pacer.clone()
+    assert clone.rate == clone.max_rate == pacer.max_rate
+    assert clone.capacity == 3
+    assert clone.backoffs == 0
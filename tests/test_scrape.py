@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  好友抓取：分几次抓完（达到个数停下、从断点续写）后的新旧对比
+
+import csv
+
+from wechat.scrape import (
+    FRIENDS_HEADER,
+    FriendDelta,
+    FriendWriter,
+    diff_friends,
+    fingerprint,
+    wechat_key,
+)
+
+
+def friend(nick, remark="", wechat="", location="", tags="") -> list:
+    return [nick, remark, wechat, location, tags, "您", "您", "Y"]
+
+
+def write_friends(path, rows) -> str:
+    with open(path, mode="w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file)
+        writer.writerow(FRIENDS_HEADER)
+        writer.writerows(rows)
+    return str(path)
+
+
+FRIENDS = [
+    friend("张三", "张总", "wxid_a", "广东 广州", "客户"),
+    friend("李四", "", "wxid_b", "北京 朝阳", "同事"),
+    friend("王五", "", "wxid_c", "上海 浦东", "客户,同学"),
+    friend("赵六", "赵老师", "wxid_d", "", ""),
+]
+
+
+def scrape_in_runs(path, rows, count: int) -> None:
+    """
+    每次写 count 个好友，下一次续写同一个 csv，模拟达到个数停下后从断点继续.
+
+    与抓取时一样跳过已写入的好友：有备注名的按昵称和备注名，没有备注名的按微信名。
+    """
+    for start in range(0, len(rows), count):
+        with FriendWriter(str(path), append=start > 0) as writer:
+            for row in rows[start : start + count]:
+                nick, remark, wechat = row[:3]
+                if remark and fingerprint(nick, remark) in writer.done:
+                    continue
+                if wechat_key(wechat) in writer.done:
+                    continue
+                writer.write(row)
+
+
+def test_limited_runs_then_resume_diff_clean(tmp_path):
+    previous = write_friends(tmp_path / "friends_old.csv", FRIENDS)
+    current = tmp_path / "friends_new.csv"
+
+    scrape_in_runs(current, FRIENDS, 3)
+
+    diff = diff_friends(previous, str(current))
+    assert diff == {"added": [], "removed": [], "changed": []}
+
+
+def test_diff_on_unfinished_run_reports_unreached_as_removed(tmp_path):
+    """只抓了前几个就对比，没有翻到的好友全部被当作删除，所以只能在翻到列表末尾后对比"""
+    previous = write_friends(tmp_path / "friends_old.csv", FRIENDS)
+    current = tmp_path / "friends_new.csv"
+    with FriendWriter(str(current)) as writer:
+        for row in FRIENDS[:2]:
+            writer.write(row)
+
+    diff = diff_friends(previous, str(current))
+    assert [row["昵称"] for row in diff["removed"]] == ["王五", "赵六"]
+
+
+def test_diff_added_removed_changed(tmp_path):
+    previous = write_friends(tmp_path / "friends_old.csv", FRIENDS)
+    current = write_friends(
+        tmp_path / "friends_new.csv",
+        [
+            friend("张三", "张总", "wxid_a", "广东 深圳", "客户"),
+            friend("李四", "", "wxid_b", "北京 朝阳", "同事"),
+            # 标签顺序和分隔符不同不算变化
+            friend("王五", "", "wxid_c", "上海 浦东", "同学，客户"),
+            friend("孙七", "", "wxid_e", "", ""),
+        ],
+    )
+
+    diff = diff_friends(previous, current)
+    assert [row["昵称"] for row in diff["added"]] == ["孙七"]
+    assert [row["昵称"] for row in diff["removed"]] == ["赵六"]
+    assert len(diff["changed"]) == 1
+    old, new, notes = diff["changed"][0]
+    assert old["昵称"] == new["昵称"] == "张三"
+    assert notes == "地区：广东 广州 -> 广东 深圳"
+
+
+def test_diff_by_tag_only_removes_tagged(tmp_path):
+    previous = write_friends(tmp_path / "friends_old.csv", FRIENDS)
+    current = write_friends(tmp_path / "friends_new.csv", [FRIENDS[0]])
+
+    diff = diff_friends(previous, current, tag="客户")
+    assert [row["昵称"] for row in diff["removed"]] == ["王五"]
+
+
+def test_namesakes_without_remark_are_kept(tmp_path):
+    rows = [
+        friend("同名", "", "wxid_x"),
+        friend("同名", "", "wxid_y"),
+        friend("张三", "张总", "wxid_a"),
+    ]
+    previous = write_friends(tmp_path / "friends_old.csv", rows)
+    current = tmp_path / "friends_new.csv"
+
+    scrape_in_runs(current, rows, 1)
+
+    with FriendWriter(str(current), append=True) as writer:
+        assert writer.count == 3
+        assert {wechat_key("wxid_x"), wechat_key("wxid_y")} <= writer.done
+        assert fingerprint("同名", "") in writer.done
+    assert diff_friends(previous, str(current)) == {
+        "added": list(),
+        "removed": list(),
+        "changed": list(),
+    }
+
+
+def test_delta_does_not_carry_ambiguous_rows(tmp_path):
+    previous = write_friends(
+        tmp_path / "friends_old.csv",
+        [friend("同名", "", "wxid_x"), friend("同名", "", "wxid_y"), FRIENDS[0]],
+    )
+    delta = FriendDelta(previous)
+
+    assert delta.carry("同名", "") is None
+    assert delta.carry("张三", "张总", "客户")[2] == "wxid_a"
+    # 标签有变化时点开详情
+    assert delta.carry("张三", "张总", "同事") is None
+    # 点开详情后按微信名沿用旧行
+    merged = delta.merge(friend("同名", "", "wxid_y", "广东 广州"))
+    assert merged[2:4] == ["wxid_y", "广东 广州"]
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  控件子树快照：内存中的查找与 uiautomation 逐次查找的结果一致
+
+import pytest
+
+from wechat.simulator import SimBackend, SimControl
+from wechat.snapshot import snapshot, walk
+
+
+@pytest.fixture
+def backend() -> SimBackend:
+    return SimBackend(contacts=list(), wait_scale=0)
+
+
+@pytest.fixture
+def detail(backend) -> SimControl:
+    """好友详情面板：标签和值是相邻的兄弟，"地区：" 标签后面没有值"""
+
+    def control(control_type: str, name: str = "", *children) -> SimControl:
+        return SimControl(backend, control_type, name, children=children)
+
+    return control(
+        "PaneControl",
+        "详情",
+        control(
+            "PaneControl",
+            "",
+            control("TextControl", "张三"),
+            control("ButtonControl", "发消息"),
+        ),
+        control(
+            "PaneControl",
+            "",
+            control("TextControl", "微信号："),
+            control("TextControl", "wxid_a"),
+            control("TextControl", "地区："),
+        ),
+        control(
+            "PaneControl",
+            "",
+            control("TextControl", "标签"),
+            control("TextControl", "客户"),
+        ),
+    )
+
+
+def test_preorder_matches_found_index(detail):
+    root = snapshot(detail)
+    texts = root.find_all("TextControl")
+    assert [node.name for node in texts] == [
+        "张三",
+        "微信号：",
+        "wxid_a",
+        "地区：",
+        "标签",
+        "客户",
+    ]
+    # 第几个匹配的节点与 uiautomation 的 foundIndex 是同一个控件
+    for index, node in enumerate(texts, 1):
+        assert root.find("TextControl", found_index=index) is node
+        assert detail.TextControl(foundIndex=index) is node.control
+    assert root.find("TextControl", found_index=len(texts) + 1) is None
+
+
+def test_find_by_type_and_name(detail):
+    root = snapshot(detail)
+    assert root.find("ButtonControl").name == "发消息"
+    assert root.find(name="客户").control_type == "TextControl"
+    assert root.find("ButtonControl", "客户") is None
+    assert len(root.find_all("PaneControl")) == 3
+
+
+def test_next_sibling(detail):
+    root = snapshot(detail)
+    label = root.find("TextControl", "微信号：")
+    assert label.next_sibling().name == "wxid_a"
+    assert label.next_sibling().next_sibling().name == "地区："
+    # 最后一个子节点和根节点都没有下一个兄弟
+    assert root.find("TextControl", "地区：").next_sibling() is None
+    assert root.next_sibling() is None
+
+
+def test_value_after(detail):
+    root = snapshot(detail)
+    assert root.value_after("微信号：") == "wxid_a"
+    assert root.value_after("标签") == "客户"
+    # 标签存在但后面没有值时为空字符串，没有该标签时为 None
+    assert root.value_after("地区：") == ""
+    assert root.value_after("备注：") is None
+    assert root.value_after("张三", control_type="ButtonControl") is None
+
+
+def test_snapshot_max_depth(detail):
+    root = snapshot(detail, max_depth=1)
+    assert [node.control_type for node in root.children] == ["PaneControl"] * 3
+    assert all(not node.children for node in root.children)
+    assert root.find("TextControl") is None
+
+
+def test_snapshot_keeps_control(detail):
+    root = snapshot(detail)
+    button = root.find("ButtonControl", "发消息")
+    assert button.control is detail.ButtonControl(Name="发消息")
+    assert button.parent.parent is root
+
+
+def test_walk_same_order_as_snapshot(detail):
+    assert [(node.control_type, node.name) for node in walk(detail)] == [
+        (node.control_type, node.name) for node in snapshot(detail)
+    ]
+    assert [node.control_type for node in walk(detail, max_depth=1)] == [
+        "PaneControl"
+    ] * 3
+
+
+def test_walk_stops_reading_after_break(backend, detail):
+    before = backend.stats["children"]
+    for node in walk(detail):
+        if node.name == "微信号：":
+            break
+    # 找到后停止，第三个面板和 "微信号：" 之后的控件都没有被读取
+    read = backend.stats["children"] - before
+    before = backend.stats["children"]
+    snapshot(detail)
+    assert read < backend.stats["children"] - before
@@ -24,7 +24,7 @@ class Ui_theMainWindow(object):
     def setupUi(self, theMainWindow):
         if not theMainWindow.objectName():
             theMainWindow.setObjectName(u"theMainWindow")
-        theMainWindow.resize(464, 390)
+        theMainWindow.resize(464, 450)
         icon = QIcon()
         icon.addFile(u"../resource/teamwork.ico", QSize(), QIcon.Normal, QIcon.Off)
         theMainWindow.setWindowIcon(icon)
@@ -32,7 +32,7 @@ class Ui_theMainWindow(object):
         self.centralwidget.setObjectName(u"centralwidget")
         self.verticalLayoutWidget_2 = QWidget(self.centralwidget)
         self.verticalLayoutWidget_2.setObjectName(u"verticalLayoutWidget_2")
-        self.verticalLayoutWidget_2.setGeometry(QRect(10, 10, 441, 356))
+        self.verticalLayoutWidget_2.setGeometry(QRect(10, 10, 441, 416))
         self.verticalLayout_2 = QVBoxLayout(self.verticalLayoutWidget_2)
         self.verticalLayout_2.setObjectName(u"verticalLayout_2")
         self.verticalLayout_2.setContentsMargins(0, 0, 0, 0)
@@ -108,6 +108,11 @@ class Ui_theMainWindow(object):
 
         self.gridLayout.addWidget(self.pushButton_seltgtcsv, 0, 1, 1, 1)
 
+        self.lineEdit_where = QLineEdit(self.verticalLayoutWidget_2)
+        self.lineEdit_where.setObjectName(u"lineEdit_where")
+
+        self.gridLayout.addWidget(self.lineEdit_where, 1, 0, 1, 2)
+
 
         self.verticalLayout_2.addLayout(self.gridLayout)
 
@@ -121,6 +126,11 @@ class Ui_theMainWindow(object):
 
         self.verticalLayout_2.addWidget(self.textEdit_msg)
 
+        self.pushButton_resolve = QPushButton(self.verticalLayoutWidget_2)
+        self.pushButton_resolve.setObjectName(u"pushButton_resolve")
+
+        self.verticalLayout_2.addWidget(self.pushButton_resolve)
+
         self.pushButton_wlog = QPushButton(self.verticalLayoutWidget_2)
         self.pushButton_wlog.setObjectName(u"pushButton_wlog")
 
@@ -138,10 +148,20 @@ class Ui_theMainWindow(object):
 
         self.verticalLayout_2.addWidget(self.line_3)
 
+        self.horizontalLayout_3 = QHBoxLayout()
+        self.horizontalLayout_3.setObjectName(u"horizontalLayout_3")
+        self.pushButton_pause = QPushButton(self.verticalLayoutWidget_2)
+        self.pushButton_pause.setObjectName(u"pushButton_pause")
+
+        self.horizontalLayout_3.addWidget(self.pushButton_pause)
+
         self.pushButton_stop = QPushButton(self.verticalLayoutWidget_2)
         self.pushButton_stop.setObjectName(u"pushButton_stop")
 
-        self.verticalLayout_2.addWidget(self.pushButton_stop)
+        self.horizontalLayout_3.addWidget(self.pushButton_stop)
+
+
+        self.verticalLayout_2.addLayout(self.horizontalLayout_3)
 
         theMainWindow.setCentralWidget(self.centralwidget)
         self.statusbar = QStatusBar(theMainWindow)
@@ -164,10 +184,13 @@ class Ui_theMainWindow(object):
         self.pushButton_fetchfs.setText(QCoreApplication.translate("theMainWindow", u"\u4ece\u5fae\u4fe1\u6293\u53d6\u8054\u7cfb\u4eba", None))
         self.lineEdit_tgtcsv.setPlaceholderText(QCoreApplication.translate("theMainWindow", u"friends.csv", None))
         self.pushButton_seltgtcsv.setText(QCoreApplication.translate("theMainWindow", u"\u9009\u53d6\u53d1\u9001\u8ba1\u5212\u6587\u4ef6", None))
+        self.lineEdit_where.setPlaceholderText(QCoreApplication.translate("theMainWindow", u"\u7b5b\u9009\u63a5\u6536\u4eba\uff08\u53ef\u4e0d\u586b\uff09\uff0c\u5982\uff1a\u6807\u7b7e contains \"\u5ba2\u6237\" and \u5730\u533a startswith \"\u5e7f\u4e1c\"", None))
         self.label_2.setText(QCoreApplication.translate("theMainWindow", u"\u8f93\u5165\u95ee\u5019\u6d88\u606f\uff0c\u5982\u6709\u201c {\u79f0\u8c13}\u3001{\u656c\u8bed} \u201d\u5c06\u4f1a\u88abcsv\u4e2d\u7684\u914d\u7f6e\u66ff\u4ee3\uff1a", None))
         self.textEdit_msg.setPlaceholderText("")
+        self.pushButton_resolve.setText(QCoreApplication.translate("theMainWindow", u"\u68c0\u67e5\u63a5\u6536\u4eba\uff08\u53ea\u641c\u7d22\uff0c\u4e0d\u53d1\u9001\uff09", None))
         self.pushButton_wlog.setText(QCoreApplication.translate("theMainWindow", u"\u53ea\u70b9\u4e0d\u53d1\uff0c\u64cd\u4f5c\u5199\u5165\u65e5\u5fd7", None))
         self.pushButton_sendout.setText(QCoreApplication.translate("theMainWindow", u"\u6b63\u5f0f\u53d1\u9001", None))
+        self.pushButton_pause.setText(QCoreApplication.translate("theMainWindow", u"\u6682\u505c", None))
         self.pushButton_stop.setText(QCoreApplication.translate("theMainWindow", u"\u505c\u6b62\u81ea\u52a8\u64cd\u4f5c", None))
     # retranslateUi
 
@@ -10,19 +10,37 @@ from PySide6.QtWidgets import (
 from PySide6.QtGui import QIcon
 
 from view.Ui_mainwin import Ui_theMainWindow
+from work.jobs import CANCELLED, FAILED, STOPPED
 from work.worker import Worker
 import csv
 import os
 import sys
 import wechat.utils
+from wechat.filters import compile_filter
+from wechat.journal import journal_path, replay
+from wechat.pacing import Pacer
+from wechat.plan import read_header
+from wechat.scrape import ScrapeCheckpoint, latest_friends_csv
+from wechat.template import MsgTemplate
 
 
 class MainWindow(QMainWindow, Ui_theMainWindow):
+    # 跳过最近多少天内已经问候过的联系人（按历次正式发送日志汇总），0 表示不跳过
+    skip_greeted_days = 30
+    # 正式发送的节奏：每分钟、每小时最多发送的条数（0 表示不限制），允许连发的条数，
+    # 随机间隔的比例；发送失败或微信变慢时会在此基础上自动降速
+    send_per_minute = 0
+    send_per_hour = 0
+    send_burst = 1
+    send_jitter = 0.0
+    # 同时登录了多个微信时，按账号分片，由各个窗口轮流发送（每个账号按上面的设置各自限速）
+    multi_window = True
+
     def __init__(self):
         super().__init__()
 
         # 首先声明所有实例变量
-        self.model = Worker()
+        self.model = Worker(self.multi_window)
 
         # 使用由Qt Designer生成的Ui类初始化UI
         self.setupUi(self)
@@ -73,12 +91,19 @@ class MainWindow(QMainWindow, Ui_theMainWindow):
 
         self.pushButton_fetchfs.clicked.connect(self.on_fetchfs_clicked)
         self.pushButton_stop.clicked.connect(self.on_stop_clicked)
+        self.pushButton_pause.clicked.connect(self.on_pause_clicked)
         self.checkBox_usetag.toggled.connect(self.on_usetag_clicked)
         self.pushButton_seltgtcsv.clicked.connect(self.on_seltgtcsv_clicked)
 
+        self.pushButton_resolve.clicked.connect(self.on_resolve_clicked)
         self.pushButton_wlog.clicked.connect(self.on_wlog_clicked)
         self.pushButton_sendout.clicked.connect(self.on_send_clicked)
 
+        # 会话和任务队列由 Worker 持有，状态、进度只需连接一次
+        self.model.statusinfo.connect(self.show_status_message)
+        self.model.progress.connect(self.show_progress)
+        self.model.job_changed.connect(self.show_job)
+
     def init_text_edit_style(self):
         self.textEdit_msg.setText(
             "龙腾万里，福禄双全。在这龙年新春开启之时，给{称谓}拜年！[抱拳][抱拳]祝愿{敬语}身体健康，财源广进；事业蒸蒸日上，阖家幸福美满。新年快乐！[福][福][福][烟花][烟花][烟花]"
@@ -86,6 +111,9 @@ class MainWindow(QMainWindow, Ui_theMainWindow):
 
     def init_drag_and_drop(self):
         self.drag_and_drop_files = list()
+        # 拖入的附件（发给所有接收人的图片和文件）和活动定义
+        self.attachments = list()
+        self.campaign_file = None
         # 可拖拽
         self.setAcceptDrops(True)
 
@@ -93,6 +121,24 @@ class MainWindow(QMainWindow, Ui_theMainWindow):
         self._move = False
         self.m_position = QPoint(0, 0)
 
+    def select_files(self):
+        """拖入的文件：.json 作为活动定义，其他文件作为发给所有接收人的图片和文件"""
+        self.attachments = list()
+        self.campaign_file = None
+        for url in self.drag_and_drop_files:
+            path = url.toLocalFile()
+            if not path or not os.path.isfile(path):
+                continue
+            if path.lower().endswith(".json"):
+                self.campaign_file = path
+            else:
+                self.attachments.append(path)
+        names = [os.path.basename(path) for path in self.attachments]
+        text = "附件：" + ("、".join(names) if names else "无")
+        if self.campaign_file:
+            text += "；活动定义：" + os.path.basename(self.campaign_file)
+        self.show_status_message(text)
+
     def on_usetag_clicked(self):
         if self.checkBox_usetag.isChecked():
             self.lineEdit_tag.setEnabled(True)
@@ -132,31 +178,94 @@ class MainWindow(QMainWindow, Ui_theMainWindow):
             return False
         return True
 
-    def on_checkwebc_clicked(self):
+    def check_msg_template(self, msg: str, filename: str):
+        """检查消息模板中的占位符是否都是 csv 中的列"""
+        unknown = MsgTemplate(msg).unknown_placeholders(read_header(filename))
+        if unknown:
+            self.show_message_box(
+                "模板错误",
+                "消息模板中有csv不存在的列：" + "、".join("{" + u + "}" for u in unknown),
+                level="warning",
+            )
+            return False
+        return True
+
+    def check_recipient_filter(self, filename: str):
+        """
+        检查筛选接收人的条件：列名都在 csv 中、名单文件都能读取.
+
+        Returns:
+            RecipientFilter: 有问题时返回 None
+        """
         try:
-            if not self.model:
-                self.model = Worker()
+            recipients = compile_filter(self.lineEdit_where.text(), filename)
+        except (OSError, ValueError) as e:
+            self.show_message_box("筛选条件错误", str(e), level="warning")
+            return None
+        if not recipients.empty and not recipients.rows(filename):
+            self.show_message_box("筛选条件", "没有符合筛选条件的接收人", level="warning")
+            return None
+        return recipients
+
+    def ask_resume(self, filename: str, only_log: bool, segment: str = ""):
+        """上次发送中断时，询问是否从中断处继续；多个窗口同时发送时汇总各个会话的流水"""
+        delivered = 0
+        interrupted = False
+        for session in self.model.session_labels():
+            state = replay(journal_path(filename, only_log, session, segment))
+            if not state.started or state.finished:
+                continue
+            if not state.delivered and not state.pending:
+                continue
+            interrupted = True
+            delivered += len(state.delivered)
+        if not interrupted:
+            return False
+        answer = QMessageBox.question(
+            self,
+            "继续发送",
+            "上次发送没有完成，已成功发送"
+            + str(delivered)
+            + "人，是否从中断处继续？\n选择“否”将重新开始发送。",
+        )
+        return answer == QMessageBox.Yes
+
+    def on_checkwebc_clicked(self):
+        if self.attach_wechat(reconnect=True):
+            self.show_status_message("已连接微信")
 
-            self.model.reset_WxOperation()
-            self.model.wx_operation.signals.statusinfo.connect(self.show_status_message)
+    def attach_wechat(self, multi_window: bool = False, reconnect: bool = False) -> bool:
+        """连接微信窗口，已经连接过时直接复用；失败时弹出提示"""
+        try:
+            if reconnect:
+                self.model.reset_WxOperation(multi_window)
+            else:
+                self.model.attach(multi_window)
+        except RuntimeError as e:
+            self.show_message_box("请稍候", str(e))
+            return False
         except Exception as e:
             print("发生异常:", e)
             self.show_message_box("严重错误🆘", "微信未启动!", level="error")
-            return
+            return False
+        return True
 
     def show_status_message(self, text: str):
         self.statusBar().showMessage(text)
 
-    def on_fetchfs_clicked(self):
-        try:
-            if not self.model:
-                self.model = Worker()
+    def show_progress(self, progress):
+        """显示发送进度（wechat.progress.Progress）"""
+        self.statusBar().showMessage(progress.text())
 
-            self.model.reset_WxOperation()
-            self.model.wx_operation.signals.statusinfo.connect(self.show_status_message)
-        except Exception as e:
-            print("发生异常:", e)
-            self.show_message_box("严重错误🆘", "微信未启动!", level="error")
+    def show_job(self, job):
+        """任务结束时复位暂停按钮；出错、停止、取消时在状态栏提示"""
+        if not job.active:
+            self.pushButton_pause.setText("暂停")
+        if job.status in (FAILED, STOPPED, CANCELLED):
+            self.statusBar().showMessage(job.text())
+
+    def on_fetchfs_clicked(self):
+        if not self.attach_wechat():
             return
 
         csvfile = (
@@ -165,50 +274,121 @@ class MainWindow(QMainWindow, Ui_theMainWindow):
             else self.lineEdit_fcsv.placeholderText()
         )
         csvfile = wechat.utils.fmtfn(csvfile)
+        tag = self.lineEdit_tag.text() if self.lineEdit_tag.isEnabled() else None
+        resume = self.ask_resume_fetch(tag)
         self.model.fetch_friend_list(
-            tag=self.lineEdit_tag.text() if self.lineEdit_tag.isEnabled() else None,
+            tag=tag,
             csvfile=csvfile,
             count=5,
+            resume=resume,
+            previous=None if resume else self.ask_previous_friends(csvfile),
+        )
+
+    def ask_previous_friends(self, csvfile: str):
+        """有之前抓取的好友 csv 时，询问是否以它为基准增量抓取"""
+        previous = latest_friends_csv(exclude=csvfile)
+        if previous is None:
+            return None
+        answer = QMessageBox.question(
+            self,
+            "增量抓取",
+            "找到之前抓取的好友列表 "
+            + previous
+            + "，是否只抓取新增和有变化的好友？\n"
+            + "没有变化的好友沿用原来的行（包括手工修改的称谓、敬语、标志），"
+            + "选择“否”将重新抓取全部好友。",
         )
+        return previous if answer == QMessageBox.Yes else None
+
+    def ask_resume_fetch(self, tag: str):
+        """上次抓取中断时，询问是否从断点继续"""
+        checkpoint = ScrapeCheckpoint.load()
+        if checkpoint is None or checkpoint.tag != (tag or ""):
+            return False
+        answer = QMessageBox.question(
+            self,
+            "继续抓取",
+            "上次抓取没有完成，已抓取"
+            + str(checkpoint.count)
+            + "个好友到 "
+            + checkpoint.csvfile
+            + "，是否从断点继续？\n选择“否”将重新开始抓取。",
+        )
+        return answer == QMessageBox.Yes
 
     def on_stop_clicked(self):
         self.model.set_stop_flag()
+        self.pushButton_pause.setText("暂停")
 
-    def on_wlog_clicked(self):
-        try:
-            if not self.model:
-                self.model = Worker()
+    def on_pause_clicked(self):
+        paused = self.model.toggle_pause()
+        self.pushButton_pause.setText("继续" if paused else "暂停")
 
-            self.model.reset_WxOperation()
-            self.model.wx_operation.signals.statusinfo.connect(self.show_status_message)
-        except Exception as e:
-            print("发生异常:", e)
-            self.show_message_box("严重错误🆘", "微信未启动!", level="error")
+    def on_resolve_clicked(self):
+        if not self.attach_wechat():
+            return
+
+        targetfile = self.lineEdit_tgtcsv.text()
+        if not self.check_target_csvfile(targetfile):
+            return
+        recipients = self.check_recipient_filter(targetfile)
+        if recipients is None:
+            return
+        self.model.resolve_recipients(targetfile, recipients=recipients.expression)
+
+    def on_wlog_clicked(self):
+        if not self.attach_wechat(self.multi_window):
             return
 
         targetfile = self.lineEdit_tgtcsv.text()
         if not self.check_target_csvfile(targetfile):
             return
         msg = self.textEdit_msg.toPlainText()
-        self.model.send_out_messages_to_friends(msg, targetfile, True)
+        if not self.check_msg_template(msg, targetfile):
+            return
+        recipients = self.check_recipient_filter(targetfile)
+        if recipients is None:
+            return
+        resume = self.ask_resume(targetfile, True, recipients.key)
+        self.model.send_out_messages_to_friends(
+            msg,
+            targetfile,
+            True,
+            resume,
+            self.skip_greeted_days,
+            self.campaign_file,
+            self.attachments,
+            recipients=recipients.expression,
+        )
 
     def on_send_clicked(self):
-        try:
-            if not self.model:
-                self.model = Worker()
-
-            self.model.reset_WxOperation()
-            self.model.wx_operation.signals.statusinfo.connect(self.show_status_message)
-        except Exception as e:
-            print("发生异常:", e)
-            self.show_message_box("严重错误🆘", "微信未启动!", level="error")
+        if not self.attach_wechat(self.multi_window):
             return
 
         targetfile = self.lineEdit_tgtcsv.text()
         if not self.check_target_csvfile(targetfile):
             return
         msg = self.textEdit_msg.toPlainText()
-        self.model.send_out_messages_to_friends(msg, targetfile, False)
+        if not self.check_msg_template(msg, targetfile):
+            return
+        recipients = self.check_recipient_filter(targetfile)
+        if recipients is None:
+            return
+        resume = self.ask_resume(targetfile, False, recipients.key)
+        pacer = Pacer(
+            self.send_per_minute, self.send_per_hour, self.send_burst, self.send_jitter
+        )
+        self.model.send_out_messages_to_friends(
+            msg,
+            targetfile,
+            False,
+            resume,
+            self.skip_greeted_days,
+            self.campaign_file,
+            self.attachments,
+            pacer,
+            recipients.expression,
+        )
 
     def dragEnterEvent(self, event):
         if event.mimeData().hasText():
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  python -m wechat 命令行入口，见 wechat.cli
+
+import sys
+
+from wechat.cli import main
+
+sys.exit(main())
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  界面自动化后端，WxOperation 只通过这里访问 uiautomation / win32 接口
+
+"""
+界面自动化后端。
+
+WxOperation 不再直接调用 uiautomation、win32gui、win32con，而是通过 WxBackend 接口
+取得窗口控件、发送按键、读写剪切板。Windows 下使用 UiaBackend 操作真实的微信窗口，
+其他环境可以使用 wechat.simulator.SimBackend 在内存中模拟微信窗口，用于运行和压测。
+"""
+
+import contextlib
+import os
+import struct
+import time
+
+# DROPFILES 结构：pFiles(DWORD) pt.x(LONG) pt.y(LONG) fNC(BOOL) fWide(BOOL)
+_DROPFILES = struct.Struct("<IiiII")
+
+# 剪切板被其他程序占用时的重试次数和间隔（秒）
+CLIPBOARD_RETRIES = 10
+CLIPBOARD_RETRY_INTERVAL = 0.02
+
+
+def build_hdrop(full_paths: list) -> bytes:
+    """
+    生成 CF_HDROP 格式的剪切板数据：DROPFILES 结构之后是以 \\0 分隔、以两个 \\0 结尾的
+    UTF-16 路径列表，与在资源管理器中复制文件得到的数据相同.
+
+    Args:
+        full_paths(list): 文件的绝对路径
+
+    Returns:
+        bytes
+    """
+    files = "".join(path + "\0" for path in full_paths) + "\0"
+    return _DROPFILES.pack(_DROPFILES.size, 0, 0, 0, 1) + files.encode("utf-16-le")
+
+
+class WxBackend:
+    """
+    自动化后端接口。
+
+    控件对象需要提供 uiautomation.Control 的常用子集：Name、GetChildren、
+    TextControl / ButtonControl / EditControl / ListControl / PaneControl 查找、
+    Click、SendKeys、SendKey、Exists、GetNextSiblingControl、GetScrollPattern 等。
+    """
+
+    # 当前的全局查找超时（秒），由 set_search_timeout 设置
+    search_timeout = 3
+
+    def set_search_timeout(self, seconds: float) -> None:
+        """设置控件查找的全局超时时间"""
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def limited_search(self, seconds: float):
+        """
+        在 with 块中临时缩短全局查找超时，退出时恢复.
+
+        未定位的控件在读取属性（Name、GetChildren 等）时会按全局超时重新查找，找不到就一直
+        卡到超时。轮询等待中每一轮都会重试，不需要单次查找等满全局超时，用较短的超时才能
+        及时检查停止标志。
+
+        Args:
+            seconds(float): 必选参数，with 块中使用的查找超时（秒）
+        """
+        previous = self.search_timeout
+        if seconds >= previous:
+            yield
+            return
+        self.set_search_timeout(seconds)
+        try:
+            yield
+        finally:
+            self.set_search_timeout(previous)
+
+    def find_window(self, class_name: str, name: str) -> int:
+        """按类名和标题查找顶层窗口，返回窗口句柄，找不到返回 0"""
+        raise NotImplementedError
+
+    def find_windows(self, class_name: str, name: str) -> list:
+        """按类名和标题查找所有顶层窗口（同时登录多个微信时有多个），返回窗口句柄列表"""
+        raise NotImplementedError
+
+    def foreground_window(self) -> int:
+        """当前前台窗口的句柄"""
+        raise NotImplementedError
+
+    def wake_up_window(self, hwnd: int) -> None:
+        """把窗口切换到前台并显示"""
+        raise NotImplementedError
+
+    def minimize_window(self, hwnd: int) -> None:
+        """最小化可见的窗口"""
+        raise NotImplementedError
+
+    def window_control(self, name: str, class_name: str):
+        """按标题和类名取得顶层窗口控件"""
+        raise NotImplementedError
+
+    def window_from_handle(self, hwnd: int):
+        """按窗口句柄取得顶层窗口控件"""
+        raise NotImplementedError
+
+    def foreground_control(self):
+        """取得当前前台窗口控件"""
+        raise NotImplementedError
+
+    def root_control(self):
+        """取得桌面根控件，用于不限定窗口的查找"""
+        raise NotImplementedError
+
+    def key(self, name: str):
+        """特殊按键名（如 ENTER、ESC）对应的按键值，供控件的 SendKey 使用"""
+        raise NotImplementedError
+
+    def send_key(self, key, wait_time: float = 0.5) -> None:
+        """向前台窗口发送按键，之后等待 wait_time 秒"""
+        raise NotImplementedError
+
+    def set_clipboard_text(self, text: str) -> None:
+        """设置剪切板文本"""
+        raise NotImplementedError
+
+    def set_clipboard_files(self, full_paths: list) -> None:
+        """把文件放到剪切板，之后粘贴到聊天输入框即可发送"""
+        raise NotImplementedError
+
+
+class UiaBackend(WxBackend):
+    """基于 uiautomation 和 pywin32 的 Windows 后端"""
+
+    def __init__(self, search_timeout: float = 3):
+        # 依赖只在 Windows 下可用，延迟到创建后端时才导入
+        import uiautomation as auto
+        import win32clipboard
+        import win32con
+        import win32gui
+
+        self.auto = auto
+        self.win32clipboard = win32clipboard
+        self.win32con = win32con
+        self.win32gui = win32gui
+        # 文件列表 -> CF_HDROP 数据，同一组附件发给多个接收人时只生成一次
+        self.hdrop_cache = dict()
+        self.set_search_timeout(search_timeout)
+
+    def set_search_timeout(self, seconds: float) -> None:
+        self.auto.SetGlobalSearchTimeout(seconds)
+        self.search_timeout = seconds
+
+    def find_window(self, class_name: str, name: str) -> int:
+        return self.win32gui.FindWindow(class_name, name)
+
+    def find_windows(self, class_name: str, name: str) -> list:
+        handles = list()
+
+        def collect(hwnd, _):
+            if (
+                self.win32gui.GetClassName(hwnd) == class_name
+                and self.win32gui.GetWindowText(hwnd) == name
+            ):
+                handles.append(hwnd)
+            return True
+
+        self.win32gui.EnumWindows(collect, None)
+        return handles
+
+    def foreground_window(self) -> int:
+        return self.win32gui.GetForegroundWindow()
+
+    def wake_up_window(self, hwnd: int) -> None:
+        self.win32gui.SetForegroundWindow(hwnd)
+        self.win32gui.ShowWindow(hwnd, self.win32con.SW_SHOWDEFAULT)
+
+    def minimize_window(self, hwnd: int) -> None:
+        if self.win32gui.IsWindowVisible(hwnd):
+            self.win32gui.ShowWindow(hwnd, self.win32con.SW_MINIMIZE)
+
+    def window_control(self, name: str, class_name: str):
+        return self.auto.WindowControl(Name=name, ClassName=class_name)
+
+    def window_from_handle(self, hwnd: int):
+        return self.auto.ControlFromHandle(hwnd)
+
+    def foreground_control(self):
+        return self.auto.GetForegroundControl()
+
+    def root_control(self):
+        return self.auto.GetRootControl()
+
+    def key(self, name: str):
+        return self.auto.SpecialKeyNames[name]
+
+    def send_key(self, key, wait_time: float = 0.5) -> None:
+        self.auto.SendKey(key, waitTime=wait_time)
+
+    def set_clipboard_text(self, text: str) -> None:
+        self.auto.SetClipboardText(text=text)
+
+    def set_clipboard_files(self, full_paths: list) -> None:
+        # 在本进程内直接写入 CF_HDROP，不再为每次发送启动 powershell 并固定等待
+        key = tuple(os.path.abspath(path) for path in full_paths)
+        data = self.hdrop_cache.get(key)
+        if data is None:
+            data = self.hdrop_cache[key] = build_hdrop(key)
+        clipboard = self.win32clipboard
+        for attempt in range(CLIPBOARD_RETRIES):
+            try:
+                clipboard.OpenClipboard()
+                break
+            except Exception:
+                # 剪切板暂时被其他程序占用
+                if attempt == CLIPBOARD_RETRIES - 1:
+                    raise
+                time.sleep(CLIPBOARD_RETRY_INTERVAL)
+        try:
+            clipboard.EmptyClipboard()
+            clipboard.SetClipboardData(self.win32con.CF_HDROP, data)
+        finally:
+            clipboard.CloseClipboard()
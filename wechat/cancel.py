@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  任务的停止和暂停：每个任务一个令牌，所有等待都按固定间隔检查
+
+"""
+任务的停止和暂停。
+
+每次开始一个任务（抓取、检查接收人、发送）都换一个新的 CancelToken，上一个任务遗留的
+停止状态不会影响下一个任务，同时打开的多个窗口也互不影响。
+
+停止：界面轮询（utils.wait_until）、发送节奏的等待都每隔不超过 STOP_LATENCY 秒检查一次
+令牌，按下停止后不会再卡在 3 秒的等待超时或者一整页好友的点击上；还没有按下回车的消息
+不再发出。最长的停止延迟是 STOP_LATENCY 加上一次界面自动化调用的耗时。
+
+暂停：发送、抓取在每个接收人（好友）之间检查令牌，暂停时就停在那里等待继续，已经读取的
+计划、生成的消息、打开的窗口和统计都保留，继续后从下一个接收人接着处理。
+"""
+
+import threading
+
+# 停止、暂停之后最长多久被察觉（秒）
+STOP_LATENCY = 0.1
+
+
+class CancelToken:
+    """一个任务的停止和暂停状态，可以在界面线程和工作线程之间共享"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        # 没有暂停时置位，暂停时清除，等待继续的线程阻塞在这里
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def cancel(self) -> None:
+        """停止任务，暂停中的任务也会醒来并结束"""
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self) -> None:
+        if not self.cancelled:
+            self._running.clear()
+
+    def resume(self) -> None:
+        self._running.set()
+
+    def sleep(self, seconds: float) -> bool:
+        """
+        睡眠，停止时立即醒来.
+
+        Returns:
+            bool: 睡满返回 True，被停止返回 False
+        """
+        return not self._cancelled.wait(seconds)
+
+    def checkpoint(self) -> bool:
+        """
+        任务边界：暂停时在这里等到继续或停止.
+
+        Returns:
+            bool: 可以继续返回 True，已经停止返回 False
+        """
+        while not self._running.wait(STOP_LATENCY):
+            pass
+        return not self.cancelled
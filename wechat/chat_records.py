@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  聊天记录分类：每条消息读取一次控件子树，按规则表判定类型
+
+"""
+聊天记录的分类。
+
+以前每条消息都要多次调用 PaneControl()、ButtonControl(foundIndex=...)，每次都是一次
+跨进程的控件查找；类型则靠一长串子串判断逐条比较。现在 get_chat_records 对每条消息
+只做一次快照（wechat.snapshot），时间、发送人按钮、内容面板中的文字都从快照中取；
+类型按规则表判定：
+
+- EXACT_RULES：整条消息完全相同即可判定的，查一次字典；
+- CONTAIN_RULES：按顺序检查消息是否包含某几段文字，编译成一个正则表达式，每条消息
+  只匹配一次，命中的分组就是第一条满足的规则；
+- 都不满足的是普通消息。
+
+每条规则对应一个取值函数，返回 (类型, 发送人, 内容)，与原来的记录格式相同。
+"""
+
+import re
+
+from wechat.snapshot import UiNode
+
+# 记录类型
+TIME = "Time"
+SYSTEM = "System"
+OTHER = "Other"
+RED_ENVELOPE = "RedEnvelope"
+FILE = "File"
+CITED = "Cited"
+CONTENT = "Content"
+
+
+class MessageNode:
+    """
+    一条消息的快照：消息文字、第一个面板（时间或内容）、所有按钮（发送人）.
+
+    Args:
+        root(UiNode): 消息控件的快照
+    """
+
+    __slots__ = ("msg", "pane", "buttons")
+
+    def __init__(self, root: UiNode):
+        self.msg = root.name
+        self.pane = None
+        self.buttons = list()
+        for node in root:
+            if node.control_type == "PaneControl":
+                if self.pane is None:
+                    self.pane = node
+            elif node.control_type == "ButtonControl":
+                self.buttons.append(node.name)
+
+    def button(self, index: int) -> str:
+        """第几个按钮的名称，从 1 开始，没有时为空"""
+        return self.buttons[index - 1] if index <= len(self.buttons) else ""
+
+    def pane_text(self, index: int) -> str:
+        """第一个面板中第几个文字的名称，从 1 开始，没有时为空"""
+        if self.pane is None:
+            return ""
+        node = self.pane.find("TextControl", found_index=index)
+        return node.name if node is not None else ""
+
+
+def _time(message: MessageNode) -> tuple:
+    return TIME, "System", message.pane.name
+
+
+def _system(message: MessageNode) -> tuple:
+    return SYSTEM, "System", message.msg
+
+
+def _recall(message: MessageNode) -> tuple:
+    # 如 "张三 撤回了一条消息"
+    parts = message.msg.split(" ")
+    return OTHER, "".join(parts[:-1]), parts[-1]
+
+
+def _red_envelope(message: MessageNode) -> tuple:
+    return RED_ENVELOPE, "System", message.msg
+
+
+def _red_envelope_taken(message: MessageNode) -> tuple:
+    parts = message.msg.split("领取了你的红包")
+    return RED_ENVELOPE, parts[0], parts[1]
+
+
+def _file(message: MessageNode) -> tuple:
+    return (
+        FILE,
+        message.button(1),
+        f"size: {message.pane_text(2)}  ---  file_name: {message.pane_text(1)}",
+    )
+
+
+def _transfer(message: MessageNode) -> tuple:
+    operation = message.pane_text(2)
+    amount = message.pane_text(3)
+    return RED_ENVELOPE, message.button(1), message.msg + f"    {operation}    " + amount
+
+
+def _cited(message: MessageNode) -> tuple:
+    return CITED, message.button(1), message.msg
+
+
+def _forwarded(message: MessageNode) -> tuple:
+    # 合并转发的聊天记录，第一个按钮没有名称时发送人在第二个按钮上
+    return CONTENT, message.button(1) or message.button(2), message.msg
+
+
+def _content(message: MessageNode) -> tuple:
+    return CONTENT, message.button(1), message.msg
+
+
+# 整条消息完全相同即可判定的规则
+EXACT_RULES = {
+    "以下为新消息": _system,
+    "查看更多消息": _system,
+    "该类型文件可能存在安全风险，建议先检查文件安全性后再打开。": _system,
+    "发出红包，请在手机上查看": _red_envelope,
+    "收到红包，请在手机上查看": _red_envelope,
+    "你发送了一次转账收款提醒，请在手机上查看": _red_envelope,
+    "你收到了一次转账收款提醒，请在手机上查看": _red_envelope,
+    "[文件]": _file,
+    "微信转账": _transfer,
+    "[聊天记录]": _forwarded,
+}
+
+# 按顺序检查的规则：消息中同时包含这几段文字（不论先后）时由对应的函数取值
+CONTAIN_RULES = (
+    (_system, ("你已添加了", "现在可以开始聊天了")),
+    (_recall, ("撤回了一条消息",)),
+    (_recall, ("尝试撤回上一条消息",)),
+    (_red_envelope_taken, ("领取了你的红包",)),
+    (_cited, ("引用", "的消息")),
+)
+
+
+def compile_rules(rules: tuple):
+    """
+    把按顺序检查的规则编译成一个正则表达式.
+
+    每条规则是一个分组 r<序号>，分组中每段文字是一个前瞻断言；从消息开头匹配时按顺序
+    尝试各个分组，命中的分组就是第一条满足的规则。
+
+    Returns:
+        re.Pattern
+    """
+    alternatives = list()
+    for idx, (_, texts) in enumerate(rules):
+        lookaheads = "".join("(?=.*" + re.escape(text) + ")" for text in texts)
+        alternatives.append("(?P<r" + str(idx) + ">" + lookaheads + ")")
+    return re.compile("|".join(alternatives), re.DOTALL)
+
+
+_CONTAIN_PATTERN = compile_rules(CONTAIN_RULES)
+
+
+def match_rule(msg: str):
+    """
+    消息文字对应的取值函数（不含时间）.
+
+    Returns:
+        Callable: MessageNode -> (类型, 发送人, 内容)
+    """
+    handler = EXACT_RULES.get(msg)
+    if handler is not None:
+        return handler
+    match = _CONTAIN_PATTERN.match(msg)
+    if match is not None:
+        return CONTAIN_RULES[int(match.lastgroup[1:])][0]
+    return _content
+
+
+def classify(root: UiNode):
+    """
+    分类一条消息.
+
+    Args:
+        root(UiNode): 消息控件的快照，见 wechat.snapshot.snapshot
+
+    Returns:
+        dict: {"type": 类型, "name": 发送人, "msg": 内容}，消息为空时返回 None
+    """
+    message = MessageNode(root)
+    if not message.msg:
+        return None
+    # 时间分隔的面板带有时间文字，其他消息的面板没有名称
+    if message.pane is not None and message.pane.name:
+        handler = _time
+    else:
+        handler = match_rule(message.msg)
+    kind, name, msg = handler(message)
+    return {"type": kind, "name": name, "msg": msg}
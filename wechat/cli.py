@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  命令行入口：不打开界面，抓取好友、检查计划、模拟发送、正式发送
+
+"""
+命令行入口，供计划任务等无人值守的场合使用::
+
+    python -m wechat fetch --csv "friends[%Y%m%d-%H%M%S].csv" --tag 客户
+    python -m wechat validate --csv 客户.csv --template-file 拜年.txt
+    python -m wechat dry-run --csv 客户.csv --template-file 拜年.txt
+    python -m wechat send --csv 客户.csv --template-file 拜年.txt --rate 20/min --rate 600/h
+    python -m wechat send --csv friends.csv --template-file 拜年.txt --where '标签 contains "客户" and 地区 startswith "广东"'
+    python -m wechat contacts export 客户.csv --tag 客户 --region 广东
+
+不导入任何 PySide6 界面模块；操作微信的模块只在需要时才导入，validate 和 contacts（联系人库的
+导入导出）完全不需要微信。
+运行过程中的输出都写到 stderr，结束时在 stdout 输出一行 JSON 摘要，退出码见 EXIT_*。
+加 --sim N 时使用内存模拟的微信窗口（N 个好友），可以在没有微信的环境下演练整个流程。
+按一次 Ctrl+C 停止发送（已发出的记录都会保留，可以用 --resume 继续），再按一次立即退出。
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import signal
+import sqlite3
+import sys
+import time
+
+import wechat.plan as plan
+import wechat.resolve as resolve
+import wechat.utils as utils
+from wechat.filters import compile_filter
+from wechat.payload import Campaign, PayloadBuilder
+from wechat.resolve import ResolutionCache
+
+# 退出码
+EXIT_OK = 0
+# 有接收人发送失败（日志标志为 E），其余正常
+EXIT_FAILED = 1
+# 参数、csv、消息模板或活动定义有问题，没有开始发送
+EXIT_INVALID = 2
+# 找不到微信窗口，或者操作微信时出错
+EXIT_NO_WECHAT = 3
+# 被 Ctrl+C 停止，下次可以 --resume 继续
+EXIT_STOPPED = 4
+# 第二次 Ctrl+C，立即退出
+EXIT_INTERRUPTED = 130
+
+_RATE_UNITS = {
+    "s": 60,
+    "sec": 60,
+    "m": 1,
+    "min": 1,
+    "h": 1 / 60,
+    "hour": 1 / 60,
+}
+
+
+def parse_rate(text: str) -> tuple:
+    """
+    解析 --rate 参数.
+
+    Args:
+        text(str): 如 20/min、600/h、1/s，只写数字时为每分钟的条数
+
+    Returns:
+        (单位, 条数)：单位为 minute 或 hour
+    """
+    value, _, unit = text.strip().partition("/")
+    try:
+        value = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("发送速度格式为 20/min、600/h：" + text)
+    unit = unit.strip().lower() or "min"
+    if unit not in _RATE_UNITS or value <= 0:
+        raise argparse.ArgumentTypeError("发送速度格式为 20/min、600/h：" + text)
+    if unit in ("h", "hour"):
+        return "hour", value
+    return "minute", value * _RATE_UNITS[unit]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m wechat", description="微信拜节助手命令行，不打开界面"
+    )
+    parser.add_argument(
+        "--sim",
+        type=int,
+        metavar="N",
+        help="使用内存模拟的微信窗口（N 个好友）演练，不操作真实的微信",
+    )
+    parser.add_argument(
+        "--sim-windows", type=int, default=1, metavar="K", help="模拟的微信窗口个数"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fetch = commands.add_parser("fetch", help="抓取好友列表写入 csv")
+    fetch.add_argument(
+        "--csv", default="friends[%Y%m%d-%H%M%S].csv", help="写入的好友 csv，可以带时间格式"
+    )
+    fetch.add_argument("--tag", help="只抓取此标签下的好友")
+    fetch.add_argument("--count", type=int, default=0, help="最多抓取的好友个数，默认全部")
+    fetch.add_argument("--resume", action="store_true", help="从上次中断的断点继续")
+    fetch.add_argument(
+        "--previous", help="增量抓取的基准 csv，auto 表示最近一次抓取的 friends*.csv"
+    )
+
+    contacts = commands.add_parser("contacts", help="联系人库：导入好友 csv、按标签和地区导出发送计划")
+    contacts.add_argument("--db", default=None, help="联系人库文件，默认为 _contacts.db")
+    actions = contacts.add_subparsers(dest="action", required=True)
+    actions.add_parser("import", help="导入好友 csv，以 csv 中的值为准").add_argument(
+        "csv", help="好友 csv"
+    )
+    export = actions.add_parser("export", help="导出好友 csv，可以直接作为发送计划")
+    export.add_argument("csv", help="导出的 csv")
+    export.add_argument("--tag", help="只导出带有此标签的联系人")
+    export.add_argument("--region", help="只导出地区以此开头的联系人")
+    actions.add_parser("stats", help="联系人个数和各个标签的人数")
+
+    for name, text in (
+        ("validate", "检查联系人 csv、消息模板和附件，不操作微信"),
+        ("dry-run", "模拟发送：搜索跳转但不发出，仅记录日志"),
+        ("send", "正式发送"),
+    ):
+        command = commands.add_parser(name, help=text)
+        command.add_argument("--csv", required=True, help="联系人 csv")
+        template = command.add_mutually_exclusive_group()
+        template.add_argument("--template", default="", help="消息模板，可用 {列名} 引用 csv 的列")
+        template.add_argument("--template-file", help="消息模板文件（UTF-8）")
+        command.add_argument("--campaign", help="活动定义 JSON")
+        command.add_argument(
+            "--where",
+            default="",
+            help='筛选接收人，如 标签 contains "客户" and not 备注名 in blacklist.txt',
+        )
+        command.add_argument(
+            "--attach", action="append", default=list(), help="发给所有接收人的图片或文件，可重复"
+        )
+        if name == "validate":
+            continue
+        command.add_argument("--resume", action="store_true", help="按发送流水从上次中断处继续")
+        command.add_argument(
+            "--skip-greeted-days",
+            type=float,
+            default=30,
+            help="跳过最近这么多天内已问候过的联系人，0 表示不跳过",
+        )
+        command.add_argument(
+            "--multi-window", action="store_true", help="同时登录多个微信时按账号分片发送"
+        )
+        if name == "send":
+            command.add_argument(
+                "--rate",
+                type=parse_rate,
+                action="append",
+                default=list(),
+                help="发送速度上限，如 20/min、600/h，可重复，默认不限速",
+            )
+            command.add_argument("--burst", type=int, default=1, help="允许连续发送的条数")
+            command.add_argument("--jitter", type=float, default=0.0, help="随机间隔的比例，如 0.3")
+    return parser
+
+
+def read_template(args) -> str:
+    if args.template_file:
+        with open(args.template_file, mode="r", encoding="utf-8-sig") as file:
+            return file.read().strip()
+    return args.template
+
+
+def validate(args) -> dict:
+    """
+    检查联系人 csv、消息模板、活动定义和附件，统计会发送的接收人.
+
+    Returns:
+        dict: 摘要，status 为 ok 或 invalid
+    """
+    result = {"csv": args.csv}
+    if args.where:
+        result["where"] = args.where
+    errors = list()
+    try:
+        header = plan.read_header(args.csv)
+        builder = PayloadBuilder(
+            read_template(args),
+            header,
+            Campaign.load(args.campaign) if args.campaign else None,
+            args.attach,
+            os.path.dirname(os.path.abspath(args.csv)),
+        )
+        selected = compile_filter(args.where, args.csv).rows(args.csv)
+    except (OSError, ValueError) as ex:
+        result.update(status="invalid", errors=[str(ex)])
+        return result
+
+    if builder.is_empty():
+        errors.append("发送的消息为空")
+    unknown = builder.unknown_placeholders(header)
+    if unknown:
+        errors.append("消息模板中有csv不存在的列：" + "、".join(unknown))
+    if selected is not None and not selected:
+        errors.append("没有符合筛选条件的接收人")
+
+    stats = plan.PlanStats()
+    recipients = 0
+    empty = 0
+    unresolved = 0
+    missing = set()
+    # 附加消息列中 csv 里不存在的占位符，以及有这种占位符的行数
+    row_unknown = list()
+    invalid = 0
+    resolution = ResolutionCache()
+    tasks = plan.iter_plan(args.csv, stats, selected=selected)
+    for task, payload in builder.build_many(tasks):
+        recipients += 1
+        if not payload:
+            empty += 1
+        missing.update(payload.missing_files())
+        if payload.unknown_placeholders:
+            invalid += 1
+            for name in payload.unknown_placeholders:
+                if name not in row_unknown:
+                    row_unknown.append(name)
+        if resolution.status(plan.target_name(task)) in resolve.SKIP_MARKS:
+            unresolved += 1
+    if missing:
+        errors.append("附件不存在：" + "、".join(sorted(missing)))
+    if row_unknown:
+        errors.append(
+            str(invalid) + "行的附加消息中有csv不存在的列：" + "、".join(row_unknown)
+        )
+
+    result.update(
+        status="invalid" if errors else "ok",
+        rows=stats.rows,
+        skipped=stats.skipped,
+        recipients=recipients,
+        empty=empty,
+        unresolved=unresolved,
+        missing_files=sorted(missing),
+        invalid_rows=invalid,
+        errors=errors,
+    )
+    return result
+
+
+def contacts(args) -> dict:
+    """联系人库的导入、导出和统计，不需要微信"""
+    from wechat.contacts import CONTACTS_DB, ContactStore
+
+    try:
+        with ContactStore(args.db or CONTACTS_DB) as store:
+            if args.action == "import":
+                result = {"imported": store.import_csv(args.csv)}
+            elif args.action == "export":
+                result = {
+                    "csv": args.csv,
+                    "exported": store.export_csv(args.csv, args.tag, args.region),
+                }
+            else:
+                result = {"tags": store.tags()}
+            result["contacts"] = store.count()
+    except (OSError, ValueError, sqlite3.Error) as ex:
+        return {"status": "invalid", "errors": [str(ex)]}
+    result["status"] = "ok"
+    return result
+
+
+def make_backend(args):
+    """--sim 时返回模拟后端，否则返回 None（由 WxOperation 创建 UiaBackend）"""
+    if args.sim is None:
+        return None
+    from wechat.simulator import SimBackend, make_contacts
+
+    return SimBackend(make_contacts(args.sim), wait_scale=0, instances=args.sim_windows)
+
+
+def make_operation(args):
+    """连接微信窗口，多窗口发送时返回 SessionPool"""
+    backend = make_backend(args)
+    if getattr(args, "multi_window", False):
+        from wechat.session_pool import SessionPool
+
+        pool = SessionPool(backend)
+        if len(pool.sessions) > 1:
+            return pool
+        return pool.sessions[0].operation
+    from wechat.wx_operation import WxOperation
+
+    return WxOperation(backend)
+
+
+def fetch(args, operation) -> dict:
+    csvfile = utils.fmtfn(args.csv) if "[" in args.csv else args.csv
+    previous = args.previous
+    if previous == "auto":
+        from wechat.scrape import latest_friends_csv
+
+        previous = latest_friends_csv(exclude=csvfile)
+    result = operation.print_friend_list(
+        args.tag, csvfile, args.count or math.inf, args.resume, previous
+    )
+    if result is None:
+        return {"status": "error", "error": "打开通讯录管理窗口出错"}
+    # 达到 --count 个停下也算正常结束，断点保留，下次 --resume 继续
+    result["status"] = "ok" if result["finished"] or result["limited"] else "stopped"
+    return result
+
+
+def send(args, operation) -> dict:
+    only_log = args.command == "dry-run"
+    pacer = None
+    if not only_log:
+        from wechat.pacing import Pacer
+
+        limits = dict()
+        for unit, value in args.rate:
+            # 同一单位写了多次时取最严格的一个
+            limits[unit] = min(value, limits.get(unit, value))
+        pacer = Pacer(
+            limits.get("minute", 0), limits.get("hour", 0), args.burst, args.jitter
+        )
+    summary = operation.process_send_message(
+        read_template(args),
+        args.csv,
+        only_log,
+        args.resume,
+        args.skip_greeted_days,
+        args.campaign,
+        args.attach,
+        pacer,
+        args.where,
+    )
+    if summary is None:
+        return {"status": "invalid", "errors": ["消息模板、活动定义或筛选条件有问题，没有发送"]}
+    if summary.stopped:
+        status = "stopped"
+    elif summary.failed or summary.uncertain:
+        # 未确认的接收人需要人工核对，与发送失败一样以退出码 1 提示
+        status = "failed"
+    else:
+        status = "ok"
+    return {
+        "status": status,
+        "csv": args.csv,
+        "processed": summary.processed,
+        "succeeded": summary.succeeded,
+        "failed": summary.failed,
+        "skipped": summary.skipped,
+        "resumed": summary.resumed,
+        "greeted": summary.greeted,
+        "unresolved": summary.unresolved,
+        "uncertain": summary.uncertain,
+        "logs": summary.log_files,
+    }
+
+
+_EXIT_CODES = {
+    "ok": EXIT_OK,
+    "failed": EXIT_FAILED,
+    "invalid": EXIT_INVALID,
+    "error": EXIT_NO_WECHAT,
+    "stopped": EXIT_STOPPED,
+}
+
+
+def run(args) -> dict:
+    if args.command == "validate":
+        return validate(args)
+    if args.command == "contacts":
+        return contacts(args)
+    if args.command != "fetch":
+        # 发送前先检查，有问题时不连接微信
+        checked = validate(args)
+        if checked["status"] != "ok":
+            return checked
+
+    try:
+        operation = make_operation(args)
+    except Exception as ex:
+        return {"status": "error", "error": "微信未启动：" + str(ex)}
+    operation.signals.statusinfo.connect(lambda text: print(text))
+    # 进度打印到 stderr，最后一次进度写入摘要
+    progress = list()
+    operation.signals.progress.connect(lambda event: print(event.text()))
+    operation.signals.progress.connect(progress.append)
+
+    def stop(signum, frame):
+        # 第一次 Ctrl+C 停止发送，第二次立即退出
+        print("正在停止，再按一次 Ctrl+C 立即退出")
+        operation.signals.set_flag(True)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    signal.signal(signal.SIGINT, stop)
+    try:
+        if args.command == "fetch":
+            return fetch(args, operation)
+        result = send(args, operation)
+        if progress:
+            result["progress"] = progress[-1].as_dict()
+        return result
+    finally:
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+
+def main(argv: list = None) -> int:
+    """
+    命令行入口.
+
+    Returns:
+        int: 退出码
+    """
+    args = build_parser().parse_args(argv)
+    started = time.monotonic()
+    stdout = sys.stdout
+    try:
+        # 运行过程中的输出都写到 stderr，stdout 只有结束时的一行摘要
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run(args)
+    except KeyboardInterrupt:
+        result = {"status": "interrupted"}
+    result = dict(command=args.command, **result)
+    result["elapsed"] = round(time.monotonic() - started, 2)
+    result["exit_code"] = _EXIT_CODES.get(result["status"], EXIT_INTERRUPTED)
+    stdout.write(json.dumps(result) + "\n")
+    stdout.flush()
+    return result["exit_code"]
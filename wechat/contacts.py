@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  本地联系人库：SQLite 保存抓取到的好友，按标签、地区建索引，与好友 csv 互相导入导出
+
+"""
+本地联系人库。
+
+以前好友只存在于一份份 friends*.csv 中，每次活动都要在 Excel 里重新筛选，几份 csv 之间
+还会慢慢对不上。联系人库（程序目录下的 _contacts.db）是一份长期维护的名单：
+
+- 抓取好友时每抓到一个就写入（按微信名，没有时按昵称和备注名合并），昵称、备注名、
+  微信名、地区、标签取抓取到的最新值，手工修改过的称谓、敬语、标志保持不变；
+- 标签拆开单独建索引，地区按前缀查找也走索引，上万个好友按标签、地区筛选只需几毫秒；
+- import_csv 导入手工整理过的好友 csv（csv 中的值为准），export_csv 按标签、地区导出
+  发送计划 csv，表头与抓取的好友 csv 相同，自定义列原样保留。
+
+只用到标准库 sqlite3，不需要另外安装。
+"""
+
+import csv
+import json
+import sqlite3
+from datetime import datetime
+
+from wechat.scrape import FRIENDS_HEADER, KEPT_COLUMNS, normalize_tags
+
+CONTACTS_DB = "_contacts.db"
+
+# 联系人表的列，与好友 csv 的标准列相同；其他自定义列以 JSON 保存在 extra 列中
+CONTACT_COLUMNS = tuple(FRIENDS_HEADER)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS contacts (
+        id INTEGER PRIMARY KEY,
+        {columns},
+        extra TEXT NOT NULL DEFAULT '{{}}',
+        updated TEXT NOT NULL DEFAULT ''
+    )
+    """.format(
+        columns=",\n        ".join(
+            '"' + column + "\" TEXT NOT NULL DEFAULT ''" for column in CONTACT_COLUMNS
+        )
+    ),
+    'CREATE INDEX IF NOT EXISTS contacts_name ON contacts ("昵称", "备注名")',
+    'CREATE INDEX IF NOT EXISTS contacts_wechat ON contacts ("微信名")',
+    'CREATE INDEX IF NOT EXISTS contacts_region ON contacts ("地区")',
+    """
+    CREATE TABLE IF NOT EXISTS contact_tags (
+        tag TEXT NOT NULL,
+        contact_id INTEGER NOT NULL,
+        PRIMARY KEY (tag, contact_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS contact_tags_contact ON contact_tags (contact_id)",
+)
+
+_SELECT_COLUMNS = ", ".join('c."' + column + '"' for column in CONTACT_COLUMNS)
+
+
+def _prefix_end(prefix: str) -> str:
+    """按前缀查找时的上界：前缀最后一个字符加一，地区 >= 前缀 and 地区 < 上界 可以走索引"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class ContactStore:
+    """
+    联系人库.
+
+    Args:
+        path(str): 可选参数，数据库文件，默认为程序目录下的 _contacts.db
+    """
+
+    def __init__(self, path: str = CONTACTS_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        # 抓取时写入，界面同时导出也不会被锁住
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def _find(self, values: dict):
+        """按微信名（没有时按昵称和备注名）找到已有的联系人，返回 (id, extra)"""
+        if values.get("微信名", "").strip():
+            row = self.conn.execute(
+                'SELECT id, extra FROM contacts WHERE "微信名" = ?', (values["微信名"],)
+            ).fetchone()
+            if row is not None:
+                return row
+        return self.conn.execute(
+            'SELECT id, extra FROM contacts WHERE "昵称" = ? AND "备注名" = ?',
+            (values.get("昵称", ""), values.get("备注名", "")),
+        ).fetchone()
+
+    def upsert(self, values: dict, keep: tuple = KEPT_COLUMNS) -> bool:
+        """
+        写入一个联系人，已有时合并.
+
+        Args:
+            values(dict): 列名 -> 值，标准列以外的列保存为自定义列
+            keep(tuple): 可选参数，已有联系人的这些列保持不变（默认为手工修改的称谓、敬语、标志），
+                         为空时全部以 values 为准
+
+        Returns:
+            bool: 是否新增；昵称、备注名都为空时不写入，返回 None
+        """
+        if not values.get("昵称", "").strip() and not values.get("备注名", "").strip():
+            return None
+        extra = {
+            column: value
+            for column, value in values.items()
+            if column and column not in CONTACT_COLUMNS
+        }
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        found = self._find(values)
+        if found is None:
+            columns = [column for column in CONTACT_COLUMNS if column in values]
+            cursor = self.conn.execute(
+                "INSERT INTO contacts ({}, extra, updated) VALUES ({})".format(
+                    ", ".join('"' + column + '"' for column in columns),
+                    ", ".join("?" * (len(columns) + 2)),
+                ),
+                [values[column] for column in columns]
+                + [json.dumps(extra, ensure_ascii=False), now],
+            )
+            contact_id = cursor.lastrowid
+            inserted = True
+        else:
+            contact_id, old_extra = found
+            columns = [
+                column
+                for column in CONTACT_COLUMNS
+                if column in values and column not in keep
+            ]
+            merged = json.loads(old_extra or "{}")
+            merged.update(extra)
+            self.conn.execute(
+                "UPDATE contacts SET {}extra = ?, updated = ? WHERE id = ?".format(
+                    "".join('"' + column + '" = ?, ' for column in columns)
+                ),
+                [values[column] for column in columns]
+                + [json.dumps(merged, ensure_ascii=False), now, contact_id],
+            )
+            inserted = False
+        if "标签" in values:
+            self.conn.execute(
+                "DELETE FROM contact_tags WHERE contact_id = ?", (contact_id,)
+            )
+            self.conn.executemany(
+                "INSERT INTO contact_tags (tag, contact_id) VALUES (?, ?)",
+                [(tag, contact_id) for tag in normalize_tags(values["标签"])],
+            )
+        return inserted
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def query(self, tag: str = None, region: str = None) -> list:
+        """
+        按标签、地区查找联系人.
+
+        Args:
+            tag(str): 可选参数，带有此标签的联系人
+            region(str): 可选参数，地区以此开头的联系人，如 广东、广东 深圳
+
+        Returns:
+            list: 每个联系人是 列名 -> 值 的字典，包括自定义列，按写入的顺序排列
+        """
+        sql = "SELECT " + _SELECT_COLUMNS + ", c.extra FROM contacts c"
+        where, params = list(), list()
+        if tag:
+            sql += " JOIN contact_tags t ON t.contact_id = c.id AND t.tag = ?"
+            params.append(tag)
+        if region:
+            where.append('c."地区" >= ? AND c."地区" < ?')
+            params.extend([region, _prefix_end(region)])
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY c.id"
+        contacts = list()
+        for row in self.conn.execute(sql, params):
+            contact = dict(zip(CONTACT_COLUMNS, row[:-1]))
+            if row[-1] and row[-1] != "{}":
+                contact.update(json.loads(row[-1]))
+            contacts.append(contact)
+        return contacts
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+    def tags(self) -> dict:
+        """所有标签及其联系人个数"""
+        return dict(
+            self.conn.execute(
+                "SELECT tag, COUNT(*) FROM contact_tags GROUP BY tag ORDER BY tag"
+            ).fetchall()
+        )
+
+    def import_csv(self, csvfile: str) -> int:
+        """
+        导入好友 csv，已有的联系人以 csv 中的值为准（包括称谓、敬语、标志）.
+
+        Returns:
+            int: 导入的行数
+        """
+        imported = 0
+        with open(csvfile, mode="r", newline="", encoding="utf-8-sig") as file:
+            reader = csv.reader(file)
+            header = next(reader, list())
+            with self.conn:
+                for row in reader:
+                    if row and self.upsert(dict(zip(header, row)), keep=()) is not None:
+                        imported += 1
+        return imported
+
+    def export_csv(self, csvfile: str, tag: str = None, region: str = None) -> int:
+        """
+        按标签、地区导出好友 csv，可以直接作为发送计划.
+
+        表头为标准列加上导出的联系人中出现过的自定义列.
+
+        Returns:
+            int: 导出的联系人个数
+        """
+        contacts = self.query(tag, region)
+        header = list(CONTACT_COLUMNS)
+        for contact in contacts:
+            for column in contact:
+                if column not in header:
+                    header.append(column)
+        with open(csvfile, mode="w", newline="", encoding="utf-8-sig") as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerows(
+                [contact.get(column, "") for column in header] for contact in contacts
+            )
+        return len(contacts)
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  已定位控件的缓存，避免每个接收人都重新在整个窗口树中查找
+
+"""
+控件缓存。
+
+uiautomation 每次 wx_window.EditControl(...)、ListControl(foundIndex=2) 都会从窗口根部
+重新遍历控件树，找不到时还会卡满全局查找超时。搜索框、会话列表、搜索结果列表、消息列表
+这些控件在窗口存续期间基本不变，定位一次后缓存起来，之后只需读一次属性确认仍然有效。
+
+缓存按 (控件类型, 名称或标识) 存放。使用前读取控件的 Name 校验：控件已经失效（读取抛出
+异常）或名称不符时作废并重新定位。窗口重新连接时整个缓存清空。
+"""
+
+
+class ControlCache:
+    """已定位控件的缓存，记录命中、未命中和作废次数"""
+
+    def __init__(self):
+        self.controls = dict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def lookup(self, key: tuple, name: str = None):
+        """
+        取得仍然有效的缓存控件.
+
+        Args:
+            key(tuple): 缓存键，如 ("ListControl", "搜索结果")
+            name(str): 可选参数，控件应有的名称，用于校验缓存是否仍然有效
+
+        Returns:
+            缓存的控件，没有或已失效时返回 None
+        """
+        control = self.controls.get(key)
+        if control is not None:
+            if self._is_valid(control, name):
+                self.hits += 1
+                return control
+            del self.controls[key]
+            self.invalidations += 1
+        self.misses += 1
+        return None
+
+    def get(self, key: tuple, locate, name: str = None):
+        """
+        取得缓存的控件，没有或已失效时重新定位.
+
+        Args:
+            key(tuple): 缓存键
+            locate(Callable): 定位控件的函数，返回 uiautomation 控件
+            name(str): 可选参数，控件应有的名称
+
+        Returns:
+            控件。定位不到时返回未找到的控件本身（不缓存），使用时照常抛出 LookupError
+        """
+        control = self.lookup(key, name)
+        if control is None:
+            control = locate()
+            # Exists 查找一次并记住找到的元素，之后读取属性不再遍历控件树
+            if control.Exists(0, 0):
+                self.controls[key] = control
+        return control
+
+    def put(self, key: tuple, control) -> None:
+        """缓存已经确认存在的控件"""
+        self.controls[key] = control
+
+    @staticmethod
+    def _is_valid(control, name: str) -> bool:
+        try:
+            current = control.Name
+        except Exception:
+            return False
+        return name is None or current == name
+
+    def invalidate(self, key: tuple = None) -> None:
+        """作废一个控件；不指定 key 时清空整个缓存，用于窗口重建"""
+        if key is None:
+            self.invalidations += len(self.controls)
+            self.controls.clear()
+        elif self.controls.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
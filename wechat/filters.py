@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  接收人筛选：把筛选条件编译一次，在按列读入内存的联系人 csv 上整体求值
+
+"""
+接收人筛选。
+
+同一份好友 csv 经常要按标签、地区分成几批活动，以前只能在 Excel 里筛选后另存几份 csv。
+现在可以在界面或命令行（--where）写一个筛选条件，直接对原来的 csv 发送::
+
+    标签 contains "客户" and 地区 startswith "广东" and not 备注名 in blacklist.txt
+
+- 比较：==、!=、contains（包含）、startswith（开头是）、endswith（结尾是）、
+  matches（正则表达式）、in（属于列表）、not in；值可以加引号，不含空格时也可以不加；
+- 标签列的 contains、in 按单个标签比较（标签 contains "客户" 不会选中“老客户”）；
+- in 后面是括号中的列表，如 地区 in ("广东 深圳", "广东 广州")，或者一个文件：txt 每行
+  一个值（# 开头的行为注释），csv 取同名的列（没有时取第一列）；相对路径先按当前目录、
+  再按联系人 csv 所在的目录查找；
+- 组合：and（且）、or（或）、not（非）和括号，优先级 not > and > or。
+
+求值不逐行处理字典：PlanTable 把 csv 按列读入内存，每一列按去掉首尾空格后的值建立
+值 -> 行号 的索引（标签列按单个标签建立），比较只在不同的值上做一次，得到行号集合，
+and、or、not 都是集合运算。地区、标签这类重复很多的列，上万行的筛选只需几毫秒；同一份
+csv 读入一次后缓存，界面检查筛选条件和随后的发送任务共用，换几个条件分批发送也不再
+重新读取。筛选的结果是数据行的序号，交给 plan.iter_plan 跳过没有选中的行，不另外生成 csv。
+"""
+
+import csv
+import os
+import re
+import threading
+import zlib
+
+from wechat.scrape import normalize_tags
+
+# 按单个标签比较的列
+TAG_COLUMNS = ("标签",)
+
+# 关键字及其中文写法
+_KEYWORDS = {
+    "and": "and",
+    "且": "and",
+    "or": "or",
+    "或": "or",
+    "not": "not",
+    "非": "not",
+    "in": "in",
+    "属于": "in",
+    "contains": "contains",
+    "包含": "contains",
+    "startswith": "startswith",
+    "开头是": "startswith",
+    "endswith": "endswith",
+    "结尾是": "endswith",
+    "matches": "matches",
+}
+
+# 比较运算符
+_COMPARISONS = ("==", "!=", "contains", "startswith", "endswith", "matches", "in")
+
+_TOKEN = re.compile(
+    r"""
+    \s*(?:
+        (?P<string>"[^"]*"|'[^']*'|“[^”]*”)
+      | (?P<op>==|!=|=|\(|\)|（|）|,|，)
+      | (?P<word>[^\s()（）"'“”,，=!]+)
+    )
+    """,
+    re.VERBOSE,
+)
+
+_OPS = {"=": "==", "（": "(", "）": ")", "，": ","}
+
+
+def filter_key(expression: str) -> str:
+    """
+    筛选条件的标识，用于区分同一份 csv 按不同条件分批发送的流水.
+
+    Returns:
+        str: 没有条件时为空
+    """
+    expression = (expression or "").strip()
+    if not expression:
+        return ""
+    return "%08x" % zlib.crc32(expression.encode("utf-8"))
+
+
+def tokenize(expression: str) -> list:
+    """
+    拆分筛选条件.
+
+    Returns:
+        list: (类型, 文字)，类型为 string、op、keyword、word
+    """
+    tokens = list()
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise ValueError("筛选条件有误，无法识别：" + expression[position:].strip())
+        position = match.end()
+        if match.group("string") is not None:
+            tokens.append(("string", match.group("string")[1:-1]))
+        elif match.group("op") is not None:
+            text = match.group("op")
+            tokens.append(("op", _OPS.get(text, text)))
+        else:
+            text = match.group("word")
+            keyword = _KEYWORDS.get(text.lower())
+            tokens.append(("keyword", keyword) if keyword else ("word", text))
+    return tokens
+
+
+def read_values(path: str, column: str) -> set:
+    """
+    读取 in 后面的名单文件.
+
+    Args:
+        path(str): txt 每行一个值；csv 取与 column 同名的列，没有时取第一列
+        column(str): 比较的列
+
+    Returns:
+        set: 去掉首尾空格后的值，不含空值
+    """
+    with open(path, mode="r", encoding="utf-8-sig") as file:
+        if path.lower().endswith(".csv"):
+            reader = csv.reader(file)
+            header = next(reader, list())
+            idx = header.index(column) if column in header else 0
+            values = (row[idx] for row in reader if len(row) > idx)
+        else:
+            values = (line for line in file if not line.lstrip().startswith("#"))
+        return {value.strip() for value in values if value.strip()}
+
+
+class PlanTable:
+    """
+    按列读入内存的联系人 csv.
+
+    行号为数据行（表头之后）的序号，从 0 开始，与 plan.iter_plan 读到的行一一对应。
+
+    Args:
+        header(list): 表头
+        rows(list): 数据行
+    """
+
+    _lock = threading.Lock()
+    # 最近读入的一份 csv：(路径, 修改时间, 大小) -> PlanTable
+    _cached = (None, None)
+
+    def __init__(self, header: list, rows: list):
+        self.header = header
+        self.size = len(rows)
+        width = len(header)
+        # 一次转置成列，短行补空值
+        padded = (
+            row if len(row) >= width else row + [""] * (width - len(row)) for row in rows
+        )
+        columns = list(zip(*padded)) or [tuple()] * width
+        # 重名的列与 iter_plan 一样以最后一列为准
+        self.columns = {
+            column: columns[idx] for idx, column in enumerate(header) if column
+        }
+        self._distinct = dict()
+        self._tags = dict()
+        self._all = None
+
+    @classmethod
+    def load(cls, csvfile: str) -> "PlanTable":
+        """读入 csv，文件没有变化时直接返回上次读入的结果"""
+        stat = os.stat(csvfile)
+        signature = (os.path.abspath(csvfile), stat.st_mtime_ns, stat.st_size)
+        with cls._lock:
+            if cls._cached[0] == signature:
+                return cls._cached[1]
+        # 与 iter_plan 相同的方式读取，保证行号一致
+        with open(csvfile, mode="r", encoding="utf-8-sig") as file:
+            reader = csv.reader(file)
+            header = next(reader, list())
+            table = cls(header, list(reader))
+        with cls._lock:
+            PlanTable._cached = (signature, table)
+        return table
+
+    def all(self) -> set:
+        """所有行号"""
+        if self._all is None:
+            self._all = frozenset(range(self.size))
+        return self._all
+
+    def distinct(self, column: str) -> dict:
+        """列中去掉首尾空格后的每个值 -> 行号列表，第一次用到时建立"""
+        index = self._distinct.get(column)
+        if index is None:
+            index = dict()
+            for row, value in enumerate(self.columns[column]):
+                index.setdefault(value.strip(), list()).append(row)
+            self._distinct[column] = index
+        return index
+
+    def planned(self, rows) -> int:
+        """
+        rows 中 plan.iter_plan 会交给发送流程的行数：标志不是 N，昵称、备注名不都为空.
+
+        Args:
+            rows(Iterable): 行号
+
+        Returns:
+            int
+        """
+        marks = self.columns.get("标志")
+        names = [self.columns[c] for c in ("昵称", "备注名") if c in self.columns]
+        count = 0
+        for row in rows:
+            if marks is not None and marks[row] == "N":
+                continue
+            if any(column[row].strip() for column in names):
+                count += 1
+        return count
+
+    def tags(self, column: str) -> dict:
+        """标签列中的每个标签 -> 行号列表"""
+        index = self._tags.get(column)
+        if index is None:
+            index = dict()
+            for value, rows in self.distinct(column).items():
+                for tag in normalize_tags(value):
+                    index.setdefault(tag, list()).extend(rows)
+            self._tags[column] = index
+        return index
+
+
+def _where(index: dict, predicate) -> set:
+    """索引中满足条件的值对应的所有行"""
+    selected = set()
+    for value, rows in index.items():
+        if predicate(value):
+            selected.update(rows)
+    return selected
+
+
+def _among(index: dict, values: set) -> set:
+    """索引中属于 values 的值对应的所有行，按两者中较小的一方遍历"""
+    selected = set()
+    if len(values) < len(index):
+        for value in values:
+            selected.update(index.get(value, ()))
+    else:
+        for value, rows in index.items():
+            if value in values:
+                selected.update(rows)
+    return selected
+
+
+def _compare(column: str, op: str, operand):
+    """编译一个比较，返回 PlanTable -> 行号集合 的函数"""
+    tagged = column in TAG_COLUMNS and op in ("contains", "in")
+
+    def index_of(table: PlanTable) -> dict:
+        return table.tags(column) if tagged else table.distinct(column)
+
+    if op == "==":
+        return lambda table: set(table.distinct(column).get(operand, ()))
+    if op == "!=":
+        return lambda table: table.all() - set(table.distinct(column).get(operand, ()))
+    if op == "in":
+        return lambda table: _among(index_of(table), operand)
+    if tagged:
+        return lambda table: set(table.tags(column).get(operand, ()))
+    if op == "contains":
+        predicate = lambda value: operand in value
+    elif op == "startswith":
+        predicate = lambda value: value.startswith(operand)
+    elif op == "endswith":
+        predicate = lambda value: value.endswith(operand)
+    else:
+        predicate = lambda value: operand.search(value) is not None
+    return lambda table: _where(table.distinct(column), predicate)
+
+
+class _Parser:
+    """递归下降解析，边解析边编译成集合运算"""
+
+    def __init__(self, tokens: list, base_dir: str = ""):
+        self.tokens = tokens
+        self.position = 0
+        self.base_dir = base_dir
+        self.columns = list()
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self):
+        token = self.peek()
+        if token[0] is None:
+            raise ValueError("筛选条件不完整")
+        self.position += 1
+        return token
+
+    def accept(self, kind: str, text: str) -> bool:
+        if self.peek() == (kind, text):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, kind: str, text: str) -> None:
+        if not self.accept(kind, text):
+            raise ValueError("筛选条件有误，缺少 " + text + "：" + self.near())
+
+    def near(self) -> str:
+        rest = [text for _, text in self.tokens[self.position : self.position + 3]]
+        return " ".join(rest) if rest else "（结尾）"
+
+    def parse(self):
+        evaluate = self.parse_or()
+        if self.peek()[0] is not None:
+            raise ValueError("筛选条件有误，多余的内容：" + self.near())
+        return evaluate
+
+    def parse_or(self):
+        terms = [self.parse_and()]
+        while self.accept("keyword", "or"):
+            terms.append(self.parse_and())
+        if len(terms) == 1:
+            return terms[0]
+
+        def evaluate(table):
+            selected = set()
+            for term in terms:
+                selected |= term(table)
+            return selected
+
+        return evaluate
+
+    def parse_and(self):
+        terms = [self.parse_term()]
+        while self.accept("keyword", "and"):
+            terms.append(self.parse_term())
+        if len(terms) == 1:
+            return self.complement(*terms[0])
+        # 取反的条件直接从结果中减去，不必先求出补集
+        included = [term for negated, term in terms if not negated]
+        excluded = [term for negated, term in terms if negated]
+
+        def evaluate(table):
+            selected = included[0](table) if included else table.all()
+            for term in included[1:]:
+                if not selected:
+                    return selected
+                selected = selected & term(table)
+            for term in excluded:
+                if not selected:
+                    return selected
+                selected = selected - term(table)
+            return selected
+
+        return evaluate
+
+    def complement(self, negated: bool, term):
+        if negated:
+            return lambda table: table.all() - term(table)
+        return term
+
+    def parse_term(self):
+        """
+        一个条件：not 条件、括号或比较.
+
+        Returns:
+            (是否取反, PlanTable -> 行号集合 的函数)
+        """
+        if self.accept("keyword", "not"):
+            negated, term = self.parse_term()
+            return not negated, term
+        if self.accept("op", "("):
+            evaluate = self.parse_or()
+            self.expect("op", ")")
+            return False, evaluate
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        kind, column = self.take()
+        if kind not in ("word", "string"):
+            raise ValueError("筛选条件有误，应为列名：" + str(column))
+        if column not in self.columns:
+            self.columns.append(column)
+        negate = self.accept("keyword", "not")
+        kind, op = self.take()
+        if op not in _COMPARISONS or kind not in ("op", "keyword"):
+            raise ValueError("筛选条件有误，" + column + " 后面应为比较运算符：" + str(op))
+        if negate and op != "in":
+            raise ValueError("筛选条件有误，not 后面只能是 in：" + column + " not " + op)
+        if op == "in":
+            operand = self.parse_values(column)
+        else:
+            operand = self.parse_value().strip()
+            if op == "matches":
+                try:
+                    operand = re.compile(operand)
+                except re.error as ex:
+                    raise ValueError("筛选条件中的正则表达式有误：" + str(ex))
+        return negate, _compare(column, op, operand)
+
+    def parse_value(self) -> str:
+        kind, text = self.take()
+        if kind not in ("word", "string"):
+            raise ValueError("筛选条件有误，应为比较的值：" + str(text))
+        return text
+
+    def parse_values(self, column: str) -> set:
+        """in 后面的括号列表或名单文件"""
+        if self.accept("op", "("):
+            values = {self.parse_value().strip()}
+            while self.accept("op", ","):
+                values.add(self.parse_value().strip())
+            self.expect("op", ")")
+            return values
+        path = self.parse_value()
+        if not os.path.isabs(path) and not os.path.exists(path) and self.base_dir:
+            candidate = os.path.join(self.base_dir, path)
+            if os.path.exists(candidate):
+                path = candidate
+        return read_values(path, column)
+
+
+class RecipientFilter:
+    """
+    编译后的筛选条件.
+
+    Args:
+        expression(str): 筛选条件，为空时不筛选
+        base_dir(str): 可选参数，名单文件的相对路径在当前目录找不到时，再到这个目录查找
+    """
+
+    def __init__(self, expression: str, base_dir: str = ""):
+        self.expression = (expression or "").strip()
+        self.key = filter_key(self.expression)
+        self.columns = list()
+        self._evaluate = None
+        # 最近一次求值：(PlanTable, 选中的行号)，同一份 csv 没有变化时直接复用
+        self._selection = (None, None)
+        if self.expression:
+            parser = _Parser(tokenize(self.expression), base_dir)
+            self._evaluate = parser.parse()
+            self.columns = parser.columns
+
+    @property
+    def empty(self) -> bool:
+        return self._evaluate is None
+
+    def check(self, header: list) -> None:
+        """条件中的列都要在 csv 中，否则抛出 ValueError"""
+        unknown = [column for column in self.columns if column not in header]
+        if unknown:
+            raise ValueError("筛选条件中有csv不存在的列：" + "、".join(unknown))
+
+    def select(self, table: PlanTable) -> set:
+        """选中的行号"""
+        if self.empty:
+            return set(table.all())
+        self.check(table.header)
+        return self._evaluate(table)
+
+    def rows(self, csvfile: str):
+        """
+        联系人 csv 中选中的行号，交给 plan.iter_plan.
+
+        Returns:
+            frozenset: 选中的数据行序号；没有条件时为 None，表示不筛选
+        """
+        if self.empty:
+            return None
+        table = PlanTable.load(csvfile)
+        if self._selection[0] is not table:
+            self._selection = (table, frozenset(self.select(table)))
+        return self._selection[1]
+
+    def planned(self, csvfile: str):
+        """
+        选中的行中要处理的个数（不含标志为 N、没有名称的行），用作进度的总数.
+
+        直接用 rows 已经读入的 PlanTable 计算，不再读一遍 csv。
+
+        Returns:
+            int：没有条件时为 None，总数要读完 csv 才知道
+        """
+        selected = self.rows(csvfile)
+        if selected is None:
+            return None
+        return PlanTable.load(csvfile).planned(selected)
+
+
+def compile_filter(expression: str, csvfile: str = None) -> RecipientFilter:
+    """
+    编译筛选条件；给出联系人 csv 时同时检查列名、读入 csv，条件有误时尽早抛出 ValueError.
+
+    Args:
+        expression(str): 筛选条件，可以为空
+        csvfile(str): 可选参数，联系人 csv，名单文件也会在它所在的目录查找
+
+    Returns:
+        RecipientFilter
+    """
+    if isinstance(expression, RecipientFilter):
+        recipients = expression
+    else:
+        base_dir = os.path.dirname(os.path.abspath(csvfile)) if csvfile else ""
+        recipients = RecipientFilter(expression, base_dir)
+    if csvfile and not recipients.empty:
+        recipients.rows(csvfile)
+    return recipients
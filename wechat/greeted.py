@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  已问候联系人索引：汇总历次发送日志，跨活动跳过最近已问候过的联系人
+
+"""
+已问候联系人索引。
+
+索引从程序目录下历次正式发送的日志（_log*.csv）中汇总标志为 D 的记录，按微信名和
+备注名（没有备注名时为昵称）记录最近一次问候的时间，保存在 _greeted_index.json 中。
+已经汇总过的日志按文件大小记录，之后只读取新增或有变化的日志。
+
+索引加载后就是一个字典，判断联系人是否问候过是 O(1) 的查找，与历史日志的行数无关。
+"""
+
+import csv
+import glob
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+INDEX_FILE = "_greeted_index.json"
+LOG_PATTERN = "_log*.csv"
+
+_LOG_TIME = re.compile(r"(\d{8}-\d{6})")
+
+
+def _log_time(path: str) -> float:
+    """日志的时间：优先取文件名中的时间戳，否则取修改时间"""
+    match = _LOG_TIME.search(os.path.basename(path))
+    if match:
+        try:
+            return datetime.strptime(match.group(1), "%Y%m%d-%H%M%S").timestamp()
+        except ValueError:
+            pass
+    return os.path.getmtime(path)
+
+
+def task_names(task: dict) -> list:
+    """计划条目在索引中的键：微信名、备注名（没有备注名时为昵称）"""
+    names = list()
+    for key in ("wechatname", "namecomment"):
+        if task.get(key, "").strip():
+            names.append(task[key])
+    if not names and task.get("nickname", "").strip():
+        names.append(task["nickname"])
+    return names
+
+
+class GreetingIndex:
+    """
+    已问候联系人索引.
+
+    Args:
+        path(str): 索引文件
+        log_pattern(str): 发送日志的文件名模式
+    """
+
+    def __init__(self, path: str = INDEX_FILE, log_pattern: str = LOG_PATTERN):
+        self.path = path
+        self.log_pattern = log_pattern
+        # 微信名或备注名 -> 最近一次问候的时间戳
+        self.greeted = dict()
+        # 已汇总的日志文件 -> 汇总时的文件大小
+        self.files = dict()
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, mode="r", encoding="utf-8") as file:
+                data = json.load(file)
+            self.greeted = data.get("greeted", dict())
+            self.files = data.get("files", dict())
+        except (OSError, ValueError) as ex:
+            # 索引损坏时从日志重建
+            print("读取已问候索引失败，将重新汇总日志：", ex)
+            self.greeted = dict()
+            self.files = dict()
+
+    def save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, mode="w", encoding="utf-8") as file:
+            json.dump(
+                {"greeted": self.greeted, "files": self.files},
+                file,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, directory: str = ".") -> int:
+        """
+        汇总新增或有变化的发送日志.
+
+        Args:
+            directory(str): 日志所在目录
+
+        Returns:
+            int: 新汇总的问候记录条数
+        """
+        count = 0
+        for path in glob.glob(os.path.join(directory, self.log_pattern)):
+            name = os.path.basename(path)
+            size = os.path.getsize(path)
+            if self.files.get(name) == size:
+                continue
+            count += self._ingest(path)
+            self.files[name] = size
+        return count
+
+    def _ingest(self, path: str) -> int:
+        when = _log_time(path)
+        count = 0
+        with open(path, mode="r", newline="", encoding="utf-8-sig") as file:
+            reader = csv.reader(file)
+            header = next(reader, list())
+            if "标志" not in header:
+                return 0
+            mark_idx = header.index("标志")
+            columns = [
+                (key, header.index(column))
+                for column, key in (
+                    ("微信名", "wechatname"),
+                    ("备注名", "namecomment"),
+                    ("昵称", "nickname"),
+                )
+                if column in header
+            ]
+            for row in reader:
+                if mark_idx >= len(row) or row[mark_idx] != "D":
+                    continue
+                task = {key: row[idx] for key, idx in columns if idx < len(row)}
+                self.add(task, when)
+                count += 1
+        return count
+
+    def add(self, task: dict, when: float = None) -> None:
+        """记录一次问候"""
+        when = time.time() if when is None else when
+        for name in task_names(task):
+            if self.greeted.get(name, 0) < when:
+                self.greeted[name] = when
+
+    def mark_ingested(self, logfile: str) -> None:
+        """本次发送已经逐条 add 过的日志，标记为已汇总，下次不必重读"""
+        if logfile and os.path.exists(logfile):
+            self.files[os.path.basename(logfile)] = os.path.getsize(logfile)
+
+    def last_greeted(self, task: dict):
+        """
+        联系人最近一次被问候的时间.
+
+        有微信名时只按微信名查找，避免昵称相同的不同联系人被误判。
+
+        Returns:
+            float: 时间戳，没有问候过返回 None
+        """
+        if task.get("wechatname", "").strip():
+            return self.greeted.get(task["wechatname"])
+        for name in task_names(task):
+            if name in self.greeted:
+                return self.greeted[name]
+        return None
+
+    def greeted_since(self, task: dict, since: float) -> bool:
+        last = self.last_greeted(task)
+        return last is not None and last >= since
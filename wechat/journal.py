@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  发送流水：每个接收人的发送结果在发生时立即落盘，崩溃后可从中断处继续
+
+"""
+发送流水（write-ahead journal）。
+
+流水文件只追加不修改，每条记录写入后立即 flush 并 fsync，程序崩溃、微信重启或被强制
+结束时，已经写入的记录都不会丢失。记录的状态有：
+
+- B 一次新的发送开始（不是续发）
+- P 即将发送给某个接收人
+- D 发送成功
+- E 发送失败
+- C 按下回车之前被停止，什么也没有发出
+- F 整个计划处理完毕
+
+续发时从最后一个 B 开始重放流水：D 的接收人直接跳过；只有 P 没有结果的接收人是在发送
+过程中中断的，可能已经发出，也跳过并标记为未确认，留给人工核对，避免重复发送。
+"""
+
+import csv
+import os
+from datetime import datetime
+
+BEGIN = "B"
+PENDING = "P"
+DELIVERED = "D"
+ERROR = "E"
+CANCELLED = "C"
+FINISHED = "F"
+
+
+def journal_path(
+    csvfile: str, only_log: bool, session: str = "", segment: str = ""
+) -> str:
+    """
+    联系人 csv 对应的流水文件，模拟发送和真实发送分开记录，多个微信窗口同时发送时每个会话分开记录，
+    同一份 csv 按不同筛选条件分批发送时每批分开记录（segment 为 filters.filter_key）
+    """
+    base = os.path.splitext(csvfile)[0]
+    if segment:
+        base += "." + segment
+    if session:
+        base += "." + session
+    return base + (".dryrun" if only_log else "") + ".journal.csv"
+
+
+class JournalState:
+    """重放流水得到的状态"""
+
+    def __init__(self):
+        self.delivered = set()
+        self.failed = set()
+        self.pending = set()
+        self.finished = False
+        self.started = False
+
+    def apply(self, status: str, key: str) -> None:
+        if status == BEGIN:
+            self.__init__()
+            self.started = True
+        elif status == PENDING:
+            self.pending.add(key)
+        elif status == DELIVERED:
+            self.pending.discard(key)
+            self.failed.discard(key)
+            self.delivered.add(key)
+        elif status == ERROR:
+            self.pending.discard(key)
+            self.failed.add(key)
+        elif status == CANCELLED:
+            self.pending.discard(key)
+        elif status == FINISHED:
+            self.finished = True
+
+
+def replay(path: str) -> JournalState:
+    """
+    重放流水文件，得到最近一次发送（含续发）的状态.
+
+    Args:
+        path(str): 流水文件
+
+    Returns:
+        JournalState
+    """
+    state = JournalState()
+    if not os.path.exists(path):
+        return state
+    with open(path, mode="r", newline="", encoding="utf-8-sig") as file:
+        for row in csv.reader(file):
+            # 崩溃时最后一行可能只写了一半，字段不全的行忽略
+            if len(row) < 4:
+                continue
+            state.apply(row[1], row[2])
+    return state
+
+
+class SendJournal:
+    """
+    追加写入的发送流水.
+
+    Args:
+        path(str): 流水文件
+        resume(bool): 是否续发。续发时重放已有流水，否则写入 B 开始一次新的发送
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.state = replay(path) if resume else JournalState()
+        self.file = open(path, mode="a", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+        if not resume or not self.state.started:
+            self._append(BEGIN)
+            self.state.apply(BEGIN, "")
+
+    @property
+    def delivered(self) -> set:
+        return self.state.delivered
+
+    @property
+    def uncertain(self) -> set:
+        """发送过程中中断、不确定是否已发出的接收人"""
+        return self.state.pending
+
+    def _append(self, status: str, key: str = "", msg: str = "") -> None:
+        self.writer.writerow(
+            [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), status, key, msg]
+        )
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def begin_send(self, key: str) -> None:
+        """发送前记录，发送中崩溃时可以知道哪个接收人处于未确认状态"""
+        self._append(PENDING, key)
+
+    def record(self, key: str, status: str, msg: str = "") -> None:
+        """记录发送结果，status 为 D、E 或 C"""
+        self._append(status, key, msg)
+        self.state.apply(status, key)
+
+    def finish(self) -> None:
+        """整个计划处理完毕"""
+        self._append(FINISHED)
+        self.state.finished = True
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  发送节奏：令牌桶限速，失败或变慢时自动降速，恢复后逐步提速
+
+"""
+发送节奏控制。
+
+Pacer 位于逐行读取计划和实际发送之间，每次发送前 acquire 取得一个令牌：
+
+- 令牌桶：按每分钟、每小时的上限中更严格的一个匀速补充令牌，桶容量即允许的连发个数
+  （burst），可以再加一点随机间隔（jitter），避免发送间隔过于规整。
+- 自适应：每次发送后 record 发送结果和耗时。发送失败，或者近期耗时明显高于平时
+  （微信开始变慢）时，速率减半；之后每成功一次，速率按上限的一定比例回升，直到恢复到
+  上限。没有设置上限时，以第一次降速前实际的发送速度为基准，恢复到该速度后重新不限速。
+  因耗时变慢降速之后，要再发送几条才会再次因耗时降速，给降速留出生效的时间。
+
+这样不必凭经验在各处加固定等待，发送速度会停在微信能够承受的最高水平附近。
+"""
+
+import random
+import time
+
+# 自适应调整：降速时速率乘以 BACKOFF_FACTOR，每成功一次回升上限（或当前速率）的 RECOVER_STEP
+BACKOFF_FACTOR = 0.5
+RECOVER_STEP = 0.1
+
+# 降速的下限：每分钟 1 条
+MIN_RATE = 1 / 60
+
+# 近期耗时（快速移动平均）超过平时耗时（慢速移动平均）的倍数时视为变慢
+LATENCY_FACTOR = 2.0
+# 因耗时变慢降速之后，至少再发送这么多条才会再次因耗时降速
+LATENCY_COOLDOWN = 3
+FAST_ALPHA = 0.3
+SLOW_ALPHA = 0.05
+
+# 等待令牌时每次最多睡眠的时间，保证停止发送时能及时响应
+WAIT_SLICE = 0.1
+MIN_SLEEP = 0.001
+
+
+class Pacer:
+    """
+    发送节奏控制.
+
+    Args:
+        per_minute(float): 可选参数，每分钟最多发送的条数，0 表示不限制
+        per_hour(float): 可选参数，每小时最多发送的条数，0 表示不限制
+        burst(int): 可选参数，允许连续发送的条数（令牌桶容量）
+        jitter(float): 可选参数，每次发送前额外随机等待的比例，如 0.3 表示最多再等平均间隔的 30%
+        adaptive(bool): 可选参数，是否按失败和耗时自动降速
+        clock(Callable): 可选参数，时钟，默认为 time.monotonic
+        sleep(Callable): 可选参数，睡眠函数，默认为 time.sleep
+    """
+
+    def __init__(
+        self,
+        per_minute: float = 0,
+        per_hour: float = 0,
+        burst: int = 1,
+        jitter: float = 0.0,
+        adaptive: bool = True,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.per_minute = per_minute
+        self.per_hour = per_hour
+        rates = list()
+        if per_minute:
+            rates.append(per_minute / 60)
+        if per_hour:
+            rates.append(per_hour / 3600)
+        # 上限（条/秒），None 表示不限制
+        self.max_rate = min(rates) if rates else None
+        # 当前速率，自适应降速后低于上限
+        self.rate = self.max_rate
+        # 没有上限时，第一次降速前实际的发送速度，作为回升的基准
+        self.ceiling = None
+        self.cooldown = 0
+        self.capacity = max(1, int(burst))
+        self.jitter = jitter
+        self.adaptive = adaptive
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(self.capacity)
+        self.updated = clock()
+        self.last_grant = None
+        # 实际发送间隔的移动平均，用于没有上限时确定降速的基准
+        self.interval_avg = None
+        self.latency_fast = None
+        self.latency_slow = None
+        self.waited = 0.0
+        self.backoffs = 0
+
+    def _refill(self) -> None:
+        now = self.clock()
+        if self.rate is None:
+            self.tokens = float(self.capacity)
+        else:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def clone(self) -> "Pacer":
+        """相同设置的新 Pacer，多个窗口同时发送时每个账号各自限速"""
+        return Pacer(
+            self.per_minute,
+            self.per_hour,
+            self.capacity,
+            self.jitter,
+            self.adaptive,
+            self.clock,
+            self.sleep,
+        )
+
+    def delay(self) -> float:
+        """距离下一个令牌还要等待的时间（秒），不等待、不消耗令牌"""
+        self._refill()
+        if self.tokens >= 1 - 1e-9:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self, should_stop=None) -> bool:
+        """
+        等待并取得一次发送的令牌.
+
+        Args:
+            should_stop(Callable): 可选参数，返回 True 时放弃等待
+
+        Returns:
+            bool: 取得令牌返回 True，等待中被停止返回 False
+        """
+        start = self.clock()
+        self._refill()
+        # 浮点误差可能让令牌停在 0.999…，留一点余量，每次也至少睡眠 MIN_SLEEP
+        while self.tokens < 1 - 1e-9:
+            if should_stop is not None and should_stop():
+                self.waited += self.clock() - start
+                return False
+            self.sleep(max(MIN_SLEEP, min(WAIT_SLICE, (1 - self.tokens) / self.rate)))
+            self._refill()
+        self.tokens = max(0.0, self.tokens - 1)
+
+        if self.jitter and self.rate:
+            extra = random.uniform(0, self.jitter / self.rate)
+            end = self.clock() + extra
+            while self.clock() < end:
+                if should_stop is not None and should_stop():
+                    self.waited += self.clock() - start
+                    return False
+                self.sleep(min(WAIT_SLICE, end - self.clock()))
+
+        now = self.clock()
+        self.waited += now - start
+        if self.last_grant is not None:
+            self.interval_avg = _ewma(self.interval_avg, now - self.last_grant, FAST_ALPHA)
+        self.last_grant = now
+        return True
+
+    def record(self, ok: bool, latency: float) -> None:
+        """
+        记录一次发送的结果.
+
+        Args:
+            ok(bool): 是否发送成功
+            latency(float): 发送耗时（秒），不含等待令牌的时间
+        """
+        self.latency_fast = _ewma(self.latency_fast, latency, FAST_ALPHA)
+        if not self.adaptive:
+            return
+        if self.cooldown:
+            self.cooldown -= 1
+        if not ok:
+            self._back_off()
+        elif (
+            self.latency_slow is not None
+            and self.latency_fast > self.latency_slow * LATENCY_FACTOR
+        ):
+            if not self.cooldown:
+                self._back_off()
+                self.cooldown = LATENCY_COOLDOWN
+        else:
+            # 只用正常的耗时更新平时耗时，变慢期间的耗时不会把基准抬高
+            self.latency_slow = _ewma(self.latency_slow, latency, SLOW_ALPHA)
+            self._recover()
+
+    def _back_off(self) -> None:
+        current = self.rate
+        if current is None:
+            if not self.interval_avg:
+                return
+            current = self.ceiling = 1 / self.interval_avg
+        self.rate = max(MIN_RATE, current * BACKOFF_FACTOR)
+        # 降速后不再允许连发
+        self.tokens = min(self.tokens, 0.0)
+        self.backoffs += 1
+
+    def _recover(self) -> None:
+        if self.rate is None:
+            return
+        reference = self.max_rate or self.ceiling
+        self.rate += reference * RECOVER_STEP
+        if self.rate >= reference:
+            # 恢复到上限；没有上限时恢复到降速前的速度，重新不限速
+            self.rate = self.max_rate
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_minute": round(self.rate * 60, 2) if self.rate else None,
+            "waited": round(self.waited, 2),
+            "backoffs": self.backoffs,
+            "latency": round(self.latency_fast, 3) if self.latency_fast else None,
+        }
+
+
+def _ewma(average: float, sample: float, alpha: float) -> float:
+    return sample if average is None else average + alpha * (sample - average)
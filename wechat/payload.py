@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  多段消息：每个接收人的文字、图片、文件，在一次聊天窗口跳转中全部发出
+
+"""
+多段消息。
+
+一个接收人的消息（Payload）可以由几段文字、若干图片和文件组成，来源有三处：
+
+- 界面上的消息模板
+- 活动定义（Campaign），一个 JSON 文件，对所有接收人都发送的文字、图片、文件::
+
+    {"messages": ["第二段，{称谓}……"], "images": ["card.png"], "files": ["活动介绍.pdf"]}
+
+  相对路径相对于 JSON 文件所在目录。
+- 联系人 csv 的附加列：列名以 附加消息 开头的列是额外的文字（可以引用占位符），
+  以 图片、文件 开头的列是图片和文件路径，一格中有多个路径时用 ; 或 | 分隔，
+  相对路径相对于 csv 文件所在目录。
+  附加消息每行各不相同，只能逐行检查占位符：有 csv 中不存在的列时这一行不发送。
+
+PayloadBuilder 把模板编译一次，按行生成 Payload；发送时跳转聊天窗口、定位输入框只做
+一次，之后依次发出每段文字，再把图片和文件一起粘贴发出。
+"""
+
+import json
+import os
+import re
+
+from wechat.template import MsgTemplate
+
+TEXT = "text"
+IMAGE = "image"
+FILE = "file"
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
+
+# csv 附加列的列名前缀
+TEXT_PREFIX = "附加消息"
+IMAGE_PREFIX = "图片"
+FILE_PREFIX = "文件"
+
+_PATH_SEPARATOR = re.compile(r"[;；|\n]")
+
+
+def file_kind(path: str) -> str:
+    """按扩展名区分图片和普通文件"""
+    return IMAGE if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS else FILE
+
+
+def split_paths(cell: str) -> list:
+    """一格中的多个路径"""
+    return [path.strip() for path in _PATH_SEPARATOR.split(cell or "") if path.strip()]
+
+
+class Payload:
+    """
+    一个接收人的多段消息.
+
+    Args:
+        parts(list): 可选参数，(类型, 内容) 列表，类型为 text、image、file
+    """
+
+    def __init__(self, parts: list = None):
+        self.parts = list(parts or list())
+        # 附加消息列中 csv 里不存在的占位符，有时这一行不能发送
+        self.unknown_placeholders = list()
+
+    def add_text(self, text: str) -> None:
+        if text and text.strip():
+            self.parts.append((TEXT, text))
+
+    def add_file(self, path: str) -> None:
+        if path:
+            self.parts.append((file_kind(path), path))
+
+    @property
+    def texts(self) -> list:
+        return [value for kind, value in self.parts if kind == TEXT]
+
+    @property
+    def files(self) -> list:
+        """图片和文件的路径，粘贴时一起放到剪切板"""
+        return [value for kind, value in self.parts if kind != TEXT]
+
+    def missing_files(self) -> list:
+        return [path for path in self.files if not os.path.exists(path)]
+
+    def summary(self) -> str:
+        """写入发送日志的内容：文字原文，图片和文件只记文件名"""
+        lines = list(self.texts)
+        for kind, value in self.parts:
+            if kind != TEXT:
+                lines.append(
+                    ("[图片]" if kind == IMAGE else "[文件]") + os.path.basename(value)
+                )
+        return "\n".join(lines)
+
+    def __bool__(self):
+        return bool(self.parts)
+
+    def __repr__(self):
+        return f"Payload({self.parts!r})"
+
+
+class Campaign:
+    """
+    活动定义：对所有接收人都发送的文字、图片、文件.
+
+    Args:
+        messages(list): 可选参数，文字模板，可以引用占位符
+        images(list): 可选参数，图片路径
+        files(list): 可选参数，文件路径
+    """
+
+    def __init__(self, messages: list = None, images: list = None, files: list = None):
+        self.messages = list(messages or list())
+        self.images = list(images or list())
+        self.files = list(files or list())
+
+    @classmethod
+    def load(cls, path: str) -> "Campaign":
+        """读取活动定义 JSON，相对路径相对于 JSON 文件所在目录"""
+        with open(path, mode="r", encoding="utf-8-sig") as file:
+            data = json.load(file)
+        base = os.path.dirname(os.path.abspath(path))
+
+        def resolve(paths: list) -> list:
+            return [os.path.join(base, p) for p in paths]
+
+        return cls(
+            data.get("messages", list()),
+            resolve(data.get("images", list())),
+            resolve(data.get("files", list())),
+        )
+
+
+class PayloadBuilder:
+    """
+    按计划条目生成多段消息，模板只编译一次.
+
+    Args:
+        msg_template(str): 界面上的消息模板，可以为空
+        header(list): 联系人 csv 的表头，用于找出附加列
+        campaign(Campaign): 可选参数，活动定义
+        attachments(list): 可选参数，对所有接收人都发送的图片和文件路径
+        base_dir(str): 可选参数，csv 图片、文件列中相对路径的基准目录，一般为 csv 所在目录
+    """
+
+    def __init__(
+        self,
+        msg_template: str,
+        header: list,
+        campaign: Campaign = None,
+        attachments: list = None,
+        base_dir: str = None,
+    ):
+        campaign = campaign or Campaign()
+        self.templates = [
+            MsgTemplate(text)
+            for text in [msg_template] + campaign.messages
+            if text and text.strip()
+        ]
+        self.renderers = [template.renderer() for template in self.templates]
+        self.columns = list(header)
+        self.text_columns = [c for c in header if c.startswith(TEXT_PREFIX)]
+        self.file_columns = [
+            c for c in header if c.startswith(IMAGE_PREFIX) or c.startswith(FILE_PREFIX)
+        ]
+        self.files = campaign.images + campaign.files + list(attachments or list())
+        self.base_dir = base_dir
+
+    def unknown_placeholders(self, columns) -> list:
+        """所有模板中 csv 里不存在的占位符"""
+        unknown = list()
+        for template in self.templates:
+            for name in template.unknown_placeholders(columns):
+                if name not in unknown:
+                    unknown.append(name)
+        return unknown
+
+    def is_empty(self) -> bool:
+        """没有任何模板、附加列和附件，不会生成任何内容"""
+        return not (self.templates or self.text_columns or self.file_columns or self.files)
+
+    def build(self, task: dict) -> Payload:
+        payload = Payload()
+        for render in self.renderers:
+            payload.add_text(render(task))
+        for column in self.text_columns:
+            if task.get(column, "").strip():
+                template = MsgTemplate(task[column])
+                unknown = template.unknown_placeholders(self.columns)
+                if unknown:
+                    # 拼错的占位符会渲染成空白，不发出这一段，由调用者按出错处理
+                    for name in unknown:
+                        if name not in payload.unknown_placeholders:
+                            payload.unknown_placeholders.append(name)
+                    continue
+                payload.add_text(template.render(task))
+        for path in self.files:
+            payload.add_file(path)
+        for column in self.file_columns:
+            for path in split_paths(task.get(column, "")):
+                payload.add_file(
+                    os.path.join(self.base_dir, path) if self.base_dir else path
+                )
+        return payload
+
+    def build_many(self, tasks):
+        """
+        批量生成.
+
+        Args:
+            tasks(Iterable[dict]): 计划条目
+
+        Yields:
+            tuple: (计划条目, Payload)
+        """
+        for task in tasks:
+            yield task, self.build(task)
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  发送计划：逐行读取联系人 csv，过滤后交给发送流程；发送结果逐行写入日志
+
+"""
+发送计划的流式处理。
+
+iter_plan 是一个生成器，每读出一行就解析、过滤后立即交给调用者，不会先把整个 csv
+读进内存；SendLog 每处理完一个接收人就追加一行日志。这样无论 csv 有多大，内存占用都
+保持平稳，第一条消息也不用等整个文件读完才发出。
+"""
+
+import csv
+
+import wechat.utils as utils
+
+# csv 表头 -> 计划条目中的键
+PLAN_COLUMNS = (
+    ("昵称", "nickname"),
+    ("备注名", "namecomment"),
+    ("微信名", "wechatname"),
+    ("地区", "location"),
+    ("标签", "tag"),
+    ("称谓", "title"),
+    ("敬语", "you"),
+    ("标志", "mark"),
+)
+
+# 正式发送和模拟发送的日志文件名，模拟发送的日志不计入已问候索引
+LOG_FILENAME = "_log[%Y%m%d-%H%M%S].csv"
+MOCK_LOG_FILENAME = "_mock_log[%Y%m%d-%H%M%S].csv"
+
+
+def log_filename(only_log: bool, session: str = "") -> str:
+    """
+    发送日志的文件名模板.
+
+    Args:
+        only_log(bool): 是否为模拟发送
+        session(str): 可选参数，多个微信窗口同时发送时的会话标签，每个会话单独写日志
+
+    Returns:
+        str: 如 _log[%Y%m%d-%H%M%S].csv、_log_账号1_[%Y%m%d-%H%M%S].csv
+    """
+    name = MOCK_LOG_FILENAME if only_log else LOG_FILENAME
+    if session:
+        name = name.replace("[", "_" + session + "_[", 1)
+    return name
+
+
+LOG_HEADER = [
+    "昵称",
+    "备注名",
+    "微信名",
+    "地区",
+    "标签",
+    "称谓",
+    "敬语",
+    "标志",
+    "已发送信息",
+]
+
+
+class PlanStats:
+    """计划读取过程中的计数"""
+
+    def __init__(self):
+        self.rows = 0
+        self.skipped = 0
+
+    @property
+    def planned(self) -> int:
+        """交给调用者的行数（不含跳过的行）"""
+        return self.rows - self.skipped
+
+
+class SendSummary:
+    """
+    一次发送的计数，多个微信窗口同时发送时每个会话一份，结束后合并.
+
+    Args:
+        session(str): 可选参数，会话标签
+    """
+
+    def __init__(self, session: str = ""):
+        self.session = session
+        self.processed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.resumed = 0
+        self.greeted = 0
+        self.unresolved = 0
+        # 发出了一部分后出错，可能已经收到，既不算成功也不算失败，留给人工核对
+        self.uncertain = 0
+        self.stopped = False
+        # 写出的发送日志，合并后为各个会话的日志
+        self.log_files = list()
+
+    def skipped_total(self) -> int:
+        return self.skipped + self.resumed + self.greeted + self.unresolved
+
+    def merge(self, other: "SendSummary") -> None:
+        for name in (
+            "processed",
+            "succeeded",
+            "failed",
+            "skipped",
+            "resumed",
+            "greeted",
+            "unresolved",
+            "uncertain",
+        ):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.stopped = self.stopped or other.stopped
+        self.log_files.extend(other.log_files)
+
+
+def read_header(csvfile: str) -> list:
+    """读取联系人 csv 的表头"""
+    with open(csvfile, mode="r", encoding="utf-8-sig") as file:
+        return next(csv.reader(file), list())
+
+
+def iter_plan(
+    csvfile: str,
+    stats: PlanStats = None,
+    task_filter=None,
+    selected: frozenset = None,
+    quiet: bool = False,
+):
+    """
+    逐行读取联系人 csv，生成发送计划条目.
+
+    标志为 N 的行和昵称、备注名都为空的行会被跳过；称谓、敬语为空时默认为 "您"。
+
+    Args:
+        csvfile(str): 联系人 csv 文件，表头为 昵称,备注名,微信名,地区,标签,称谓,敬语,标志
+        stats(PlanStats): 可选参数，用于记录读取和跳过的行数
+        task_filter(Callable): 可选参数，按行的原始内容判断是否属于本次处理（如多个微信窗口
+                               同时发送时本窗口的分片），不属于的行直接略过，不计入行数
+        selected(frozenset): 可选参数，只处理这些数据行（表头之后从 0 开始的序号），
+                             见 filters.RecipientFilter.rows；没有选中的行不解析，不计入行数
+        quiet(bool): 可选参数，为 True 时不打印跳过的行，用于发送前的预读
+
+    Yields:
+        dict: 以 nickname、namecomment、wechatname 等为键的计划条目，自定义列以列名为键
+    """
+    if stats is None:
+        stats = PlanStats()
+    with open(csvfile, mode="r", encoding="utf-8-sig") as file:
+        csv_reader = csv.reader(file)
+        header = next(csv_reader)
+        # 固定列用英文键，其他自定义列直接用列名作为键，供消息模板引用
+        column_keys = dict(PLAN_COLUMNS)
+        indexes = [
+            (column_keys.get(column, column), idx)
+            for idx, column in enumerate(header)
+            if column
+        ]
+        for number, row in enumerate(csv_reader):
+            if selected is not None and number not in selected:
+                continue
+            row_entry = {key: row[idx] for key, idx in indexes if idx < len(row)}
+            if task_filter is not None and not task_filter(row_entry):
+                continue
+            stats.rows += 1
+            # 如果标记为N，就忽略这一行
+            if row_entry.get("mark") == "N":
+                stats.skipped += 1
+                if not quiet:
+                    print("skip:::", row)
+                continue
+
+            if utils.is_empty_entry(row_entry, "nickname") and utils.is_empty_entry(
+                row_entry, "namecomment"
+            ):
+                stats.skipped += 1
+                if not quiet:
+                    print("skip nameless:::", row)
+                continue
+
+            if utils.is_empty_entry(row_entry, "title"):
+                row_entry["title"] = "您"
+            if utils.is_empty_entry(row_entry, "you"):
+                row_entry["you"] = "您"
+
+            yield row_entry
+
+
+def target_name(task: dict) -> str:
+    """发送时用于搜索的名称：有备注名用备注名，否则用昵称"""
+    return (
+        task["namecomment"]
+        if not utils.is_empty_entry(task, "namecomment")
+        else task["nickname"]
+    )
+
+
+def task_key(task: dict) -> str:
+    """接收人的唯一标识：有微信名用微信名，否则用发送时搜索的名称"""
+    if not utils.is_empty_entry(task, "wechatname"):
+        return task["wechatname"]
+    return target_name(task)
+
+
+class SendLog:
+    """
+    发送日志，每处理一个接收人追加一行。
+
+    日志文件在写入第一行时才创建，没有任何记录时不会产生空文件。
+    """
+
+    def __init__(self, filename: str = LOG_FILENAME):
+        self.filename = filename
+        self.count = 0
+        self.file = None
+        self.writer = None
+
+    def write(self, task: dict, status: str, msg: str) -> None:
+        if self.writer is None:
+            self.filename = utils.fmtfn(self.filename)
+            self.file = open(self.filename, mode="w", newline="", encoding="utf-8-sig")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(LOG_HEADER)
+        self.writer.writerow(
+            [
+                task.get("nickname", ""),
+                task.get("namecomment", ""),
+                task.get("wechatname", ""),
+                task.get("location", ""),
+                task.get("tag", ""),
+                task.get("title", ""),
+                task.get("you", ""),
+                status,
+                msg,
+            ]
+        )
+        self.count += 1
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
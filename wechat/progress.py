@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  发送进度：完成、失败、跳过、总数、当前速度和预计完成时间，按固定频率合并发出
+
+"""
+发送进度。
+
+发送循环每处理一个接收人调用一次 ProgressReporter.update，但进度事件（Progress）最多每
+PROGRESS_INTERVAL 秒发出一次，处理得快时多次更新合并为一次，不会让界面的事件循环被
+大量状态消息淹没；结束时 finish 总会再发出一次最终的进度。
+
+当前速度按最近 RATE_WINDOW 个接收人的完成时间计算，预计完成时间 = 剩余个数 / 当前速度，
+界面上可以一眼看出几千人的发送能不能在零点前完成。
+"""
+
+import time
+from collections import deque
+
+# 进度事件的最小间隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+# 计算当前速度时参考最近多少个接收人
+RATE_WINDOW = 50
+
+
+class Progress:
+    """
+    一次进度事件.
+
+    Attributes:
+        done(int): 成功个数
+        failed(int): 失败个数
+        skipped(int): 跳过个数（续发、已问候、无法唯一确定、没有内容等）
+        total(int): 总个数，还不知道时为 None
+        rate(float): 当前速度（个/分钟），还没有足够的数据时为 None
+        eta(float): 预计还需要的时间（秒），无法估计时为 None
+        finished(bool): 是否已经结束
+    """
+
+    def __init__(
+        self,
+        done: int,
+        failed: int,
+        skipped: int,
+        total: int,
+        rate: float = None,
+        eta: float = None,
+        finished: bool = False,
+    ):
+        self.done = done
+        self.failed = failed
+        self.skipped = skipped
+        self.total = total
+        self.rate = rate
+        self.eta = eta
+        self.finished = finished
+
+    @property
+    def processed(self) -> int:
+        return self.done + self.failed + self.skipped
+
+    @property
+    def remaining(self):
+        """剩余个数，总数未知时为 None"""
+        if self.total is None:
+            return None
+        return max(0, self.total - self.processed)
+
+    def as_dict(self) -> dict:
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "total": self.total,
+            "rate": round(self.rate, 2) if self.rate is not None else None,
+            "eta": round(self.eta) if self.eta is not None else None,
+            "finished": self.finished,
+        }
+
+    def text(self) -> str:
+        """状态栏显示的内容"""
+        text = (
+            "进度 "
+            + str(self.processed)
+            + ("/" + str(self.total) if self.total is not None else "")
+            + "，成功"
+            + str(self.done)
+            + "，失败"
+            + str(self.failed)
+            + "，跳过"
+            + str(self.skipped)
+        )
+        if self.rate is not None:
+            text += "，每分钟" + str(round(self.rate, 1)) + "个"
+        if self.eta is not None and not self.finished:
+            finish_at = time.strftime("%H:%M", time.localtime(time.time() + self.eta))
+            text += "，预计" + finish_at + "完成"
+        return text
+
+    def __repr__(self):
+        return f"Progress({self.as_dict()!r})"
+
+
+class ProgressReporter:
+    """
+    累计进度并按固定频率发出进度事件.
+
+    Args:
+        emit(Callable): 发出进度事件，参数为 Progress，通常是 WxSignals.progress.emit
+        total(int): 总个数，为 None 时表示还不知道（不预读 csv），不估计完成时间；
+                    知道后可以直接给 total 赋值
+        interval(float): 可选参数，进度事件的最小间隔（秒）
+        clock(Callable): 可选参数，时钟，默认为 time.monotonic
+    """
+
+    def __init__(
+        self, emit, total: int, interval: float = PROGRESS_INTERVAL, clock=time.monotonic
+    ):
+        self.emit = emit
+        self.total = total
+        self.interval = interval
+        self.clock = clock
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        # 最近完成（成功或失败）的时间，跳过的接收人几乎不花时间，不计入速度
+        self.completions = deque(maxlen=RATE_WINDOW)
+        self.last_emit = None
+
+    def update(self, done: int = 0, failed: int = 0, skipped: int = 0) -> None:
+        """累计进度，距离上次发出超过间隔时才发出"""
+        self.done += done
+        self.failed += failed
+        self.skipped += skipped
+        now = self.clock()
+        for _ in range(done + failed):
+            self.completions.append(now)
+        if self.last_emit is None or now - self.last_emit >= self.interval:
+            self._emit(now, False)
+
+    def finish(self) -> None:
+        """发出最终的进度"""
+        self._emit(self.clock(), True)
+
+    def rate(self, now: float = None):
+        """当前速度（个/分钟），算到现在为止，发送停滞时速度随之下降"""
+        if len(self.completions) < 2:
+            return None
+        now = self.clock() if now is None else now
+        elapsed = now - self.completions[0]
+        if elapsed <= 0:
+            return None
+        return (len(self.completions) - 1) * 60 / elapsed
+
+    def snapshot(self, finished: bool = False, now: float = None) -> Progress:
+        rate = self.rate(now)
+        progress = Progress(
+            self.done, self.failed, self.skipped, self.total, rate, finished=finished
+        )
+        if rate and progress.total is not None:
+            progress.eta = progress.remaining * 60 / rate
+        return progress
+
+    def _emit(self, now: float, finished: bool) -> None:
+        self.last_emit = now
+        self.emit(self.snapshot(finished, now))
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  接收人解析缓存：发送前先搜索每个接收人，记录能否唯一找到，结果按名称缓存
+
+"""
+接收人解析缓存。
+
+发送时才发现备注名搜索不到（昵称不匹配），已经付出了输入搜索和等待查找的代价。
+解析阶段在正式发送之前把计划中的每个接收人都搜索一遍，记录结果：
+
+- unique：恰好找到一个同名的联系人
+- ambiguous：找到多个同名的联系人，发送时无法确定是哪一个
+- missing：找不到同名的联系人
+
+结果按搜索名保存在 _resolve_cache.json 中，超过有效期（ttl）的记录视为没有解析过。
+正式发送时直接跳过有效期内 ambiguous、missing 的接收人；发送过程中搜索到或搜索不到的
+接收人也会更新缓存。解析报告列出每个接收人的结果，便于在发送前修正 csv。
+"""
+
+import csv
+import json
+import os
+import time
+
+RESOLVE_CACHE_FILE = "_resolve_cache.json"
+
+UNIQUE = "unique"
+AMBIGUOUS = "ambiguous"
+MISSING = "missing"
+
+# 解析结果在报告中的说明
+STATUS_TEXT = {UNIQUE: "唯一", AMBIGUOUS: "重名", MISSING: "找不到"}
+
+# 因解析结果跳过时，发送日志中的标志
+SKIP_MARKS = {AMBIGUOUS: "A", MISSING: "M"}
+
+REPORT_HEADER = ["昵称", "备注名", "微信名", "查找名", "结果", "匹配数"]
+
+# 默认有效期：3 天
+DEFAULT_TTL = 3 * 86400
+
+
+def cache_path(session: str = "") -> str:
+    """解析缓存文件，多个微信窗口同时发送时每个账号的好友不同，各自缓存"""
+    if not session:
+        return RESOLVE_CACHE_FILE
+    base, ext = os.path.splitext(RESOLVE_CACHE_FILE)
+    return base + "." + session + ext
+
+
+def classify(name: str, result_names: list) -> tuple:
+    """
+    按搜索结果判断解析结果.
+
+    Args:
+        name(str): 搜索名
+        result_names(list): 搜索结果中联系人分组的名称
+
+    Returns:
+        (解析结果, 同名联系人个数)
+    """
+    matches = result_names.count(name)
+    if matches == 0:
+        return MISSING, 0
+    return (UNIQUE if matches == 1 else AMBIGUOUS), matches
+
+
+class ResolutionCache:
+    """
+    接收人解析缓存.
+
+    Args:
+        path(str): 缓存文件
+        ttl(float): 可选参数，记录的有效期（秒）
+    """
+
+    def __init__(self, path: str = RESOLVE_CACHE_FILE, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        # 搜索名 -> {"status": 解析结果, "matches": 同名个数, "time": 解析时间}
+        self.entries = dict()
+        self.dirty = False
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, mode="r", encoding="utf-8") as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError) as ex:
+            print("读取接收人解析缓存失败，将重新解析：", ex)
+            self.entries = dict()
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, mode="w", encoding="utf-8") as file:
+            json.dump(self.entries, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def status(self, name: str, now: float = None):
+        """
+        有效期内的解析结果.
+
+        Returns:
+            str: unique、ambiguous 或 missing，没有解析过或已过期时返回 None
+        """
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        now = time.time() if now is None else now
+        if now - entry.get("time", 0) > self.ttl:
+            return None
+        return entry.get("status")
+
+    def matches(self, name: str) -> int:
+        return self.entries.get(name, dict()).get("matches", 0)
+
+    def record(self, name: str, status: str, matches: int = None) -> None:
+        """记录一次解析结果"""
+        if matches is None:
+            matches = 1 if status == UNIQUE else 0
+        self.entries[name] = {"status": status, "matches": matches, "time": time.time()}
+        self.dirty = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.save()
+
+
+def report_path(csvfile: str) -> str:
+    base, _ = os.path.splitext(csvfile)
+    return base + "_resolve.csv"
+
+
+class ResolveReport:
+    """
+    解析报告，逐行写入：昵称、备注名、微信名、查找名、结果、匹配数.
+
+    Args:
+        filename(str): 报告文件
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.counts = {UNIQUE: 0, AMBIGUOUS: 0, MISSING: 0}
+        self.file = open(filename, mode="w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(REPORT_HEADER)
+
+    def write(self, task: dict, name: str, status: str, matches: int) -> None:
+        self.counts[status] += 1
+        self.writer.writerow(
+            [
+                task.get("nickname", ""),
+                task.get("namecomment", ""),
+                task.get("wechatname", ""),
+                name,
+                STATUS_TEXT[status],
+                matches,
+            ]
+        )
+        self.file.flush()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  抓取好友列表的增量写入和断点：抓到一个写一个，中断后从断点继续
+
+"""
+好友列表抓取的增量写入和断点。
+
+FriendWriter 每抓到一个好友就写入 csv，每 flush_every 个好友刷新一次文件并保存断点；
+ScrapeCheckpoint 记录正在写入的 csv、标签、最后处理的好友和它所在页的滚动位置。
+抓取中途出错或被停止时，已抓取的好友都已经在 csv 中，重新抓取时可以用 ScrollPattern
+直接滚动到断点所在页，已经在 csv 中的好友不再点击，接着往下抓取。
+
+增量抓取（FriendDelta）以之前抓取的好友 csv 为基准：联系人列表行上的昵称、备注名、标签
+都没有变化的好友直接沿用旧行，不再点开详情；新增或有变化的好友才点开详情读取微信号、
+地区和标签，并保留旧行中手工修改过的称谓、敬语、标志。抓取完成后用 diff_friends 对比
+新旧 csv，生成新增、删除、变化的报告。
+"""
+
+import csv
+import glob
+import json
+import os
+import re
+
+FRIENDS_HEADER = ["昵称", "备注名", "微信名", "地区", "标签", "称谓", "敬语", "标志"]
+
+CHECKPOINT_FILE = "_scrape_checkpoint.json"
+
+FRIENDS_PATTERN = "friends*.csv"
+
+DELTA_REPORT_HEADER = ["变化", "昵称", "备注名", "微信名", "说明"]
+
+# 增量抓取时沿用旧行的列，这些列通常是手工修改过的
+KEPT_COLUMNS = ("称谓", "敬语", "标志")
+
+# 对比新旧好友时检查的列
+COMPARED_COLUMNS = ("昵称", "备注名", "地区", "标签")
+
+_TAG_SEPARATOR = re.compile(r"[,，、;；\s]+")
+
+# 翻页时相邻两页重叠的比例，宁可重叠（重叠的行按标识跳过）也不要因为百分比取整漏掉行
+PAGE_OVERLAP = 0.1
+
+
+def fingerprint(nick_name: str, remark_name: str) -> tuple:
+    """联系人列表中一行的标识，用于判断是否已经抓取过"""
+    return (nick_name, remark_name)
+
+
+def wechat_key(wechat_name: str) -> tuple:
+    """
+    按微信名的标识.
+
+    昵称相同又都没有备注名的好友，列表行完全相同，只能点开详情后按微信名区分。
+    与 fingerprint 的长度不同，可以放在同一个集合中。
+    """
+    return (wechat_name,)
+
+
+def next_page_percent(percent: float, view_size: float) -> float:
+    """
+    按 ScrollPattern 的可见范围计算下一页的垂直滚动百分比.
+
+    滚动百分比是可见区域顶端在可滚动范围（100 - 可见比例）中的位置，翻一页相当于
+    顶端移动一个可见比例，即百分比增加 view_size / (100 - view_size) * 100。
+
+    Args:
+        percent(float): 当前的 VerticalScrollPercent
+        view_size(float): VerticalViewSize，可见区域占全部内容的百分比
+
+    Returns:
+        float: 下一页的滚动百分比，不超过 100
+    """
+    if view_size >= 100:
+        return 100.0
+    step = view_size * 100 / (100 - view_size) * (1 - PAGE_OVERLAP)
+    return min(100.0, percent + max(step, 0.01))
+
+
+def normalize_tags(tags: str) -> frozenset:
+    """标签集合，忽略顺序和分隔符的差别（列表行和详情面板的分隔符可能不同）"""
+    return frozenset(t for t in _TAG_SEPARATOR.split(tags or "") if t)
+
+
+def latest_friends_csv(directory: str = ".", exclude: str = None):
+    """
+    目录下最近一次抓取的好友 csv，用作增量抓取的基准.
+
+    Args:
+        directory(str): 好友 csv 所在目录
+        exclude(str): 可选参数，排除的文件，通常是本次要写入的 csv
+
+    Returns:
+        str，没有时返回 None
+    """
+    exclude = os.path.abspath(exclude) if exclude else None
+    candidates = [
+        path
+        for path in glob.glob(os.path.join(directory, FRIENDS_PATTERN))
+        if os.path.abspath(path) != exclude
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=os.path.getmtime)
+
+
+class ScrapeCheckpoint:
+    """
+    抓取断点.
+
+    Args:
+        csvfile(str): 正在写入的好友 csv
+        tag(str): 抓取的标签，空字符串表示全部好友
+        scroll_percent(float): 最后处理的好友所在页的垂直滚动百分比
+        last_name(str): 最后处理的好友名称
+        count(int): 已写入的好友个数
+        previous(str): 增量抓取的基准 csv，全量抓取时为空字符串
+    """
+
+    def __init__(
+        self,
+        csvfile: str,
+        tag: str = "",
+        scroll_percent: float = 0,
+        last_name: str = "",
+        count: int = 0,
+        previous: str = "",
+    ):
+        self.csvfile = csvfile
+        self.tag = tag
+        self.scroll_percent = scroll_percent
+        self.last_name = last_name
+        self.count = count
+        self.previous = previous
+
+    @classmethod
+    def load(cls, path: str = CHECKPOINT_FILE):
+        """读取断点，没有断点或断点对应的 csv 已不存在时返回 None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, mode="r", encoding="utf-8") as file:
+                checkpoint = cls(**json.load(file))
+        except (OSError, ValueError, TypeError) as ex:
+            print("读取抓取断点失败：", ex)
+            return None
+        if not os.path.exists(checkpoint.csvfile):
+            return None
+        return checkpoint
+
+    def save(self, path: str = CHECKPOINT_FILE) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, mode="w", encoding="utf-8") as file:
+            json.dump(self.__dict__, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def clear(path: str = CHECKPOINT_FILE) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class FriendWriter:
+    """
+    好友 csv 的增量写入.
+
+    Args:
+        csvfile(str): 好友 csv
+        append(bool): 是否续写已有的 csv。续写时读出已抓取好友的标识（见 keys），供跳过使用
+        flush_every(int): 每写入多少个好友刷新一次文件
+        header(list): 可选参数，新建 csv 的表头，需包含昵称和备注名；续写时使用文件中的表头
+    """
+
+    def __init__(
+        self,
+        csvfile: str,
+        append: bool = False,
+        flush_every: int = 20,
+        header: list = None,
+    ):
+        self.csvfile = csvfile
+        self.flush_every = flush_every
+        self.header = list(header or FRIENDS_HEADER)
+        self.done = set()
+        self.count = 0
+        if append and os.path.exists(csvfile):
+            with open(csvfile, mode="r", newline="", encoding="utf-8-sig") as file:
+                reader = csv.reader(file)
+                self.header = next(reader, self.header)
+                nick_idx, remark_idx = self.name_columns()
+                for row in reader:
+                    if len(row) > max(nick_idx, remark_idx):
+                        self.done.update(self.keys(row))
+                        self.count += 1
+            self.file = open(csvfile, mode="a", newline="", encoding="utf-8-sig")
+            self.writer = csv.writer(self.file)
+        else:
+            self.file = open(csvfile, mode="w", newline="", encoding="utf-8-sig")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.header)
+        self.unflushed = 0
+
+    def name_columns(self) -> tuple:
+        """昵称和备注名在表头中的位置"""
+        return self.header.index("昵称"), self.header.index("备注名")
+
+    def keys(self, row: list) -> list:
+        """一行好友的标识：昵称和备注名，有微信名时还有按微信名的标识"""
+        nick_idx, remark_idx = self.name_columns()
+        keys = [fingerprint(row[nick_idx], row[remark_idx])]
+        if "微信名" in self.header:
+            wechat_idx = self.header.index("微信名")
+            if wechat_idx < len(row) and row[wechat_idx].strip():
+                keys.append(wechat_key(row[wechat_idx]))
+        return keys
+
+    def write(self, row: list) -> bool:
+        """
+        写入一个好友.
+
+        Args:
+            row(list): 与表头对齐的一行
+
+        Returns:
+            bool: 本次写入后是否刷新了文件，刷新后调用者应保存断点
+        """
+        self.writer.writerow(row)
+        self.done.update(self.keys(row))
+        self.count += 1
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every:
+            self.flush()
+            return True
+        return False
+
+    def flush(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unflushed = 0
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_friends(csvfile: str) -> tuple:
+    """
+    读取好友 csv.
+
+    Returns:
+        (表头, 行列表)，每行是 列名 -> 值 的字典
+    """
+    with open(csvfile, mode="r", newline="", encoding="utf-8-sig") as file:
+        reader = csv.reader(file)
+        header = next(reader, list())
+        rows = [dict(zip(header, row)) for row in reader if row]
+    return header, rows
+
+
+def _friend_key(row: dict):
+    """对比新旧好友时的标识：有微信名时用微信名，否则用昵称和备注名"""
+    if row.get("微信名", "").strip():
+        return row["微信名"]
+    return fingerprint(row.get("昵称", ""), row.get("备注名", ""))
+
+
+class FriendDelta:
+    """
+    以之前抓取的好友 csv 为基准的增量抓取.
+
+    Args:
+        csvfile(str): 之前抓取的好友 csv，可以包含自定义列，合并后的 csv 沿用它的表头
+    """
+
+    def __init__(self, csvfile: str):
+        self.csvfile = csvfile
+        header, rows = read_friends(csvfile)
+        # 基准 csv 缺少的标准列补在后面
+        self.header = header + [c for c in FRIENDS_HEADER if c not in header]
+        self.by_fingerprint = dict()
+        self.by_wechat = dict()
+        # 基准中有多行的列表行标识（同名又没有备注名），无法确定沿用哪一行
+        self.ambiguous = set()
+        for row in rows:
+            key = fingerprint(row.get("昵称", ""), row.get("备注名", ""))
+            if key in self.by_fingerprint:
+                self.ambiguous.add(key)
+            self.by_fingerprint.setdefault(key, row)
+            if row.get("微信名", "").strip():
+                self.by_wechat.setdefault(row["微信名"], row)
+        self.carried = 0
+        self.grabbed = 0
+
+    def to_row(self, values: dict) -> list:
+        """列名 -> 值 的字典转换为与表头对齐的一行"""
+        return [values.get(column, "") for column in self.header]
+
+    def carry(self, nick_name: str, remark_name: str, tags: str = None):
+        """
+        联系人列表行没有变化时沿用旧行.
+
+        Args:
+            nick_name(str): 列表行的昵称
+            remark_name(str): 列表行的备注名
+            tags(str): 可选参数，列表行显示的标签，给出时标签有变化也视为变化
+
+        Returns:
+            list，与表头对齐的旧行；新增、有变化或基准中有同名行的好友返回 None，需要点开详情抓取
+        """
+        key = fingerprint(nick_name, remark_name)
+        if key in self.ambiguous:
+            return None
+        previous = self.by_fingerprint.get(key)
+        if previous is None:
+            return None
+        if tags is not None and normalize_tags(tags) != normalize_tags(
+            previous.get("标签", "")
+        ):
+            return None
+        self.carried += 1
+        return self.to_row(previous)
+
+    def merge(self, scraped: list) -> list:
+        """
+        合并点开详情抓取到的好友.
+
+        按微信名（没有时按昵称和备注名）找到旧行，沿用旧行的称谓、敬语、标志和自定义列，
+        用抓取到的昵称、备注名、微信名、地区、标签覆盖。
+
+        Args:
+            scraped(list): 按 FRIENDS_HEADER 排列的抓取结果
+
+        Returns:
+            list: 与表头对齐的一行
+        """
+        values = dict(zip(FRIENDS_HEADER, scraped))
+        previous = self.by_wechat.get(values["微信名"]) or self.by_fingerprint.get(
+            fingerprint(values["昵称"], values["备注名"])
+        )
+        if previous is not None:
+            merged = dict(previous)
+            for column in FRIENDS_HEADER:
+                if column not in KEPT_COLUMNS:
+                    merged[column] = values[column]
+            values = merged
+        self.grabbed += 1
+        return self.to_row(values)
+
+
+def diff_friends(previous_csv: str, current_csv: str, tag: str = None) -> dict:
+    """
+    对比新旧好友 csv.
+
+    Args:
+        previous_csv(str): 之前抓取的好友 csv
+        current_csv(str): 本次抓取的好友 csv
+        tag(str): 可选参数，本次只抓取了该标签的好友时，只在旧 csv 中带该标签的好友里找删除的好友
+
+    Returns:
+        dict: added、removed 为行字典的列表，changed 为 (旧行, 新行, 说明) 的列表
+    """
+    _, previous_rows = read_friends(previous_csv)
+    _, current_rows = read_friends(current_csv)
+    previous = {_friend_key(row): row for row in previous_rows}
+    # 旧行可能没有微信名，按昵称和备注名再建一份索引
+    previous_by_name = {
+        fingerprint(row.get("昵称", ""), row.get("备注名", "")): row
+        for row in previous_rows
+    }
+    matched = set()
+    added, changed = list(), list()
+    for row in current_rows:
+        old = previous.get(_friend_key(row)) or previous_by_name.get(
+            fingerprint(row.get("昵称", ""), row.get("备注名", ""))
+        )
+        if old is None:
+            added.append(row)
+            continue
+        matched.add(id(old))
+        notes = list()
+        for column in COMPARED_COLUMNS:
+            before, after = old.get(column, ""), row.get(column, "")
+            if column == "标签":
+                if normalize_tags(before) == normalize_tags(after):
+                    continue
+            elif before == after:
+                continue
+            notes.append(column + "：" + before + " -> " + after)
+        if notes:
+            changed.append((old, row, "；".join(notes)))
+    removed = [
+        row
+        for row in previous_rows
+        if id(row) not in matched
+        and (not tag or tag in normalize_tags(row.get("标签", "")))
+    ]
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def delta_report_path(csvfile: str) -> str:
+    base, _ = os.path.splitext(csvfile)
+    return base + "_delta.csv"
+
+
+def write_delta_report(report_csv: str, diff: dict) -> None:
+    """把 diff_friends 的结果写成 csv 报告：变化、昵称、备注名、微信名、说明"""
+    with open(report_csv, mode="w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file)
+        writer.writerow(DELTA_REPORT_HEADER)
+        for kind, rows in (("新增", diff["added"]), ("删除", diff["removed"])):
+            for row in rows:
+                writer.writerow(
+                    [kind, row.get("昵称", ""), row.get("备注名", ""), row.get("微信名", ""), ""]
+                )
+        for _, row, notes in diff["changed"]:
+            writer.writerow(
+                ["变化", row.get("昵称", ""), row.get("备注名", ""), row.get("微信名", ""), notes]
+            )
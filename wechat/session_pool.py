@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  多窗口发送：同时登录多个微信时每个窗口一个会话，按账号分片后轮流发送
+
+"""
+多窗口发送。
+
+一台电脑上同时登录多个微信账号时，每个微信主窗口对应一个会话（绑定窗口句柄的
+WxOperation），一次运行就能把整个活动发完，不必每个账号各运行一次。发送计划按账号分片：
+
+- csv 中有 账号 列时，按该列的值分给同名账号的窗口（账号名取自窗口导航栏的头像按钮），
+  该列有值但找不到对应窗口的行不发送，开始前在状态栏提示；
+- 账号 列为空或没有该列时，按接收人的微信名（或搜索名）的散列值固定分给某个窗口，
+  多次发送、续发时分片不变，适合几个账号好友相同、只需要分摊发送量的情况。
+
+每个会话有自己的发送日志（_log_<账号>_<时间>.csv）、发送流水和接收人解析缓存，各自按节奏
+限速，所有会话共用一个进度（wechat.progress），界面上显示合并后的进度。键盘和剪切板只有一套，同一时刻只能操作前台的一个窗口：
+调度时优先留在当前前台的窗口，它的令牌用完后再切换到最先可以发送的窗口。这样各账号的
+限速互不拖累，又尽量少切换窗口。
+"""
+
+import re
+import time
+import zlib
+
+import wechat.plan as plan
+from wechat.backend import WxBackend
+from wechat.greeted import GreetingIndex
+from wechat.pacing import Pacer
+from wechat.progress import ProgressReporter
+from wechat.wx_operation import (
+    WX_WINDOW_CLASS,
+    WX_WINDOW_NAME,
+    WxOperation,
+    WxRunnable,
+    print_summary,
+    summary_text,
+)
+
+# csv 中指定发送账号的列
+ACCOUNT_COLUMN = "账号"
+
+# 文件名中不能使用的字符
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def session_label(account: str, index: int) -> str:
+    """会话标签，用于日志、流水和解析缓存的文件名：账号昵称，取不到时为 wx1、wx2……"""
+    label = _UNSAFE_CHARS.sub("_", account or "").strip("_.")
+    return label or "wx" + str(index + 1)
+
+
+class WxSession:
+    """
+    一个微信窗口的发送会话.
+
+    Args:
+        operation(WxOperation): 绑定到该窗口的操作对象
+        account(str): 登录的账号昵称
+        label(str): 会话标签，只有一个窗口时为空，文件名与单窗口发送相同
+    """
+
+    def __init__(self, operation: WxOperation, account: str, label: str):
+        self.operation = operation
+        self.account = account
+        self.label = label
+        self.pacer = None
+        self.steps = None
+        self.summary = None
+
+    def advance(self, go) -> bool:
+        """
+        推进发送步骤到下一次正式发送之前.
+
+        Args:
+            go: 第一次为 None；之后 True 表示发出这一条，False 表示停止
+
+        Returns:
+            bool: 还有要发送的接收人时返回 True
+        """
+        try:
+            self.steps.send(go)
+        except StopIteration:
+            self.steps = None
+            return False
+        return True
+
+    def close(self) -> None:
+        if self.steps is not None:
+            self.steps.close()
+            self.steps = None
+
+
+class SessionPool(WxRunnable):
+    """
+    多个微信窗口的会话池，接口与 WxOperation.process_send_message 相同.
+
+    Args:
+        backend(WxBackend): 可选参数，界面自动化后端，默认为 UiaBackend
+        hwnds(list): 可选参数，参与发送的微信主窗口句柄，默认为找到的全部微信窗口
+    """
+
+    def __init__(self, backend: WxBackend = None, hwnds: list = None):
+        super(SessionPool, self).__init__()
+        if backend is None:
+            from wechat.backend import UiaBackend
+
+            backend = UiaBackend(search_timeout=3)
+        self.backend = backend
+        if hwnds is None:
+            hwnds = backend.find_windows(WX_WINDOW_CLASS, WX_WINDOW_NAME)
+        assert hwnds, "窗口不存在"
+
+        self.sessions = list()
+        for index, hwnd in enumerate(hwnds):
+            operation = WxOperation(backend, hwnd)
+            # 所有会话共用一套信号：停止标志和状态栏
+            operation.signals = self.signals
+            # 只有一个窗口时不需要区分账号，不必读取账号昵称
+            account = operation.account_name() if len(hwnds) > 1 else ""
+            label = session_label(account, index) if len(hwnds) > 1 else ""
+            self.sessions.append(WxSession(operation, account, label))
+        self.current = None
+        self.switches = 0
+
+    @property
+    def labels(self) -> list:
+        return [session.label for session in self.sessions]
+
+    def assigner(self):
+        """
+        按账号分片的规则.
+
+        Returns:
+            Callable: 计划行 -> 会话序号，账号列的值找不到对应窗口时返回 None
+        """
+        by_account = {
+            session.account: index for index, session in enumerate(self.sessions)
+        }
+        count = len(self.sessions)
+
+        def assign(task: dict):
+            if count == 1:
+                return 0
+            account = task.get(ACCOUNT_COLUMN, "").strip()
+            if account:
+                return by_account.get(account)
+            return zlib.crc32(plan.task_key(task).encode("utf-8")) % count
+
+        return assign
+
+    def activate(self) -> None:
+        """任务开始前把当前（或第一个）窗口切换到前台，发送时再按需切换"""
+        self.focus(self.current or self.sessions[0])
+
+    def is_alive(self) -> bool:
+        """所有微信窗口都还在，有窗口关闭时需要重新连接"""
+        return all(session.operation.is_alive() for session in self.sessions)
+
+    def focus(self, session: WxSession) -> None:
+        """切换到会话的窗口，已在前台时不切换"""
+        if session.operation.focus():
+            self.switches += 1
+        self.current = session
+
+    def pick(self, ready: list) -> WxSession:
+        """选择下一个发送的会话：当前窗口有令牌就继续，否则选最先可以发送的窗口"""
+        if self.current in ready and self.current.pacer.delay() == 0:
+            return self.current
+        return min(ready, key=lambda session: session.pacer.delay())
+
+    def process_send_message(
+        self,
+        msg_template: str,
+        csvfile: str,
+        only_log: bool,
+        resume: bool = False,
+        skip_greeted_days: float = None,
+        campaign: str = None,
+        attachments: list = None,
+        pacer: Pacer = None,
+        recipients: str = None,
+    ):
+        """
+        按联系人 csv 分片，由各个微信窗口轮流发送.
+
+        Args:
+            msg_template(str): 消息模板
+            csvfile(str): 联系人 csv 文件，可以有 账号 列指定由哪个账号发送
+            only_log(bool): 为 True 时只模拟操作，点而不发，仅记录日志
+            resume(bool): 为 True 时各个会话按自己的发送流水从上次中断处继续
+            skip_greeted_days(float): 可选参数，跳过最近这么多天内在历次发送中已问候过的联系人
+            campaign(str): 可选参数，活动定义 JSON 文件
+            attachments(list): 可选参数，对所有接收人都发送的图片和文件路径
+            pacer(Pacer): 可选参数，每个账号的节奏设置，各账号按相同设置各自限速
+            recipients(str): 可选参数，筛选条件，只发送给选中的接收人，见 wechat.filters
+
+        Returns:
+            plan.SendSummary: 合并后的发送计数，消息模板、活动定义或筛选条件有问题时返回 None
+        """
+        operation = self.sessions[0].operation
+        builder = operation.make_payload_builder(
+            msg_template, csvfile, campaign, attachments
+        )
+        if builder is None:
+            return
+        # 筛选条件只编译、求值一次，各个会话共用选中的行
+        recipients = operation.make_recipient_filter(recipients, csvfile)
+        if recipients is None:
+            return
+
+        assign = self.assigner()
+        assigned = 0
+        unassigned = 0
+        for task in plan.iter_plan(
+            csvfile, selected=recipients.rows(csvfile), quiet=True
+        ):
+            if assign(task) is None:
+                unassigned += 1
+            else:
+                assigned += 1
+        if unassigned:
+            print("账号列找不到对应的微信窗口，不发送：：", unassigned)
+            self.signals.statusinfo.emit(
+                str(unassigned) + "条记录的账号没有对应的微信窗口，不会发送"
+            )
+
+        # 已问候索引由各个会话共用，一个账号问候过的联系人其他账号也不再问候
+        greeting_index = None
+        greeted_since = 0
+        if skip_greeted_days:
+            greeting_index = GreetingIndex()
+            greeting_index.refresh()
+            greeted_since = time.time() - skip_greeted_days * 86400
+
+        progress = ProgressReporter(self.signals.progress.emit, assigned)
+        for index, session in enumerate(self.sessions):
+            session.pacer = pacer.clone() if pacer is not None else Pacer()
+            session.summary = plan.SendSummary(session.label)
+            session.steps = session.operation.iter_send_steps(
+                builder,
+                csvfile,
+                only_log,
+                resume,
+                greeting_index,
+                greeted_since,
+                session.pacer,
+                session.summary,
+                session.label,
+                lambda task, index=index: assign(task) == index,
+                progress,
+                recipients,
+            )
+
+        self.signals.statusinfo.emit(
+            str(len(self.sessions)) + "个微信窗口，处理发送消息，开始逐条发送"
+        )
+
+        total = plan.SendSummary()
+        try:
+            # 推进每个会话到第一次正式发送之前；模拟发送不需要等待，直接处理完整个分片
+            ready = list()
+            for session in self.sessions:
+                if only_log:
+                    self.focus(session)
+                if session.advance(None):
+                    ready.append(session)
+
+            while ready:
+                session = self.pick(ready)
+                if not session.pacer.acquire(self.signals.get_flag):
+                    # 停止：通知每个会话结束，写完日志和流水
+                    for waiting in ready:
+                        waiting.advance(False)
+                    break
+                self.focus(session)
+                if not session.advance(True):
+                    ready.remove(session)
+        finally:
+            for session in self.sessions:
+                session.close()
+            progress.finish()
+
+        for session in self.sessions:
+            summary = session.summary
+            print("会话：：", session.label, session.account)
+            print("控件缓存：：", session.operation.cache_stats())
+            print("发送节奏：：", session.pacer.stats())
+            session.operation.timing.print_stats()
+            print_summary(summary)
+            total.merge(summary)
+        if greeting_index is not None:
+            if not only_log:
+                for logfile in total.log_files:
+                    greeting_index.mark_ingested(logfile)
+            greeting_index.save()
+
+        print("窗口切换次数：：", self.switches)
+        print_summary(total)
+        self.signals.statusinfo.emit(
+            str(len(self.sessions)) + "个微信窗口" + summary_text(total)
+        )
+        return total
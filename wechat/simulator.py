@@ -0,0 +1,1041 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  内存模拟的微信窗口，用于在非 Windows 环境下运行和压测 WxOperation
+
+"""
+模拟微信窗口。
+
+SimBackend 实现了 WxBackend 接口，内部维护一棵模拟的控件树：
+
+- 微信主窗口：导航按钮、搜索框、会话列表、搜索结果列表、聊天面板（标题、消息列表、输入框）
+- 通讯录管理窗口：标签面板、可翻页的联系人列表、联系人详情面板
+
+控件只实现 WxOperation 用到的 uiautomation.Control 子集。每次查找、枚举子控件、点击、
+按键和剪切板操作都会按配置计入延迟，并且可以按概率注入故障，便于在 Linux 下测量吞吐量。
+
+用法::
+
+    backend = SimBackend(make_contacts(3000), latency=0.005, node_latency=0.0002)
+    operation = WxOperation(backend=backend)
+"""
+
+import ntpath
+import os
+import random
+import time
+from collections import Counter
+
+from wechat.backend import WxBackend
+
+MAIN_CLASS_NAME = "WeChatMainWndForPC"
+MAIN_WINDOW_NAME = "微信"
+CONTACTS_MANAGER_NAME = "通讯录管理"
+SELF_NAME = "我"
+
+# uiautomation 中 Click / SendKeys / SendKey 的默认等待时间
+OPERATION_WAIT_TIME = 0.5
+
+# 输入框中嵌入对象（粘贴的文件、图片）的占位字符
+OBJECT_CHAR = "\ufffc"
+
+SPECIAL_KEYS = ("ENTER", "ESC", "DELETE", "PAGEDOWN", "PAGEUP", "HOME", "END", "BACK")
+
+
+class SimFault(RuntimeError):
+    """注入的模拟故障"""
+
+
+class SimContact:
+    """模拟的好友"""
+
+    def __init__(
+        self,
+        nickname: str,
+        remark: str = "",
+        wechat_id: str = "",
+        region: str = "",
+        tags: str = "",
+    ):
+        self.nickname = nickname
+        self.remark = remark
+        self.wechat_id = wechat_id
+        self.region = region
+        self.tags = tags
+
+    @property
+    def display_name(self) -> str:
+        """会话和搜索结果中显示的名称：有备注名用备注名，否则用昵称"""
+        return self.remark if self.remark else self.nickname
+
+    def __repr__(self):
+        return f"SimContact({self.display_name!r})"
+
+
+def make_contacts(count: int, seed: int = 0) -> list:
+    """
+    生成用于压测的模拟好友.
+
+    Args:
+        count(int): 好友个数
+        seed(int): 随机种子，相同种子生成相同的好友
+
+    Returns:
+        list[SimContact]
+    """
+    rnd = random.Random(seed)
+    regions = ["广东 广州", "广东 深圳", "北京 朝阳", "上海 浦东", "浙江 杭州", ""]
+    tags = ["客户", "同事", "家人", "同学", "客户,同学", ""]
+    contacts = list()
+    for i in range(count):
+        nickname = f"好友{i:05d}"
+        remark = f"备注{i:05d}" if rnd.random() < 0.7 else ""
+        contacts.append(
+            SimContact(
+                nickname,
+                remark,
+                f"wxid_{seed}_{i:05d}",
+                rnd.choice(regions),
+                rnd.choice(tags),
+            )
+        )
+    return contacts
+
+
+def _parse_keys(text: str) -> list:
+    """把 SendKeys 的按键串解析为 (ctrl, key) 列表，如 '{Ctrl}v' -> [(True, 'v')]"""
+    keys = list()
+    ctrl = False
+    i = 0
+    while i < len(text):
+        if text[i] == "{":
+            j = text.index("}", i)
+            name = text[i + 1 : j]
+            i = j + 1
+            if name.lower() == "ctrl":
+                ctrl = True
+                continue
+            keys.append((ctrl, name.upper()))
+        else:
+            keys.append((ctrl, text[i]))
+            i += 1
+        ctrl = False
+    return keys
+
+
+class SimScrollPattern:
+    """模拟的 ScrollPattern，百分比取值 0~100"""
+
+    def __init__(self, manager: "SimContactsManager"):
+        self._manager = manager
+
+    @property
+    def VerticallyScrollable(self) -> bool:
+        return self._manager.scroll_range() > 0
+
+    @property
+    def VerticalViewSize(self) -> float:
+        total = len(self._manager.visible_contacts())
+        return 100.0 if not total else min(100.0, self._manager.page_size * 100 / total)
+
+    @property
+    def VerticalScrollPercent(self) -> float:
+        self._manager.backend._charge("read")
+        span = self._manager.scroll_range()
+        return -1 if not span else self._manager.top * 100 / span
+
+    def SetScrollPercent(
+        self,
+        horizontalPercent: float,
+        verticalPercent: float,
+        waitTime: float = OPERATION_WAIT_TIME,
+    ) -> bool:
+        self._manager.backend._charge("scroll")
+        if verticalPercent >= 0:
+            span = self._manager.scroll_range()
+            self._manager.scroll_to(round(verticalPercent * span / 100))
+        self._manager.backend._wait(waitTime)
+        return True
+
+
+class SimValuePattern:
+    """模拟的 ValuePattern，读取输入框当前的内容"""
+
+    def __init__(self, control: "SimControl"):
+        self._control = control
+
+    @property
+    def Value(self) -> str:
+        self._control._check()
+        self._control.backend._charge("read")
+        return self._control.value
+
+
+class SimControl:
+    """模拟控件，接口与 uiautomation.Control 保持一致的子集"""
+
+    def __init__(
+        self,
+        backend: "SimBackend",
+        control_type: str,
+        name: str = "",
+        class_name: str = "",
+        children=(),
+        on_click=None,
+    ):
+        self.backend = backend
+        self.ControlTypeName = control_type
+        self.ClassName = class_name
+        self.parent = None
+        self.children = list()
+        self.alive = True
+        self.visible_at = 0.0
+        self.on_click = on_click
+        self.value = ""
+        self.selected = False
+        self.scroll_pattern = None
+        self._name = name
+        for child in children:
+            self.append(child)
+
+    def __repr__(self):
+        return f"{self.ControlTypeName}({self._name!r})"
+
+    # ---------- 树结构维护，由模拟器自身调用 ----------
+
+    def append(self, child: "SimControl") -> "SimControl":
+        child.parent = self
+        self.children.append(child)
+        return child
+
+    def set_children(self, children: list, delay: float = None) -> None:
+        """替换全部子控件，旧的子控件失效，新的子控件在 ui_delay 之后才可见"""
+        for old in self.children:
+            old._kill()
+        self.children = list()
+        visible_at = time.perf_counter() + (
+            self.backend.ui_delay if delay is None else delay
+        )
+        for child in children:
+            child._show_at(visible_at)
+            self.append(child)
+
+    def rename(self, name: str) -> None:
+        self._name = name
+
+    def _kill(self) -> None:
+        self.alive = False
+        for child in self.children:
+            child._kill()
+
+    def _show_at(self, visible_at: float) -> None:
+        self.visible_at = visible_at
+        for child in self.children:
+            child._show_at(visible_at)
+
+    def _is_visible(self) -> bool:
+        return self.alive and self.visible_at <= time.perf_counter()
+
+    def _check(self) -> None:
+        if not self.alive:
+            raise LookupError(f"控件已失效：{self!r}")
+
+    def _walk(self, max_depth: int):
+        """先序遍历可见的后代控件"""
+        stack = [(child, 1) for child in reversed(self.children)]
+        while stack:
+            node, depth = stack.pop()
+            if not node._is_visible():
+                continue
+            yield node
+            if depth < max_depth:
+                stack.extend((child, depth + 1) for child in reversed(node.children))
+
+    def root(self) -> "SimControl":
+        node = self
+        while node.parent is not None and node.parent.ControlTypeName != "PaneRoot":
+            node = node.parent
+        return node
+
+    # ---------- uiautomation.Control 接口 ----------
+
+    @property
+    def Name(self) -> str:
+        self._check()
+        return self._name
+
+    def _search(self, control_type, props: dict):
+        found_index = props.pop("foundIndex", 1)
+        max_depth = props.pop("searchDepth", 0xFFFFFFFF)
+        props.pop("searchInterval", None)
+        name = props.pop("Name", None)
+        class_name = props.pop("ClassName", None)
+        visited = 0
+        found = 0
+        for node in self._walk(max_depth):
+            visited += 1
+            if control_type and node.ControlTypeName != control_type:
+                continue
+            if name is not None and node._name != name:
+                continue
+            if class_name is not None and node.ClassName != class_name:
+                continue
+            found += 1
+            if found == found_index:
+                self.backend._charge_nodes(visited)
+                return node
+        self.backend._charge_nodes(visited)
+        return None
+
+    def Control(self, control_type: str = None, **props):
+        self._check()
+        self.backend._charge("search")
+        spec = dict(props)
+        node = self._search(control_type, dict(props))
+        if node is not None:
+            return node
+        return _PendingControl(self, control_type, spec)
+
+    def WindowControl(self, **props):
+        return self.Control("WindowControl", **props)
+
+    def PaneControl(self, **props):
+        return self.Control("PaneControl", **props)
+
+    def TextControl(self, **props):
+        return self.Control("TextControl", **props)
+
+    def ButtonControl(self, **props):
+        return self.Control("ButtonControl", **props)
+
+    def EditControl(self, **props):
+        return self.Control("EditControl", **props)
+
+    def ListControl(self, **props):
+        return self.Control("ListControl", **props)
+
+    def ListItemControl(self, **props):
+        return self.Control("ListItemControl", **props)
+
+    def Exists(self, maxSearchSeconds: float = 5, searchIntervalSeconds: float = 0.5):
+        return self._is_visible()
+
+    def GetChildren(self) -> list:
+        self._check()
+        self.backend._charge("children")
+        children = [child for child in self.children if child._is_visible()]
+        self.backend._charge_nodes(len(children))
+        return children
+
+    def GetParentControl(self):
+        self._check()
+        self.backend._charge("read")
+        return self.parent
+
+    def GetNextSiblingControl(self):
+        self._check()
+        self.backend._charge("read")
+        if self.parent is None:
+            return None
+        siblings = self.parent.children
+        for sibling in siblings[siblings.index(self) + 1 :]:
+            if sibling._is_visible():
+                return sibling
+        return None
+
+    def GetScrollPattern(self):
+        self._check()
+        self.backend._charge("read")
+        if self.scroll_pattern and self.scroll_pattern.VerticallyScrollable:
+            return self.scroll_pattern
+        return None
+
+    def GetValuePattern(self):
+        self._check()
+        if self.ControlTypeName != "EditControl":
+            return None
+        return SimValuePattern(self)
+
+    def Click(self, x: int = None, y: int = None, waitTime: float = OPERATION_WAIT_TIME, **kwargs):
+        self._check()
+        self.backend._charge("click")
+        if self.on_click:
+            self.on_click(self)
+        self.backend._wait(waitTime)
+
+    def SetFocus(self) -> bool:
+        self._check()
+        self.backend.focus = self
+        return True
+
+    def SendKeys(self, text: str, interval: float = 0.01, waitTime: float = OPERATION_WAIT_TIME, **kwargs):
+        self._check()
+        self.backend._charge("keys")
+        if self.ControlTypeName == "EditControl":
+            self.backend.focus = self
+        for ctrl, key in _parse_keys(text):
+            self.backend._dispatch_key(self, ctrl, key)
+        self.backend._wait(waitTime)
+
+    def SendKey(self, key, waitTime: float = OPERATION_WAIT_TIME):
+        self._check()
+        self.backend._charge("keys")
+        self.backend._dispatch_key(self, False, key)
+        self.backend._wait(waitTime)
+
+    def WheelUp(self, wheelTimes: int = 1, interval: float = 0.05, waitTime: float = OPERATION_WAIT_TIME):
+        self._check()
+        self.backend._charge("keys")
+        self.backend._wait(waitTime)
+
+    def WheelDown(self, wheelTimes: int = 1, interval: float = 0.05, waitTime: float = OPERATION_WAIT_TIME):
+        self.WheelUp(wheelTimes, interval, waitTime)
+
+
+class _PendingControl:
+    """
+    未找到的控件。
+
+    与 uiautomation 一样，真正使用时才再查找一次，仍然找不到就按 miss_penalty 计时后抛出 LookupError。
+    """
+
+    def __init__(self, parent: SimControl, control_type: str, props: dict):
+        self._parent = parent
+        self._control_type = control_type
+        self._props = props
+
+    def __repr__(self):
+        return f"{self._control_type}({self._props!r})"
+
+    def _resolve(self):
+        if not self._parent.alive:
+            return None
+        return self._parent._search(self._control_type, dict(self._props))
+
+    def Exists(self, maxSearchSeconds: float = 5, searchIntervalSeconds: float = 0.5):
+        backend = self._parent.backend
+        deadline = time.perf_counter() + maxSearchSeconds * backend.wait_scale
+        while True:
+            backend._charge("search")
+            if self._resolve() is not None:
+                return True
+            if time.perf_counter() >= deadline:
+                return False
+            time.sleep(min(searchIntervalSeconds * backend.wait_scale, 0.05))
+
+    def __getattr__(self, item):
+        backend = self._parent.backend
+        backend._charge("search")
+        node = self._resolve()
+        if node is None:
+            backend._miss()
+            raise LookupError(f"Find Control Timeout: {self!r}")
+        return getattr(node, item)
+
+
+class SimWeChat:
+    """一个模拟的微信实例，包含主窗口和通讯录管理窗口的控件树及聊天状态"""
+
+    def __init__(self, backend: "SimBackend", contacts: list, hwnd: int, account: str = "模拟账号"):
+        self.backend = backend
+        self.hwnd = hwnd
+        self.account = account
+        self.contacts = list(contacts)
+        self.by_name = dict()
+        for contact in self.contacts:
+            self.by_name.setdefault(contact.display_name, contact)
+        # 聊天名称 -> [(发送者, 消息)]，发送者为 "Time" 表示时间分隔
+        self.history = dict()
+        self.sessions = ["文件传输助手"]
+        self.current_chat = ""
+        self.pending_files = list()
+        self.contacts_tab = False
+
+        self.search_edit = SimControl(backend, "EditControl", "搜索")
+        self.session_list = SimControl(backend, "ListControl", "会话")
+        self.result_list = SimControl(backend, "ListControl", "搜索结果")
+        self.chat_pane = SimControl(backend, "PaneControl", "")
+        self.window = SimControl(
+            backend,
+            "WindowControl",
+            MAIN_WINDOW_NAME,
+            MAIN_CLASS_NAME,
+            children=[
+                SimControl(
+                    backend,
+                    "PaneControl",
+                    "导航",
+                    children=[
+                        SimControl(backend, "ButtonControl", account),
+                        SimControl(backend, "ButtonControl", "聊天", on_click=self._on_chat_tab),
+                        SimControl(backend, "ButtonControl", "通讯录", on_click=self._on_contacts_tab),
+                    ],
+                ),
+                SimControl(
+                    backend,
+                    "PaneControl",
+                    "",
+                    children=[self.search_edit, self.session_list],
+                ),
+                self.result_list,
+                self.chat_pane,
+            ],
+        )
+        self.window.hwnd = hwnd
+        self.manager = SimContactsManager(self)
+        self._render_sessions(delay=0)
+        self._render_chat(delay=0)
+
+    # ---------- 会话和聊天 ----------
+
+    def add_message(self, chat: str, sender: str, msg: str) -> None:
+        """向聊天记录追加一条消息，sender 为 'Time' 表示时间分隔"""
+        self.history.setdefault(chat, list()).append((sender, msg))
+        if chat == self.current_chat:
+            self._render_messages()
+
+    def sent_messages(self, chat: str) -> list:
+        """自己发给 chat 的消息"""
+        return [msg for sender, msg in self.history.get(chat, list()) if sender == SELF_NAME]
+
+    def _on_chat_tab(self, control):
+        if self.contacts_tab:
+            self.contacts_tab = False
+            self._render_sessions()
+
+    def _on_contacts_tab(self, control):
+        if not self.contacts_tab:
+            self.contacts_tab = True
+            self._render_sessions()
+
+    def _render_sessions(self, delay: float = None):
+        if self.contacts_tab:
+            self.session_list.rename("联系人")
+            self.session_list.set_children(
+                [
+                    SimControl(
+                        self.backend,
+                        "ListItemControl",
+                        "",
+                        children=[
+                            SimControl(
+                                self.backend,
+                                "ButtonControl",
+                                CONTACTS_MANAGER_NAME,
+                                on_click=lambda c: self.manager.open(),
+                            )
+                        ],
+                    )
+                ],
+                delay,
+            )
+            return
+        self.session_list.rename("会话")
+        items = list()
+        for name in self.sessions[:20]:
+            items.append(
+                SimControl(
+                    self.backend,
+                    "ListItemControl",
+                    name,
+                    children=[
+                        SimControl(
+                            self.backend,
+                            "ButtonControl",
+                            name,
+                            on_click=lambda c, n=name: self.open_chat(n),
+                        )
+                    ],
+                )
+            )
+        self.session_list.set_children(items, delay)
+
+    def open_chat(self, name: str) -> None:
+        self.current_chat = name
+        self.pending_files = list()
+        self.search_edit.value = ""
+        self.result_list.set_children([])
+        self._render_chat()
+        self.backend.focus = self.chat_edit
+
+    def _render_chat(self, delay: float = None):
+        name = self.current_chat
+        self.message_list = SimControl(self.backend, "ListControl", "消息")
+        children = [
+            # 没有打开聊天时显示欢迎页的 "微信" 字样
+            SimControl(self.backend, "TextControl", name if name else MAIN_WINDOW_NAME),
+            SimControl(self.backend, "ButtonControl", "聊天信息"),
+            self.message_list,
+        ]
+        self.chat_edit = None
+        if name:
+            self.chat_edit = SimControl(self.backend, "EditControl", name)
+            children.append(self.chat_edit)
+        self.chat_pane.set_children(children, delay)
+        self._render_messages(delay)
+
+    def _render_messages(self, delay: float = 0):
+        items = list()
+        for sender, msg in self.history.get(self.current_chat, list())[-50:]:
+            if sender == "Time":
+                items.append(
+                    SimControl(
+                        self.backend,
+                        "ListItemControl",
+                        msg,
+                        children=[SimControl(self.backend, "PaneControl", msg)],
+                    )
+                )
+                continue
+            content = list()
+            text = msg
+            if isinstance(msg, tuple):
+                text, file_name, size = "[文件]", msg[0], msg[1]
+                content = [
+                    SimControl(self.backend, "TextControl", file_name),
+                    SimControl(self.backend, "TextControl", size),
+                ]
+            items.append(
+                SimControl(
+                    self.backend,
+                    "ListItemControl",
+                    text,
+                    children=[
+                        SimControl(
+                            self.backend,
+                            "PaneControl",
+                            "",
+                            children=[
+                                SimControl(self.backend, "ButtonControl", sender),
+                                SimControl(self.backend, "PaneControl", "", children=content),
+                            ],
+                        )
+                    ],
+                )
+            )
+        self.message_list.set_children(items, delay)
+
+    def _send_draft(self):
+        sent = False
+        # 输入框中只剩下文件对象的占位字符时，不算文字
+        text = self.chat_edit.value.replace(OBJECT_CHAR, "")
+        for path in self.pending_files:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            self.history.setdefault(self.current_chat, list()).append(
+                (SELF_NAME, (ntpath.basename(path), f"{size / 1024:.1f}K"))
+            )
+            sent = True
+        if text:
+            self.history.setdefault(self.current_chat, list()).append(
+                (SELF_NAME, text)
+            )
+            sent = True
+        self.pending_files = list()
+        self.chat_edit.value = ""
+        if sent:
+            self.backend.stats["sent"] += 1
+            if self.current_chat in self.sessions:
+                self.sessions.remove(self.current_chat)
+            self.sessions.insert(0, self.current_chat)
+            self._render_messages()
+            if not self.contacts_tab:
+                self._render_sessions(delay=0)
+
+    # ---------- 搜索 ----------
+
+    def _on_search_changed(self):
+        query = self.search_edit.value
+        if not query:
+            self.result_list.set_children([])
+            return
+        matches = [
+            contact.display_name
+            for contact in self.contacts
+            if query in contact.display_name or query in contact.nickname
+        ]
+        items = [SimControl(self.backend, "ListItemControl", "联系人")]
+        for name in matches[:10]:
+            items.append(
+                SimControl(
+                    self.backend,
+                    "ListItemControl",
+                    name,
+                    on_click=lambda c, n=name: self.open_chat(n),
+                )
+            )
+        items.append(SimControl(self.backend, "ListItemControl", ""))
+        items.append(SimControl(self.backend, "ListItemControl", "搜一搜"))
+        self.result_list.set_children(items)
+
+    # ---------- 按键 ----------
+
+    def handle_key(self, target: SimControl, ctrl: bool, key: str) -> None:
+        focus = self.backend.focus
+        if focus is not None and (not focus.alive or focus.root() is not self.window):
+            focus = None
+        if ctrl and key.lower() == "f":
+            self.backend.focus = self.search_edit
+            return
+        if focus is None:
+            return
+        if ctrl and key.lower() == "a":
+            focus.selected = True
+        elif ctrl and key.lower() == "v":
+            self._paste(focus)
+        elif key == "DELETE" or key == "BACK":
+            if focus.selected:
+                focus.value = ""
+                if focus is self.chat_edit:
+                    self.pending_files = list()
+            else:
+                focus.value = focus.value[:-1]
+            focus.selected = False
+            self._changed(focus)
+        elif key == "ENTER":
+            if focus is self.chat_edit:
+                self._send_draft()
+        elif key == "ESC":
+            if focus is self.search_edit:
+                focus.value = ""
+                self._changed(focus)
+        elif len(key) == 1:
+            focus.value = ("" if focus.selected else focus.value) + key
+            focus.selected = False
+            self._changed(focus)
+
+    def _paste(self, focus: SimControl) -> None:
+        clipboard = self.backend.clipboard
+        if isinstance(clipboard, list):
+            if focus is self.chat_edit:
+                # 与 RichEdit 一样，粘贴的文件在输入框内容中表示为对象占位字符
+                if focus.selected:
+                    focus.value = ""
+                    self.pending_files = list()
+                focus.selected = False
+                self.pending_files.extend(clipboard)
+                focus.value += OBJECT_CHAR * len(clipboard)
+            return
+        focus.value = ("" if focus.selected else focus.value) + clipboard
+        focus.selected = False
+        self._changed(focus)
+
+    def _changed(self, focus: SimControl) -> None:
+        if focus is self.search_edit:
+            self._on_search_changed()
+
+
+class SimContactsManager:
+    """模拟的 通讯录管理 窗口"""
+
+    def __init__(self, wechat: SimWeChat):
+        self.wechat = wechat
+        self.backend = wechat.backend
+        self.page_size = self.backend.page_size
+        self.top = 0
+        self.tag = None
+        self.window = None
+
+    def visible_contacts(self) -> list:
+        if not self.tag:
+            return self.wechat.contacts
+        return [c for c in self.wechat.contacts if self.tag in c.tags.split(",")]
+
+    def scroll_range(self) -> int:
+        return max(0, len(self.visible_contacts()) - self.page_size)
+
+    def open(self) -> None:
+        backend = self.backend
+        self.top = 0
+        self.tag = None
+        self.tag_panel = SimControl(backend, "PaneControl", "标签面板")
+        self.list = SimControl(backend, "ListControl", "")
+        self.list.scroll_pattern = SimScrollPattern(self)
+        self.detail = SimControl(backend, "PaneControl", "详情")
+        self.window = SimControl(
+            backend,
+            "WindowControl",
+            CONTACTS_MANAGER_NAME,
+            "ContactManagerWindow",
+            children=[
+                SimControl(backend, "ButtonControl", "最大化"),
+                SimControl(backend, "ButtonControl", "标签", on_click=self._toggle_tags),
+                self.tag_panel,
+                self.list,
+                self.detail,
+            ],
+        )
+        self.window.hwnd = self.wechat.hwnd + 1
+        self.window._show_at(time.perf_counter() + backend.ui_delay)
+        backend.desktop.append(self.window)
+        backend.foreground = self.window
+        self._render_page(delay=0)
+
+    def close(self) -> None:
+        if self.window is None:
+            return
+        self.backend.desktop.children.remove(self.window)
+        self.window._kill()
+        self.window = None
+        self.backend.foreground = self.wechat.window
+
+    def scroll_to(self, top: int) -> None:
+        self.top = max(0, min(top, self.scroll_range()))
+        self._render_page()
+
+    def _toggle_tags(self, control) -> None:
+        if self.tag_panel.children:
+            self.tag_panel.set_children([])
+            return
+        names = sorted(
+            {t for c in self.wechat.contacts for t in c.tags.split(",") if t}
+        )
+        self.tag_panel.set_children(
+            [
+                SimControl(
+                    self.backend,
+                    "PaneControl",
+                    name,
+                    on_click=lambda c, n=name: self._select_tag(n),
+                )
+                for name in names
+            ]
+        )
+
+    def _select_tag(self, tag: str) -> None:
+        self.tag = tag
+        self.top = 0
+        self._render_page()
+
+    def _render_page(self, delay: float = None) -> None:
+        backend = self.backend
+        nodes = list()
+        for contact in self.visible_contacts()[self.top : self.top + self.page_size]:
+            nodes.append(
+                SimControl(
+                    backend,
+                    "ListItemControl",
+                    "",
+                    children=[
+                        SimControl(
+                            backend,
+                            "ButtonControl",
+                            contact.nickname,
+                            on_click=lambda c, ct=contact: self._show_detail(ct),
+                        ),
+                        SimControl(backend, "TextControl", contact.nickname),
+                        SimControl(
+                            backend,
+                            "ButtonControl",
+                            contact.remark,
+                            on_click=lambda c, ct=contact: self._show_detail(ct),
+                        ),
+                        SimControl(backend, "ButtonControl", contact.tags),
+                    ],
+                )
+            )
+        self.list.set_children(nodes, delay)
+
+    def _show_detail(self, contact: SimContact) -> None:
+        backend = self.backend
+        children = [
+            SimControl(backend, "TextControl", contact.display_name),
+            SimControl(backend, "TextControl", "微信号："),
+            SimControl(backend, "TextControl", contact.wechat_id),
+        ]
+        if contact.region:
+            children.append(SimControl(backend, "TextControl", "地区："))
+            children.append(SimControl(backend, "TextControl", contact.region))
+        if contact.tags:
+            children.append(SimControl(backend, "TextControl", "标签"))
+            children.append(SimControl(backend, "TextControl", contact.tags))
+        self.detail.set_children(children)
+
+    def handle_key(self, target: SimControl, ctrl: bool, key: str) -> None:
+        if key == "PAGEDOWN":
+            self.scroll_to(self.top + self.page_size)
+        elif key == "PAGEUP":
+            self.scroll_to(self.top - self.page_size)
+        elif key == "HOME":
+            self.scroll_to(0)
+        elif key == "END":
+            self.scroll_to(self.scroll_range())
+        elif key == "ESC":
+            if self.detail.children:
+                self.detail.set_children([], delay=0)
+            else:
+                self.close()
+
+
+class SimBackend(WxBackend):
+    """
+    模拟后端.
+
+    Args:
+        contacts(list): 好友列表，元素为 SimContact
+        latency(float): 每次查找、枚举、点击、按键、剪切板操作的固定耗时（秒）
+        node_latency(float): 查找和枚举时每访问一个控件的耗时（秒），模拟跨进程遍历控件树
+        miss_penalty(float): 查找不到控件时的额外耗时，真实环境下为全局查找超时，
+                             所以不超过当前的 search_timeout
+        ui_delay(float): 界面变化（搜索结果、聊天面板、详情面板）在多久之后才可见
+        wait_scale(float): 调用方要求的 waitTime 的缩放系数，0 表示忽略固定等待
+        fault_rate(float): 每次操作注入故障的概率
+        fault_ops(iterable): 注入故障的操作名（search、children、click、keys、read、scroll、clipboard），为空表示全部
+        page_size(int): 通讯录管理窗口每页显示的好友数
+        seed(int): 故障注入的随机种子
+        instances(int): 模拟的微信实例（窗口）个数
+        accounts(list): 可选参数，各个实例登录的账号昵称，默认为 账号1、账号2……
+    """
+
+    def __init__(
+        self,
+        contacts: list = None,
+        latency: float = 0.0,
+        node_latency: float = 0.0,
+        miss_penalty: float = 0.0,
+        ui_delay: float = 0.0,
+        wait_scale: float = 1.0,
+        fault_rate: float = 0.0,
+        fault_ops=None,
+        page_size: int = 12,
+        seed: int = None,
+        instances: int = 1,
+        accounts: list = None,
+    ):
+        self.latency = latency
+        self.node_latency = node_latency
+        self.miss_penalty = miss_penalty
+        self.ui_delay = ui_delay
+        self.wait_scale = wait_scale
+        self.fault_rate = fault_rate
+        self.fault_ops = set(fault_ops) if fault_ops else None
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self.search_timeout = 3
+        self.clipboard = ""
+        self.focus = None
+
+        self.desktop = SimControl(self, "PaneRoot", "桌面")
+        contacts = contacts if contacts is not None else make_contacts(50)
+        self.instances = list()
+        for i in range(instances):
+            account = accounts[i] if accounts else f"账号{i + 1}"
+            wechat = SimWeChat(self, contacts, hwnd=0x10000 * (i + 1), account=account)
+            self.instances.append(wechat)
+            self.desktop.append(wechat.window)
+        self.wechat = self.instances[0]
+        self.foreground = self.wechat.window
+
+    # ---------- 计时与故障注入 ----------
+
+    def _charge(self, op: str) -> None:
+        self.stats[op] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fault_rate and (self.fault_ops is None or op in self.fault_ops):
+            if self.random.random() < self.fault_rate:
+                self.stats["faults"] += 1
+                if op == "search":
+                    raise LookupError(f"模拟故障：{op}")
+                raise SimFault(f"模拟故障：{op}")
+
+    def _charge_nodes(self, count: int) -> None:
+        self.stats["nodes"] += count
+        if self.node_latency and count:
+            time.sleep(self.node_latency * count)
+
+    def _miss(self) -> None:
+        self.stats["misses"] += 1
+        if self.miss_penalty:
+            time.sleep(min(self.miss_penalty, self.search_timeout))
+
+    def _wait(self, seconds: float) -> None:
+        if seconds and self.wait_scale:
+            time.sleep(seconds * self.wait_scale)
+
+    def _instance_of(self, control: SimControl):
+        root = control.root()
+        for wechat in self.instances:
+            if root is wechat.window or (
+                wechat.manager.window is not None and root is wechat.manager.window
+            ):
+                return wechat
+        return None
+
+    def _dispatch_key(self, target: SimControl, ctrl: bool, key) -> None:
+        wechat = self._instance_of(target)
+        if wechat is None:
+            return
+        if target.root() is wechat.manager.window:
+            wechat.manager.handle_key(target, ctrl, key)
+        else:
+            wechat.handle_key(target, ctrl, key)
+
+    # ---------- WxBackend 接口 ----------
+
+    def set_search_timeout(self, seconds: float) -> None:
+        self.search_timeout = seconds
+
+    def find_window(self, class_name: str, name: str) -> int:
+        self._charge("search")
+        for wechat in self.instances:
+            if wechat.window.ClassName == class_name and wechat.window._name == name:
+                return wechat.hwnd
+        return 0
+
+    def find_windows(self, class_name: str, name: str) -> list:
+        self._charge("search")
+        return [
+            wechat.hwnd
+            for wechat in self.instances
+            if wechat.window.ClassName == class_name and wechat.window._name == name
+        ]
+
+    def foreground_window(self) -> int:
+        self._charge("read")
+        return getattr(self.foreground, "hwnd", 0)
+
+    def wake_up_window(self, hwnd: int) -> None:
+        self._charge("window")
+        self.stats["switches"] += 1
+        for wechat in self.instances:
+            if wechat.hwnd == hwnd:
+                self.foreground = wechat.window
+
+    def minimize_window(self, hwnd: int) -> None:
+        self._charge("window")
+
+    def window_control(self, name: str, class_name: str):
+        return self.desktop.WindowControl(Name=name, ClassName=class_name, searchDepth=1)
+
+    def window_from_handle(self, hwnd: int):
+        for wechat in self.instances:
+            if wechat.hwnd == hwnd:
+                return wechat.window
+        raise LookupError(f"窗口不存在：{hwnd:#x}")
+
+    def foreground_control(self):
+        self._charge("read")
+        return self.foreground
+
+    def root_control(self):
+        return self.desktop
+
+    def key(self, name: str):
+        assert name in SPECIAL_KEYS, f"不支持的按键 {name}"
+        return name
+
+    def send_key(self, key, wait_time: float = OPERATION_WAIT_TIME) -> None:
+        self._charge("keys")
+        target = self.focus if self.focus is not None and self.focus.alive else None
+        if target is None or target.root() is not self.foreground:
+            target = self.foreground
+        self._dispatch_key(target, False, key)
+        self._wait(wait_time)
+
+    def set_clipboard_text(self, text: str) -> None:
+        self._charge("clipboard")
+        self.clipboard = text
+
+    def set_clipboard_files(self, full_paths: list) -> None:
+        self._charge("clipboard")
+        self.clipboard = [os.path.abspath(path) for path in full_paths]
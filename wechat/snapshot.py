@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  控件子树快照：遍历一次，之后用 Python 在内存中查找
+
+"""
+控件子树快照。
+
+TextControl(foundIndex=idx)、TextControl(Name="微信号：") 这样的查找每次都从起点重新遍历
+控件树，连续查找几次就是几次完整的跨进程遍历，找不到时还要等全局查找超时。
+
+snapshot 把一棵子树遍历一次，记下每个控件的名称、类型和兄弟顺序，之后的查找、取下一个
+兄弟都在内存中完成；walk 按同样的顺序边遍历边产出节点，找到需要的节点即可停止。
+节点保留原控件的引用，需要点击时直接使用。
+"""
+
+
+class UiNode:
+    """控件快照中的一个节点"""
+
+    __slots__ = ("control", "name", "control_type", "index", "parent", "children")
+
+    def __init__(self, control, parent: "UiNode" = None, index: int = 0):
+        self.control = control
+        self.name = control.Name
+        self.control_type = control.ControlTypeName
+        self.index = index
+        self.parent = parent
+        self.children = list()
+
+    def __repr__(self):
+        return f"UiNode({self.control_type}, {self.name!r})"
+
+    def __iter__(self):
+        """先序遍历所有后代节点，顺序与 uiautomation 的查找顺序一致"""
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    @staticmethod
+    def _match(node: "UiNode", control_type: str, name: str) -> bool:
+        return (control_type is None or node.control_type == control_type) and (
+            name is None or node.name == name
+        )
+
+    def find_all(self, control_type: str = None, name: str = None) -> list:
+        """按类型和名称查找所有后代节点"""
+        return [node for node in self if self._match(node, control_type, name)]
+
+    def find(self, control_type: str = None, name: str = None, found_index: int = 1):
+        """
+        按类型和名称查找后代节点.
+
+        Args:
+            control_type(str): 可选参数，控件类型，如 TextControl
+            name(str): 可选参数，控件名称
+            found_index(int): 第几个匹配的节点，从 1 开始，与 uiautomation 的 foundIndex 一致
+
+        Returns:
+            UiNode，找不到返回 None
+        """
+        for node in self:
+            if self._match(node, control_type, name):
+                found_index -= 1
+                if found_index == 0:
+                    return node
+        return None
+
+    def next_sibling(self):
+        if self.parent is None or self.index + 1 >= len(self.parent.children):
+            return None
+        return self.parent.children[self.index + 1]
+
+    def value_after(self, label: str, control_type: str = "TextControl"):
+        """
+        取标签后面紧跟的控件名称，如详情面板中 "微信号：" 之后的微信号.
+
+        Returns:
+            str，没有该标签时返回 None
+        """
+        node = self.find(control_type, label)
+        if node is None:
+            return None
+        sibling = node.next_sibling()
+        return sibling.name if sibling is not None else ""
+
+
+def snapshot(control, max_depth: int = 0xFFFFFFFF) -> UiNode:
+    """
+    遍历一次控件子树，生成快照.
+
+    Args:
+        control: uiautomation 控件
+        max_depth(int): 可选参数，遍历深度，1 表示只读取直接子控件
+
+    Returns:
+        UiNode: 子树的根节点
+    """
+    root = UiNode(control)
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if depth >= max_depth:
+            continue
+        for index, child in enumerate(node.control.GetChildren()):
+            child_node = UiNode(child, node, index)
+            node.children.append(child_node)
+            stack.append((child_node, depth + 1))
+    return root
+
+
+def walk(control, max_depth: int = 0xFFFFFFFF):
+    """
+    按先序边遍历边产出节点，调用者找到需要的节点后停止即可，后面的子树不会被读取.
+
+    Args:
+        control: uiautomation 控件
+        max_depth(int): 可选参数，遍历深度
+
+    Yields:
+        UiNode: 不含 control 本身的后代节点，节点的 children 不会被填充
+    """
+    stack = [(child, 1) for child in reversed(control.GetChildren())]
+    while stack:
+        child, depth = stack.pop()
+        yield UiNode(child)
+        if depth < max_depth:
+            stack.extend(
+                (grandchild, depth + 1) for grandchild in reversed(child.GetChildren())
+            )
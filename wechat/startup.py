@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  启动耗时：按阶段记录界面程序的启动和连接微信窗口的耗时
+
+"""
+启动耗时记录。
+
+main.py 最先导入本模块开始计时，之后在每个阶段结束时调用 mark：导入模块（imports）、
+创建界面（ui_setup）、窗口显示出来（show）。连接微信窗口（attach）发生在第一次点击按钮时，
+由 Worker 单独计时后调用 record。
+
+每个阶段的耗时打印到控制台，并追加到 _startup_timing.csv，打包成 exe 之后没有控制台
+也能比较每次改动对启动速度的影响。
+"""
+
+import csv
+import os
+import time
+from datetime import datetime
+
+STARTUP_TIMING_FILE = "_startup_timing.csv"
+
+STARTUP_TIMING_HEADER = ["时间", "阶段", "耗时（秒）"]
+
+_last = time.perf_counter()
+
+
+def mark(phase: str) -> float:
+    """
+    结束一个阶段，记录从上一个阶段结束（或本模块导入）到现在的耗时.
+
+    Args:
+        phase(str): 阶段名
+
+    Returns:
+        float: 该阶段的耗时（秒）
+    """
+    global _last
+    now = time.perf_counter()
+    seconds = now - _last
+    _last = now
+    record(phase, seconds)
+    return seconds
+
+
+def record(phase: str, seconds: float, path: str = STARTUP_TIMING_FILE) -> None:
+    """
+    记录一个阶段的耗时.
+
+    Args:
+        phase(str): 阶段名
+        seconds(float): 耗时（秒）
+        path(str): 可选参数，追加写入的 csv 文件
+    """
+    print("启动耗时：：", phase, round(seconds, 3))
+    try:
+        new_file = not os.path.exists(path)
+        with open(path, mode="a", newline="", encoding="utf-8-sig") as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(STARTUP_TIMING_HEADER)
+            writer.writerow(
+                [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), phase, f"{seconds:.3f}"]
+            )
+    except OSError as ex:
+        # 记录耗时失败不影响使用
+        print("写入启动耗时失败：", ex)
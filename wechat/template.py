@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  消息模板：一次编译为文字片段和占位符片段，之后按行渲染
+
+"""
+消息模板。
+
+模板中用 {列名} 引用联系人 csv 的任意一列，如 {称谓}、{敬语}、{地区}、{标签}、{备注名}，
+也可以是自定义列；需要输出花括号本身时写成 {{ 和 }}。
+
+模板只解析一次，编译成文字片段和占位符片段，渲染时按片段拼接，不再扫描模板文本。
+发送之前可以用 unknown_placeholders 检查模板里是否有 csv 中不存在的列，避免把拼错的
+{xxx} 原样发给所有人。
+"""
+
+import re
+
+from wechat.plan import PLAN_COLUMNS
+
+# 占位符：{列名}，列名中不能有空白和花括号
+_TOKEN = re.compile(r"\{\{|\}\}|\{([^{}\s]+)\}")
+
+# 有默认值的列，即使 csv 中没有也可以使用
+DEFAULT_COLUMNS = ("称谓", "敬语")
+
+# csv 列名 -> 计划条目中的键
+_COLUMN_KEYS = dict(PLAN_COLUMNS)
+
+
+class MsgTemplate:
+    """
+    编译后的消息模板.
+
+    Args:
+        text(str): 模板文本
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.segments = self._compile(text)
+        self.placeholders = [name for is_field, name in self.segments if is_field]
+
+    @staticmethod
+    def _compile(text: str) -> tuple:
+        """把模板拆成 (是否占位符, 文字或列名) 片段，相邻的文字片段合并"""
+        segments = list()
+        literal = list()
+        pos = 0
+        for match in _TOKEN.finditer(text):
+            literal.append(text[pos : match.start()])
+            pos = match.end()
+            token = match.group(0)
+            if token == "{{":
+                literal.append("{")
+            elif token == "}}":
+                literal.append("}")
+            else:
+                if literal:
+                    segments.append((False, "".join(literal)))
+                    literal = list()
+                segments.append((True, match.group(1)))
+        literal.append(text[pos:])
+        tail = "".join(literal)
+        if tail:
+            segments.append((False, tail))
+        return tuple(seg for seg in segments if seg[0] or seg[1])
+
+    def unknown_placeholders(self, columns) -> list:
+        """
+        检查模板中 csv 里不存在的占位符.
+
+        Args:
+            columns(Iterable): csv 表头
+
+        Returns:
+            list: 未知的列名，按在模板中出现的顺序去重
+        """
+        known = set(columns) | set(DEFAULT_COLUMNS)
+        unknown = list()
+        for name in self.placeholders:
+            if name not in known and name not in unknown:
+                unknown.append(name)
+        return unknown
+
+    def bind(self) -> tuple:
+        """把占位符换成计划条目中的键，得到渲染时直接使用的片段"""
+        return tuple(
+            (is_field, _COLUMN_KEYS.get(value, value) if is_field else value)
+            for is_field, value in self.segments
+        )
+
+    def render(self, task: dict) -> str:
+        """
+        渲染一个接收人的消息.
+
+        Args:
+            task(dict): plan.iter_plan 生成的计划条目
+
+        Returns:
+            str
+        """
+        return self.renderer()(task)
+
+    def renderer(self):
+        """返回渲染函数，批量渲染时避免重复绑定"""
+        segments = self.bind()
+        if not any(is_field for is_field, _ in segments):
+            text = "".join(value for _, value in segments)
+            return lambda task: text
+
+        def render(task: dict) -> str:
+            return "".join(
+                task.get(value, "") if is_field else value
+                for is_field, value in segments
+            )
+
+        return render
+
+    def render_many(self, tasks):
+        """
+        批量渲染.
+
+        Args:
+            tasks(Iterable[dict]): 计划条目
+
+        Yields:
+            tuple: (计划条目, 消息)
+        """
+        render = self.renderer()
+        for task in tasks:
+            yield task, render(task)
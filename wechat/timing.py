@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  分步耗时统计：记录发送、抓取每一步的耗时分布、超时和查找不到的次数
+
+"""
+分步耗时统计。
+
+每个接收人两三秒的时间花在哪里，要靠数据回答。发送时按步骤计时：
+
+- panel：读取当前聊天面板的好友名称
+- search：Ctrl+F 搜索，等待搜索结果列出
+- results：在搜索结果中找到同名联系人，点击后等待聊天窗口切换过来
+- edit：定位聊天输入框
+- paste、enter：粘贴一段文字、回车并等待输入框清空
+- file_paste、file_enter：粘贴图片和文件、回车
+
+抓取好友时按步骤计时：
+
+- row：读取联系人行的快照
+- click：点击联系人，等待详情面板显示
+- detail：读取详情面板中的微信号、地区、标签
+- close：关闭详情面板并等待关闭
+- page：翻页并等待列表刷新
+
+每一步记录耗时样本，统计次数、p50、p95、最大值，以及等待超时和查找不到控件的次数。
+一次发送结束后写到发送日志旁边（_log[...].timing.json），抓取结束后写到好友 csv 旁边，
+不用 .csv 扩展名，免得被当作发送日志汇总进已问候索引。
+"""
+
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+
+# 耗时统计文件的后缀
+TIMING_SUFFIX = ".timing.json"
+
+
+def timing_path(filename: str) -> str:
+    """发送日志或好友 csv 旁边的耗时统计文件"""
+    return os.path.splitext(filename)[0] + TIMING_SUFFIX
+
+
+def percentile(ordered: list, q: float) -> float:
+    """已排序样本的百分位数（最近秩），没有样本时返回 0"""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(q * len(ordered)))
+    return ordered[rank - 1]
+
+
+class StepTimer:
+    """
+    按步骤记录耗时、超时和查找不到的次数.
+
+    Args:
+        clock(Callable): 可选参数，时钟，默认为 time.perf_counter
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.samples = dict()
+        self.timeouts = dict()
+        self.misses = dict()
+
+    @contextmanager
+    def step(self, name: str):
+        """
+        计时一个步骤，出错时同样记录耗时::
+
+            with self.timing.step("search"):
+                results = ...
+        """
+        started = self.clock()
+        try:
+            yield self
+        finally:
+            self.samples.setdefault(name, list()).append(self.clock() - started)
+
+    def timeout(self, name: str) -> None:
+        """记录一次等待超时"""
+        self.timeouts[name] = self.timeouts.get(name, 0) + 1
+
+    def miss(self, name: str) -> None:
+        """记录一次查找不到控件或联系人"""
+        self.misses[name] = self.misses.get(name, 0) + 1
+
+    def steps(self) -> list:
+        """记录过的步骤，按第一次出现的顺序"""
+        names = list(self.samples)
+        for name in list(self.timeouts) + list(self.misses):
+            if name not in names:
+                names.append(name)
+        return names
+
+    def stats(self) -> dict:
+        """
+        每一步的统计.
+
+        Returns:
+            dict: 步骤 -> {count, p50, p95, max, mean, total, timeouts, misses}，时间单位为毫秒
+        """
+        result = dict()
+        for name in self.steps():
+            ordered = sorted(self.samples.get(name, list()))
+            total = sum(ordered)
+            result[name] = {
+                "count": len(ordered),
+                "p50": round(percentile(ordered, 0.5) * 1000, 1),
+                "p95": round(percentile(ordered, 0.95) * 1000, 1),
+                "max": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+                "mean": round(total / len(ordered) * 1000, 1) if ordered else 0.0,
+                "total": round(total * 1000, 1),
+                "timeouts": self.timeouts.get(name, 0),
+                "misses": self.misses.get(name, 0),
+            }
+        return result
+
+    def save(self, path: str) -> None:
+        """写出统计，写入失败不影响发送和抓取"""
+        try:
+            with open(path, mode="w", encoding="utf-8") as file:
+                json.dump(self.stats(), file, ensure_ascii=False, indent=2)
+        except OSError as ex:
+            print("写入耗时统计失败：", ex)
+
+    def print_stats(self) -> None:
+        """在控制台打印每一步的 p50/p95/最大值（毫秒）和超时、查找不到的次数"""
+        for name, item in self.stats().items():
+            print(
+                "步骤耗时：：",
+                name,
+                item["count"],
+                "次，p50",
+                item["p50"],
+                "p95",
+                item["p95"],
+                "最大",
+                item["max"],
+                "超时",
+                item["timeouts"],
+                "未找到",
+                item["misses"],
+            )
@@ -1,3 +1,4 @@
+import time
 from datetime import datetime
 
 
@@ -16,3 +17,31 @@ def fmtfn(filename: str) -> str:
 
 def is_empty_entry(thedic: dict, entry_name: str) -> bool:
     return entry_name not in thedic or not thedic[entry_name].strip()
+
+
+def wait_until(condition, timeout: float = 3, interval: float = 0.05, stop=None):
+    """
+    轮询等待界面就绪.
+
+    反复调用 condition，直到返回真值或超时。condition 中查找控件抛出的异常视为尚未就绪。
+
+    Args:
+        condition(Callable): 检查界面状态的函数
+        timeout(float): 最长等待时间（秒）
+        interval(float): 轮询间隔（秒）
+        stop(Callable): 可选参数，每次轮询都检查，返回 True 时放弃等待
+
+    Returns:
+        condition 最后一次的返回值，超时未就绪或被停止时为假值
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            result = condition()
+        except Exception:
+            result = None
+        if result or time.perf_counter() >= deadline:
+            return result
+        if stop is not None and stop():
+            return result
+        time.sleep(interval)
@@ -5,20 +5,59 @@
 """微信群发消息"""
 
 import os
+import sqlite3
 import sys
-import subprocess
 import time
-import csv
+from collections import Counter
 
-import uiautomation as auto
-import win32con
-import win32gui
-
-from PySide6.QtCore import QObject, Signal, Slot, QMutex, QRunnable
+from PySide6.QtCore import QObject, Signal, Slot, QRunnable
 import traceback
 import wechat.utils as utils
-
-auto.SetGlobalSearchTimeout(3)
+import wechat.chat_records as chat_records
+import wechat.plan as plan
+import wechat.resolve as resolve
+from wechat.backend import WxBackend
+from wechat.cancel import CancelToken
+from wechat.contacts import ContactStore
+from wechat.control_cache import ControlCache
+from wechat.filters import RecipientFilter, compile_filter
+from wechat.greeted import GreetingIndex
+from wechat.journal import CANCELLED, SendJournal, journal_path
+from wechat.pacing import Pacer
+from wechat.payload import Campaign, Payload, PayloadBuilder
+from wechat.progress import ProgressReporter
+from wechat.resolve import ResolutionCache, ResolveReport
+from wechat.scrape import (
+    FriendDelta,
+    FriendWriter,
+    ScrapeCheckpoint,
+    delta_report_path,
+    diff_friends,
+    fingerprint,
+    next_page_percent,
+    wechat_key,
+    write_delta_report,
+)
+from wechat.snapshot import snapshot, walk
+from wechat.timing import StepTimer, timing_path
+
+# 条件等待：界面就绪后立即继续，最多等待的时间（秒）
+UI_WAIT_TIMEOUT = 3
+# 翻页后等待列表刷新的最长时间（秒），到达末页时列表不再变化
+PAGE_WAIT_TIMEOUT = 1
+# 搜索结果与上一次搜索完全相同时，再等这么久（秒）确认列表已经刷新
+# 轮询等待中单次查找控件的超时（秒）：没找到下一轮再试，不必等满全局查找超时
+POLL_SEARCH_TIMEOUT = 0
+
+# 微信主窗口的标题和类名
+WX_WINDOW_NAME = "微信"
+WX_WINDOW_CLASS = "WeChatMainWndForPC"
+
+# 控件缓存键
+SEARCH_EDIT = ("EditControl", "搜索")
+SEARCH_RESULTS = ("ListControl", "搜索结果")
+CHAT_EDIT = ("EditControl", "聊天输入框")
+MESSAGE_LIST = ("ListControl", "消息")
 
 
 class WxSignals(QObject):
@@ -37,52 +76,48 @@ class WxSignals(QObject):
         object data returned from processing, anything
 
     progress
-        int indicating % progress
+        Progress 结构化的进度（成功、失败、跳过、总数、速度、预计完成时间），按固定频率合并发出
+
+    停止和暂停的状态放在每个实例自己的 CancelToken 中，每个任务开始时换一个新的令牌，
+    见 wechat.cancel。
 
     """
 
     finished = Signal()
     error = Signal(tuple)
     result = Signal(object)
-    progress = Signal(int)
+    progress = Signal(object)
     statusinfo = Signal(str)
 
-    flag = False
-    mutex = QMutex()
+    def __init__(self):
+        super(WxSignals, self).__init__()
+        self.token = CancelToken()
 
     def set_flag(self, newflag: bool):
-        self.mutex.lock()
-        self.flag = newflag
-        self.mutex.unlock()
+        """为 True 时停止当前任务；为 False 时换一个新的令牌，开始新的任务"""
+        if newflag:
+            self.token.cancel()
+        else:
+            self.token = CancelToken()
 
     def get_flag(self) -> bool:
-        self.mutex.lock()
-        flag = self.flag
-        self.mutex.unlock()
-        return flag
+        return self.token.cancelled
 
+    def set_paused(self, paused: bool):
+        if paused:
+            self.token.pause()
+        else:
+            self.token.resume()
 
-class WxOperation(QRunnable):
-    """
-    微信群发消息的类。
+    def is_paused(self) -> bool:
+        return self.token.paused
 
-    ...
 
-    Attributes:
-    ----------
-    wx_window: auto.WindowControl
-        微信控制窗口
-    input_edit: wx_window.EditControl
-        聊天界面输入框编辑控制窗口
-    search_edit: wx_window.EditControl
-        搜索输入框编辑控制窗口
-
-    """
+class WxRunnable(QRunnable):
+    """在线程池中执行 set_command 设置的命令，结果和状态通过 signals 发出"""
 
     def __init__(self):
-        super(WxOperation, self).__init__()
-
-        self.preparewx()
+        super(WxRunnable, self).__init__()
         self.signals = WxSignals()
 
     def set_command(self, fn, *args, **kwargs):
@@ -112,69 +147,314 @@ class WxOperation(QRunnable):
         finally:
             self.signals.finished.emit()  # Done
 
+
+class WxOperation(WxRunnable):
+    """
+    微信群发消息的类。
+
+    ...
+
+    Attributes:
+    ----------
+    backend: WxBackend
+        界面自动化后端，默认为操作真实微信窗口的 UiaBackend
+    hwnd: int
+        操作的微信主窗口句柄，同时登录多个微信时每个窗口一个 WxOperation
+    wx_window: auto.WindowControl
+        微信控制窗口
+    input_edit: wx_window.EditControl
+        聊天界面输入框编辑控制窗口
+    search_edit: wx_window.EditControl
+        搜索输入框编辑控制窗口
+    controls: ControlCache
+        已定位控件的缓存，窗口重新连接时清空
+    timing: StepTimer
+        发送、抓取每一步的耗时统计，每次发送、抓取开始时重新计数
+
+    """
+
+    def __init__(self, backend: WxBackend = None, hwnd: int = None):
+        super(WxOperation, self).__init__()
+
+        if backend is None:
+            from wechat.backend import UiaBackend
+
+            backend = UiaBackend(search_timeout=3)
+        self.backend = backend
+        self.hwnd = hwnd
+        self.controls = ControlCache()
+        self.timing = StepTimer()
+        # 最近一次搜索时没有等到上次的结果清空，读到的可能是上一次搜索的结果，不记入解析缓存
+        self.search_stale = False
+        self.preparewx()
+
     def preparewx(self):
         self.__wake_up_window()  # Windows系统层面唤醒微信窗口
-        self.wx_window = auto.WindowControl(Name="微信", ClassName="WeChatMainWndForPC")
-        # print('hhhhhhhhhhhhee')
-        print(self.wx_window.GetChildren())
+        if self.hwnd is None:
+            self.wx_window = self.backend.window_control(
+                name=WX_WINDOW_NAME, class_name=WX_WINDOW_CLASS
+            )
+        else:
+            self.wx_window = self.backend.window_from_handle(self.hwnd)
         assert self.wx_window.Exists(3, 0.5), "窗口不存在"
+        # 窗口重新连接后，之前定位的控件全部作废
+        self.controls.invalidate()
         # self.input_edit = self.wx_window.EditControl(Name='输入')
-        self.search_edit = self.wx_window.EditControl(Name="搜索")
+        self.search_edit = self.controls.get(
+            SEARCH_EDIT, lambda: self.wx_window.EditControl(Name="搜索"), name="搜索"
+        )
+
+    def cache_stats(self) -> dict:
+        """控件缓存的命中、未命中和作废次数"""
+        return self.controls.stats()
 
-    @staticmethod
-    def minimize_wx():
+    def window_handle(self) -> int:
+        """操作的微信主窗口句柄，没有指定时取第一个找到的微信窗口"""
+        if self.hwnd is not None:
+            return self.hwnd
+        return self.backend.find_window(WX_WINDOW_CLASS, WX_WINDOW_NAME)
+
+    def minimize_wx(self):
         """结束时候最小化微信窗口"""
-        hwnd = win32gui.FindWindow("WeChatMainWndForPC", "微信")
-        if win32gui.IsWindowVisible(hwnd):
-            # 展示窗口，以下几行代码都可以唤醒窗口
-            win32gui.ShowWindow(hwnd, win32con.SW_MINIMIZE)
+        self.backend.minimize_window(self.window_handle())
 
-    @staticmethod
-    def __wake_up_window():
+    def __wake_up_window(self):
         """唤醒微信窗口"""
-        hwnd = win32gui.FindWindow("WeChatMainWndForPC", "微信")
+        hwnd = self.window_handle()
         # 展示窗口
-        win32gui.SetForegroundWindow(hwnd)
-        win32gui.ShowWindow(hwnd, win32con.SW_SHOWDEFAULT)
+        self.backend.wake_up_window(hwnd)
+
+    def focus(self) -> bool:
+        """
+        把本窗口切换到前台，已经在前台时不做任何操作.
+
+        Returns:
+            bool: 是否切换了窗口
+        """
+        hwnd = self.window_handle()
+        if self.backend.foreground_window() == hwnd:
+            return False
+        self.backend.wake_up_window(hwnd)
+        return True
+
+    def activate(self) -> None:
+        """任务开始前把窗口切换到前台，复用的会话的窗口可能已经被挡住或最小化"""
+        self.focus()
+
+    def is_alive(self) -> bool:
+        """微信窗口是否还在（没有退出、重新登录），不在时需要重新连接"""
+        try:
+            return bool(self.wx_window.Exists(0, 0))
+        except Exception:
+            return False
+
+    def account_name(self) -> str:
+        """当前登录的账号昵称：导航栏第一个按钮（头像）的名称，取不到时返回空字符串"""
+        try:
+            avatar = self.__wait_control(
+                lambda: self.wx_window.Control(Name="导航").ButtonControl(foundIndex=1)
+            )
+            if not avatar:
+                return ""
+            return avatar.Name
+        except Exception as ex:
+            print("读取账号昵称失败：", ex)
+            return ""
 
     def __get_current_panel_nickname(self) -> str:
-        """获取当前面板的好友昵称"""
-        for idx in range(1, 10):
-            current_panel_nickname = self.wx_window.TextControl(foundIndex=idx).Name
-            if current_panel_nickname:
-                return current_panel_nickname
+        """获取当前面板的好友昵称：前 9 个文字控件中第一个非空的名称"""
+        # 只遍历一次控件树，找到即停止，不再对每个 foundIndex 各查找一遍
+        text_count = 0
+        for node in walk(self.wx_window):
+            if node.control_type != "TextControl":
+                continue
+            if node.name:
+                return node.name
+            text_count += 1
+            if text_count >= 9:
+                break
+        return None
+
+    def __search_contacts(self, name: str, complete: bool = True):
+        """
+        在搜索框中搜索 name，读取搜索结果中联系人分组的名称.
+
+        Args:
+            name(str): 必选参数，搜索名
+            complete(bool): 可选参数，为 True 时等联系人分组全部列出（出现分组末尾的空白项），
+                            为 False 时出现同名联系人即返回
+
+        按键不等待界面，粘贴之后列表可能还是上一个名称的搜索结果。所以先清空搜索框，等到上次的
+        结果列表清空（或者已经失效）再粘贴，之后读到的列表一定是这次搜索的结果，不必与上一次
+        的结果比较。等不到清空时仍然搜索，但置 search_stale，结果不记入解析缓存。
+
+        Returns:
+            [(名称, 控件)]，等待超时返回 None
+        """
 
-    def __goto_chat_box(self, name: str) -> bool:
+        def cleared():
+            """上次的搜索结果列表已经清空；还没有搜索过或列表已经失效时也算清空"""
+            results = self.controls.lookup(SEARCH_RESULTS)
+            if results is None:
+                return True
+            try:
+                return not results.GetChildren()
+            except Exception:
+                return True
+
+        def search_results():
+            """搜索结果已经列出到联系人分组的末尾，或者（complete 为 False 时）出现了同名好友"""
+            results = snapshot(
+                self.controls.get(
+                    SEARCH_RESULTS, lambda: self.wx_window.ListControl(foundIndex=2)
+                ),
+                max_depth=1,
+            )
+            items = results.children[1:]  # 跳过第一个 标签
+            names = [item.name for item in items]
+            if "" in names:
+                # 保留末尾的空白项，找不到联系人时结果也不为空，不会被当作还没有出现
+                items = items[: names.index("") + 1]
+                names = names[: len(items)]
+            elif complete or name not in names:
+                return None
+            return [(item.name, item.control) for item in items]
+
+        with self.timing.step("search"):
+            # 按键按顺序进入输入队列，不必在每个按键之后等待
+            self.wx_window.SendKeys(text="{Ctrl}f", waitTime=0)
+            self.wx_window.SendKeys(text="{Ctrl}a", waitTime=0)
+            self.wx_window.SendKey(key=self.backend.key("DELETE"), waitTime=0)
+            self.search_stale = not self.__wait_until(cleared, UI_WAIT_TIMEOUT)
+            self.backend.set_clipboard_text(text=name)
+            self.wx_window.SendKeys(text="{Ctrl}v", waitTime=0)
+            results = self.__wait_until(search_results, UI_WAIT_TIMEOUT)
+        if not results:
+            self.timing.timeout("search")
+            return None
+        return [(_name, item) for _name, item in results if _name != ""]
+
+    def __goto_chat_box(self, name: str, resolution: ResolutionCache = None) -> bool:
         """
         跳转到指定 name好友的聊天窗口。
 
         Args:
             name(str): 必选参数，好友名称
+            resolution(ResolutionCache): 可选参数，接收人解析缓存。已解析为唯一的名称出现即点击；
+                                         其他名称等搜索结果全部列出后判断是否唯一，并记入缓存
 
         Returns:
-            None
+            bool: 是否跳转成功；找不到或有多个同名好友时返回 False
         """
         assert name, "无法跳转到名字为空的聊天窗口"
-        self.wx_window.SendKeys(text="{Ctrl}f", waitTime=0.2)
-        self.wx_window.SendKeys(text="{Ctrl}a", waitTime=0.1)
-        self.wx_window.SendKey(key=auto.SpecialKeyNames["DELETE"])
-        auto.SetClipboardText(text=name)
-        self.wx_window.SendKeys(text="{Ctrl}v", waitTime=0.1)
-        for idx, item in enumerate(
-            self.wx_window.ListControl(foundIndex=2).GetChildren()
-        ):
-            _name = item.Name
-            if idx == 0:  # 跳过第一个 标签
-                continue
-            if _name == "":
-                return False
-            if _name == name:
-                item.Click(waitTime=0.1)
-                # self.wx_window.SendKey(key=auto.SpecialKeyNames['ENTER'], waitTime=0.2)
-                time.sleep(0.5)
-                return True
+        known = resolution is None or resolution.status(name) == resolve.UNIQUE
+        results = self.__search_contacts(name, complete=not known)
+        if results is None:
+            return False
+        with self.timing.step("results"):
+            if not known:
+                status, matches = resolve.classify(
+                    name, [_name for _name, _ in results]
+                )
+                if not self.search_stale:
+                    resolution.record(name, status, matches)
+                if status != resolve.UNIQUE:
+                    print("接收人解析结果：：：", name, status, matches)
+                    self.timing.miss("results")
+                    self.__missed = True
+                    return False
+
+            for _name, item in results:
+                if _name == name:
+                    item.Click(waitTime=0)
+                    # self.wx_window.SendKey(key=auto.SpecialKeyNames['ENTER'], waitTime=0.2)
+                    # 等到聊天输入框出现，说明聊天窗口已经切换过来
+                    if self.__wait_control(
+                        lambda: self.wx_window.EditControl(Name=name),
+                        CHAT_EDIT,
+                        name,
+                    ):
+                        return True
+                    self.timing.timeout("results")
+                    return False
+            self.timing.miss("results")
+            self.__missed = True
         return False
 
+    def __wait_until(self, condition, timeout: float):
+        """
+        轮询等待界面就绪，按了停止立即放弃等待，见 utils.wait_until.
+
+        condition 中读取缓存控件、快照未定位的控件时，找不到会按全局查找超时卡住，期间无法
+        响应停止；等待期间改用 POLL_SEARCH_TIMEOUT，每一轮查找都很快返回。
+        """
+        with self.backend.limited_search(POLL_SEARCH_TIMEOUT):
+            return utils.wait_until(condition, timeout, stop=self.signals.get_flag)
+
+    def checkpoint(self) -> bool:
+        """
+        任务边界（两个接收人、两个好友之间）：暂停时在这里等到继续或停止.
+
+        Returns:
+            bool: 可以继续返回 True，已经停止返回 False
+        """
+        token = self.signals.token
+        if token.paused:
+            self.signals.statusinfo.emit("已暂停，继续后从当前位置接着处理")
+            if token.checkpoint():
+                self.signals.statusinfo.emit("继续处理")
+        return not token.cancelled
+
+    def __wait_edit_filled(self, edit, filled: bool) -> bool:
+        """
+        等待输入框有内容（粘贴完成）或变为空（消息已发出）.
+
+        表情等内容在输入框中的表示与原文不同，所以只判断是否为空；粘贴的文件、图片在内容中是
+        对象占位字符（U+FFFC），同样不为空。
+        输入框不支持 ValuePattern 时无法确认，退回到短暂的固定等待。
+        """
+        try:
+            pattern = edit.GetValuePattern()
+        except Exception:
+            pattern = None
+        if pattern is None:
+            time.sleep(0.1)
+            return True
+        return bool(
+            self.__wait_until(
+                lambda: bool(pattern.Value.strip()) == filled, UI_WAIT_TIMEOUT
+            )
+        )
+
+    def __wait_control(self, locate, key: tuple = None, name: str = None):
+        """
+        等待控件出现.
+
+        每次轮询只查找一次（Exists(0, 0)），不会因为控件还没出现而卡在全局查找超时上。
+        指定 key 时先取缓存，找到的控件也放入缓存。
+
+        Args:
+            locate(Callable): 返回待查找控件的函数
+            key(tuple): 可选参数，控件缓存键
+            name(str): 可选参数，控件应有的名称，用于校验缓存
+
+        Returns:
+            出现的控件，超时返回 None
+        """
+        if key is not None:
+            control = self.controls.lookup(key, name)
+            if control is not None:
+                return control
+
+        def located():
+            control = locate()
+            return control if control.Exists(0, 0) else None
+
+        control = self.__wait_until(located, UI_WAIT_TIMEOUT)
+        if control and key is not None:
+            self.controls.put(key, control)
+        return control
+
     
     def send_text_filetransfer(self, *msgs) -> None:
         """
@@ -206,80 +486,161 @@ class WxOperation(QRunnable):
                 #         # self.wx_window.SendKey(key=auto.SpecialKeyNames['ENTER'], waitTime=0.2)
                 #         time.sleep(1)
 
-                self.wx_window.ButtonControl(Name="文件传输助手").Click(waitTime=0.2)
-                time.sleep(1)
-                self.input_edit = self.wx_window.EditControl(Name="文件传输助手")
+                self.controls.get(
+                    ("ButtonControl", "文件传输助手"),
+                    lambda: self.wx_window.ButtonControl(Name="文件传输助手"),
+                    name="文件传输助手",
+                ).Click(waitTime=0)
+                self.input_edit = self.__wait_control(
+                    lambda: self.wx_window.EditControl(Name="文件传输助手"),
+                    CHAT_EDIT,
+                    "文件传输助手",
+                )
+                if not self.input_edit:
+                    raise LookupError("找不到文件传输助手的输入框")
             except LookupError:
                 print("error")
                 continue
-            self.input_edit.SendKeys(text="{Ctrl}a", waitTime=0.1)
-            self.input_edit.SendKey(key=auto.SpecialKeyNames["DELETE"])
+            self.input_edit.SendKeys(text="{Ctrl}a", waitTime=0)
+            self.input_edit.SendKey(key=self.backend.key("DELETE"), waitTime=0)
             # self.input_edit.SendKeys(text=msg, waitTime=0.1) # 一个个字符插入,不建议使用该方法
             # 设置到剪切板再黏贴到输入框
 
-            auto.SetClipboardText(msg)
-            self.input_edit.SendKeys(text="{Ctrl}v", waitTime=0.1)
-            self.wx_window.SendKey(key=auto.SpecialKeyNames["ENTER"], waitTime=0.2)
+            self.backend.set_clipboard_text(msg)
+            self.input_edit.SendKeys(text="{Ctrl}v", waitTime=0)
+            self.__wait_edit_filled(self.input_edit, True)
+            self.wx_window.SendKey(key=self.backend.key("ENTER"), waitTime=0)
+            self.__wait_edit_filled(self.input_edit, False)
 
-    def __send_file(self, *file_paths) -> None:
+    def __send_file(self, *file_paths) -> bool:
         """
         发送文件.
 
+        文件一次性放到剪切板（CF_HDROP）后粘贴到聊天输入框，确认输入框中出现了粘贴的内容
+        再回车，不再固定等待。
+
         Args:
             *file_paths(Iterable or str): 必选参数，为文件的路径
 
         Returns:
-            None
+            bool: 是否确认粘贴并发出
         """
-        all_path = str()
+        full_paths = list()
         for path in file_paths:
             full_path = os.path.abspath(path=path)
             assert os.path.exists(full_path), f"{full_path} 文件路径有误"
-            all_path += "'" + full_path + "',"
-        args = ["powershell", f"Get-Item {all_path[:-1]} | Set-Clipboard"]
-        # 去除console 弹窗
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags = (
-            subprocess.CREATE_NEW_CONSOLE | subprocess.STARTF_USESHOWWINDOW
-        )
-        startupinfo.wShowWindow = subprocess.SW_HIDE
-        subprocess.Popen(args=args, startupinfo=startupinfo)
-        time.sleep(0.5)
-        self.input_edit.SendKeys(text="{Ctrl}v", waitTime=0.2)
-        self.wx_window.SendKey(key=auto.SpecialKeyNames["ENTER"], waitTime=0.2)
+            full_paths.append(full_path)
+        with self.timing.step("file_paste"):
+            # 先清空输入框，之后输入框不为空就说明文件已经粘贴进来
+            self.input_edit.SendKeys(text="{Ctrl}a", waitTime=0)
+            self.input_edit.SendKey(key=self.backend.key("DELETE"), waitTime=0)
+            self.backend.set_clipboard_files(full_paths)
+            self.input_edit.SendKeys(text="{Ctrl}v", waitTime=0)
+            pasted = self.__wait_edit_filled(self.input_edit, True)
+        if not pasted:
+            print("粘贴文件超时：：：", full_paths)
+            self.timing.timeout("file_paste")
+            return False
 
+        if self.signals.get_flag():
+            return False
+
+        with self.timing.step("file_enter"):
+            self.wx_window.SendKey(key=self.backend.key("ENTER"), waitTime=0)
+            self.__entered = True
+            cleared = self.__wait_edit_filled(self.input_edit, False)
+        if not cleared:
+            print("等待输入框清空超时")
+            self.timing.timeout("file_enter")
+        return True
 
     @Slot()
     def print_friend_list(
-        self, tag: str = None, csvfile: str = "friends.csv", count: int = 200
+        self,
+        tag: str = None,
+        csvfile: str = "friends.csv",
+        count: int = 200,
+        resume: bool = False,
+        previous: str = None,
     ):
         """
         获取微信好友名称.
 
+        抓到一个好友就写入 csv，定期刷新文件并保存断点。
+        指定 previous 时为增量抓取：列表行没有变化的好友沿用旧 csv 中的行，不再点开详情，
+        抓取完成后生成新增、删除、变化的报告（<csvfile>_delta.csv）。
+        每一步的耗时统计写到 csv 旁边（<csvfile>.timing.json）。
+        抓到的好友同时写入联系人库（wechat.contacts），手工修改过的称谓、敬语、标志保持不变。
+
         Args:
             tag(str): 可选参数，如不指定，则获取所有好友
+            csvfile(str): 可选参数，写入的好友 csv
+            count(int): 可选参数，本次最多抓取的好友个数
+            resume(bool): 可选参数，为 True 时从上次中断的断点继续，续写断点中的 csv
+            previous(str): 可选参数，增量抓取的基准，之前抓取的好友 csv
+
+        抓到 count 个就停下时不算抓取完：保存断点，下次从断点继续；增量报告只在翻到列表末尾后生成，
+        否则没有翻到的好友会被当作已删除。
 
+        Returns:
+            dict: csvfile、grabbed（本次抓取个数）、count（文件中的好友个数）、finished（是否翻到列表末尾）、
+                  limited（是否因为达到 count 个而停下），打开通讯录管理窗口出错时返回 None
         """
 
+        checkpoint = ScrapeCheckpoint.load() if resume else None
+        if checkpoint is not None and checkpoint.tag == (tag or ""):
+            csvfile = checkpoint.csvfile
+            previous = checkpoint.previous or None
+            self.signals.statusinfo.emit(
+                "从断点继续抓取好友，已抓取" + str(checkpoint.count) + "个"
+            )
+        else:
+            checkpoint = None
+        delta = None
+        if previous:
+            try:
+                delta = FriendDelta(previous)
+            except (OSError, ValueError) as ex:
+                print("读取增量抓取的基准 csv 出错：", ex)
+                self.signals.statusinfo.emit("读取" + previous + "出错，改为全量抓取")
+                previous = None
         self.signals.statusinfo.emit("开始抓取好友，目标个数：" + str(count))
+        self.timing = StepTimer()
 
         def click_tag():
             """点击标签"""
-            contacts_management_window.ButtonControl(Name="标签").Click()
+            contacts_management_window.ButtonControl(Name="标签").Click(waitTime=0.2)
+
+        def manager_window():
+            """通讯录管理窗口弹出到前台后返回该窗口"""
+            window = self.backend.foreground_control()
+            if window.Name != "通讯录管理":
+                return None
+            return window if window.ButtonControl(Name="最大化").Exists(0, 0) else None
 
         # 点击 通讯录管理
 
-        i = count
         try:
-            self.wx_window.ButtonControl(Name="通讯录").Click()
-            self.wx_window.ListControl(Name="联系人").ButtonControl(
-                Name="通讯录管理"
-            ).Click()
-            contacts_management_window = (
-                auto.GetForegroundControl()
+            self.controls.get(
+                ("ButtonControl", "通讯录"),
+                lambda: self.wx_window.ButtonControl(Name="通讯录"),
+                name="通讯录",
+            ).Click(waitTime=0)
+            manager_button = self.__wait_control(
+                lambda: self.wx_window.ListControl(Name="联系人").ButtonControl(
+                    Name="通讯录管理"
+                )
+            )
+            if not manager_button:
+                raise LookupError("找不到通讯录管理按钮")
+            manager_button.Click(waitTime=0)
+            contacts_management_window = self.__wait_until(
+                manager_window, UI_WAIT_TIMEOUT
             )  # 切换到通讯录管理，相当于切换到弹出来的页面
+            if not contacts_management_window:
+                raise LookupError("通讯录管理窗口没有弹出")
 
-            contacts_management_window.ButtonControl(Name="最大化").Click()
+            contacts_management_window.ButtonControl(Name="最大化").Click(waitTime=0)
         except Exception as ex:
             self.signals.statusinfo.emit("自动操作出错：" + str(ex))
             return
@@ -287,8 +648,11 @@ class WxOperation(QRunnable):
         if tag:
             click_tag()  # 点击标签
             try:
-                contacts_management_window.PaneControl(Name=tag).Click()
-                time.sleep(0.3)
+                contacts_management_window.PaneControl(Name=tag).Click(waitTime=0)
+                self.__wait_until(
+                    lambda: contacts_management_window.ListControl().GetChildren(),
+                    UI_WAIT_TIMEOUT,
+                )
             except Exception as exp:
                 print("find tag ", tag, " error:", str(exp))
                 self.signals.statusinfo.emit("查找标签" + tag + "出错：" + str(exp))
@@ -298,140 +662,292 @@ class WxOperation(QRunnable):
         scroll = contacts_management_window.ListControl().GetScrollPattern()
         # assert scroll, "没有可滑动对象"
 
-        def grab_from_name_node(name_node: auto.Control, name_list: list):
+        def detail_label(label: str):
+            """详情面板中的标签文字控件，没有显示时返回 None，不等待查找超时"""
+            control = contacts_management_window.TextControl(Name=label)
+            return control if control.Exists(0, 0) else None
+
+        def row_names(name_node) -> tuple:
+            """一次读取联系人行的快照，返回 (昵称, 备注名, 标签, 行快照)"""
+            row = snapshot(name_node)
+            nick_name = row.find("TextControl").name  # 用户名
+            # 用户备注名，索引1会错位，索引2是备注名，索引3是标签名
+            remark_name = row.find("ButtonControl", found_index=2).name
+            tag_button = row.find("ButtonControl", found_index=3)
+            tags = tag_button.name if tag_button is not None else None
+            return nick_name, remark_name, tags, row
+
+        def read_page(nodes: list) -> list:
+            """读出一页所有联系人行（见 row_names），读取出错的行为 None"""
+            rows = list()
+            for node in nodes:
+                try:
+                    with self.timing.step("row"):
+                        rows.append(row_names(node))
+                except Exception as ex:
+                    print("Get entry from name node error", ex)
+                    rows.append(None)
+            return rows
+
+        def grab_from_name_node(names: tuple, seen: set, namesakes: bool):
+            """
+            抓取一个好友，每个好友只处理一次：标识已在 seen 中（本次已处理或已在 csv 中）的
+            直接跳过不点击；增量抓取时列表行没有变化的好友沿用旧行.
+
+            昵称相同又都没有备注名的好友列表行完全相同。同名的行在列表中相邻，分在两页时翻页
+            重叠的部分会让它们出现在同一页，所以只有本页中这个标识出现不止一次（namesakes）时，
+            已在 seen 中的行才点开详情，微信名也已在 seen 中才跳过，否则是另一个同名好友；
+            只是因为翻页重叠而再次出现的行直接跳过，不再点击。
+
+            Args:
+                names(tuple): row_names 读出的 (昵称, 备注名, 标签, 行快照)
+                seen(set): 已处理的标识
+                namesakes(bool): 本页中是否有多行与这一行的昵称相同且都没有备注名
+
+            Returns:
+                与表头对齐的 csv 行，跳过或出错时返回 None
+            """
             try:
-                nick_name = name_node.TextControl().Name  # 用户名
-                remark_name = name_node.ButtonControl(
-                    foundIndex=2
-                ).Name  # 用户备注名，索引1会错位，索引2是备注名，索引3是标签名
+                nick_name, remark_name, tags, row = names
+                key = fingerprint(nick_name, remark_name)
+                recheck = key in seen
+                if recheck and (remark_name or not namesakes):
+                    return None
+                seen.add(key)
+                if delta is not None and not recheck:
+                    carried = delta.carry(nick_name, remark_name, tags)
+                    if carried is not None:
+                        return carried
 
                 nm = remark_name if remark_name else nick_name
 
-                name_node.ButtonControl(Name=nm).Click(x=1, y=1)
-                time.sleep(0.2)
-                wechat_name = (
-                    contacts_management_window.TextControl(Name="微信号：")
-                    .GetNextSiblingControl()
-                    .Name
+                with self.timing.step("click"):
+                    row.find("ButtonControl", nm).control.Click(x=1, y=1, waitTime=0)
+                    # 等到详情面板显示出来
+                    wechat_label = self.__wait_until(
+                        lambda: detail_label("微信号："), UI_WAIT_TIMEOUT
+                    )
+                if not wechat_label:
+                    self.timing.timeout("click")
+                    raise LookupError(nm + " 的详情没有显示")
+                # 详情面板只遍历一次，微信号、地区、标签都从快照中读取，没有的项不必等查找超时
+                with self.timing.step("detail"):
+                    detail = snapshot(wechat_label.GetParentControl())
+                    wechat_name = detail.value_after("微信号：")
+                    location = detail.value_after("地区：")
+                    thetag = detail.value_after("标签")
+                if wechat_name is None:
+                    self.timing.miss("detail")
+                # 同名的行：没读到微信名时无法区分，按已处理跳过
+                duplicate = recheck and (
+                    not wechat_name or wechat_key(wechat_name) in seen
                 )
 
-                location = ""
-                try:
-                    # ltc = contacts_management_window.TextControl(Name='地区：')
-                    location = (
-                        contacts_management_window.TextControl(Name="地区：")
-                        .GetNextSiblingControl()
-                        .Name
-                    )
-                except LookupError:
+                if location is None:
+                    location = ""
                     print(nm, "没有地区")
 
-                thetag = ""
-                try:
-                    thetag = (
-                        contacts_management_window.TextControl(Name="标签")
-                        .GetNextSiblingControl()
-                        .Name
-                    )
-                except LookupError:
+                if thetag is None:
+                    thetag = ""
                     print(nm, "没有标签")
                 print(nm, "标签：", thetag)
 
-                name_list.append(
-                    [
-                        nick_name,
-                        remark_name,
-                        wechat_name,
-                        location,
-                        thetag,
-                        "您",
-                        "您",
-                        "Y",
-                    ]
-                )
                 print([nick_name, remark_name, wechat_name, location, thetag])
                 # print('\n')
-                auto.SendKey(auto.SpecialKeyNames["ESC"])
+                with self.timing.step("close"):
+                    self.backend.send_key(self.backend.key("ESC"), wait_time=0)
+                    # 等详情面板关闭，避免下一个联系人读到本联系人的详情
+                    closed = self.__wait_until(
+                        lambda: not detail_label("微信号："), UI_WAIT_TIMEOUT
+                    )
+                if not closed:
+                    self.timing.timeout("close")
+                if duplicate:
+                    return None
+                if wechat_name:
+                    seen.add(wechat_key(wechat_name))
+                scraped = [
+                    nick_name,
+                    remark_name,
+                    wechat_name,
+                    location,
+                    thetag,
+                    "您",
+                    "您",
+                    "Y",
+                ]
+                return delta.merge(scraped) if delta is not None else scraped
             except Exception as ex:
                 print("Get entry from name node error", ex)
+                return None
+
+        def first_row_name(nodes: list) -> str:
+            if not nodes:
+                return ""
+            nick_name, remark_name, _, _ = row_names(nodes[0])
+            return remark_name if remark_name else nick_name
+
+        friends = FriendWriter(
+            csvfile,
+            append=checkpoint is not None,
+            header=delta.header if delta is not None else None,
+        )
+        try:
+            store = ContactStore()
+        except sqlite3.Error as ex:
+            # 联系人库打不开时照常写 csv
+            print("打开联系人库失败：", ex)
+            store = None
+        nick_idx, remark_idx = friends.name_columns()
+        if checkpoint is None:
+            checkpoint = ScrapeCheckpoint(csvfile, tag or "", previous=previous or "")
+        elif scroll:
+            # 直接滚动到断点所在页，不再从头翻页
+            scroll.SetScrollPercent(-1, checkpoint.scroll_percent, waitTime=0)
+            self.__wait_until(
+                lambda: contacts_management_window.ListControl().GetChildren(),
+                UI_WAIT_TIMEOUT,
+            )
 
-        name_list = list()
-        if not scroll:
-            for (
-                name_node
-            ) in (
-                contacts_management_window.ListControl().GetChildren()
-            ):  # 获取当前页面的 列表 -> 子节点
-                grab_from_name_node(name_node, name_list)
-                i = i - 1
-                if i <= 0 or self.signals.get_flag():
-                    break
-
-        else:
-            # rate: int = int(float(102000 / num))  # 根据输入的num计算滑动的步长
-            # for pct in range(0, 102000, rate):  # range不支持float，不导入numpy库，采取迂回这的方式
-            stillpage = True
-            lastnm = ""
-            while not self.signals.get_flag() and stillpage:
-                # 每次滑动一点点，-1代表不用滑动
-                # print("pct:" , pct)
-                # scroll.SetScrollPercent(horizontalPercent=-1, verticalPercent=pct / 100000)
-                curr_page_nodes = list()
+        grabbed = 0
+        # finished：翻到了列表末尾；limited：达到本次抓取个数停下，列表还没有翻完
+        finished = False
+        limited = False
+        # 本次处理过的好友标识（包括出错的），加上 csv 中已有的，保证每个好友只处理一次
+        seen = set(friends.done)
+        pages = 0
+        last_percent = -1
+        try:
+            while not self.signals.get_flag():
                 try:
                     curr_page_nodes = (
                         contacts_management_window.ListControl().GetChildren()
-                    )
+                    )  # 获取当前页面的 列表 -> 子节点
+                    pagenm = first_row_name(curr_page_nodes)
+                    # 列表不能滚动（只有一页）时百分比为 -1
+                    page_percent = scroll.VerticalScrollPercent if scroll else -1
                 except Exception as e:
+                    # 已抓取的好友都已写入 csv，保留断点，下次可以继续
                     print("Get page node exception", e)
-                    return
-
-                for name_node in curr_page_nodes:
-                    nick_name = name_node.TextControl().Name  # 用户名
-                    remark_name = name_node.ButtonControl(
-                        foundIndex=2
-                    ).Name  # 用户备注名，索引1会错位，索引2是备注名，索引3是标签名
-                    nm = remark_name if remark_name else nick_name
-                    if nm == lastnm:
-                        stillpage = False
-                    else:
-                        lastnm = nm
-                    break
-
-                if not stillpage:
                     break
-
-                for name_node in curr_page_nodes:  # 获取当前页面的 列表 -> 子节点
-                    if self.signals.get_flag():
+                pages += 1
+
+                page_rows = read_page(curr_page_nodes)
+                # 本页中没有备注名的行按标识计数，同名的行不止一个时才需要按微信名区分
+                page_counts = Counter(
+                    fingerprint(names[0], names[1])
+                    for names in page_rows
+                    if names is not None and not names[1]
+                )
+                for names in page_rows:
+                    if not self.checkpoint():
                         break
+                    if names is None:
+                        continue
 
-                    grab_from_name_node(name_node, name_list)
-
-                    i = i - 1
-                    if i <= 0:
-                        stillpage = False
-                        self.signals.set_flag(True)
+                    row = grab_from_name_node(
+                        names, seen, page_counts[fingerprint(names[0], names[1])] > 1
+                    )
+                    if row is None:
+                        continue
+                    seen.update(friends.keys(row))
+                    grabbed += 1
+                    checkpoint.scroll_percent = page_percent
+                    checkpoint.last_name = row[remark_idx] or row[nick_idx]
+                    if store is not None:
+                        store.upsert(dict(zip(friends.header, row)))
+                    if friends.write(row):
+                        checkpoint.count = friends.count
+                        checkpoint.save()
+                        if store is not None:
+                            store.commit()
+
+                    if grabbed >= count:
+                        limited = True
+                        break
 
-                if not self.signals.get_flag():
-                    contacts_management_window.ListControl().SendKey(
-                        auto.SpecialKeyNames["PAGEDOWN"]
+                if limited or self.signals.get_flag():
+                    break
+                # 结束条件：列表不能滚动、已经滚动到底，或者滚动没有生效（百分比没有前进）
+                if page_percent < 0 or page_percent >= 100 or page_percent <= last_percent:
+                    finished = True
+                    break
+                last_percent = page_percent
+
+                with self.timing.step("page"):
+                    # 按可见范围直接滚动到下一页，一次往返，不必发送按键再等列表稳定
+                    scroll.SetScrollPercent(
+                        -1,
+                        next_page_percent(page_percent, scroll.VerticalViewSize),
+                        waitTime=0,
+                    )
+                    # 等到列表刷新（刷新过程中列表可能暂时为空）
+                    refreshed = self.__wait_until(
+                        lambda: first_row_name(
+                            contacts_management_window.ListControl().GetChildren()
+                        )
+                        not in ("", pagenm),
+                        PAGE_WAIT_TIMEOUT,
                     )
-                    time.sleep(0.2)
+                if not refreshed:
+                    self.timing.timeout("page")
+        finally:
+            friends.close()
+            if store is not None:
+                store.close()
+            if finished:
+                ScrapeCheckpoint.clear()
+            else:
+                checkpoint.count = friends.count
+                checkpoint.save()
 
         contacts_management_window.SendKey(
-            auto.SpecialKeyNames["ESC"]
+            self.backend.key("ESC")
         )  # 结束时候关闭 "通讯录管理" 窗口
-        print(len(name_list))
-        with open(csvfile, "w", newline="", encoding="utf-8-sig") as file:
-            writer = csv.writer(file)
-            writer.writerow(
-                ["昵称", "备注名", "微信名", "地区", "标签", "称谓", "敬语", "标志"]
-            )
-            writer.writerows(name_list)
+        print(friends.count, "个好友，翻页", pages, "次")
+        self.timing.print_stats()
+        self.timing.save(timing_path(csvfile))
+        if finished:
+            outcome = "抓取好友完成"
+        elif limited:
+            outcome = "已抓取到目标个数，下次可从断点继续"
+        else:
+            outcome = "抓取好友中断，下次可从断点继续"
+        self.signals.statusinfo.emit(
+            outcome
+            + "，本次抓取"
+            + str(grabbed)
+            + "个，文件中共"
+            + str(friends.count)
+            + "个"
+        )
+        if delta is not None:
+            print("增量抓取：沿用", delta.carried, "个，点开详情", delta.grabbed, "个")
+            if finished:
+                diff = diff_friends(previous, csvfile, tag)
+                write_delta_report(delta_report_path(csvfile), diff)
+                self.signals.statusinfo.emit(
+                    "增量抓取完成，新增"
+                    + str(len(diff["added"]))
+                    + "个，删除"
+                    + str(len(diff["removed"]))
+                    + "个，变化"
+                    + str(len(diff["changed"]))
+                    + "个，详见"
+                    + delta_report_path(csvfile)
+                )
+        return {
+            "csvfile": csvfile,
+            "grabbed": grabbed,
+            "count": friends.count,
+            "finished": finished,
+            "limited": limited,
+        }
 
     def get_group_chat_list(self) -> list:
         """获取群聊通讯录中的用户名称"""
         name_list = list()
-        auto.ButtonControl(Name="聊天信息").Click()
+        self.backend.root_control().ButtonControl(Name="聊天信息").Click()
         time.sleep(0.5)
         chat_members_win = self.wx_window.ListControl(Name="聊天成员")
         if not chat_members_win.Exists():
@@ -451,107 +967,85 @@ class WxOperation(QRunnable):
         Returns:
             list
         """
-        chat_records = list()
-
-        def extract_msg() -> None:
-            all_msgs = self.wx_window.ListControl(Name="消息").GetChildren()
-            for msg_node in all_msgs:
-                msg = msg_node.Name
-                if not msg:
-                    continue
-                if msg_node.PaneControl().Name:
-                    chat_records.append(
-                        {
-                            "type": "Time",
-                            "name": "System",
-                            "msg": msg_node.PaneControl().Name,
-                        }
-                    )
-                    continue
-                if "你已添加了" in msg and "现在可以开始聊天了" in msg:
-                    chat_records.append(
-                        {"type": "System", "name": "System", "msg": msg}
-                    )
-                    continue
-                if msg in [
-                    "以下为新消息",
-                    "查看更多消息",
-                    "该类型文件可能存在安全风险，建议先检查文件安全性后再打开。",
-                ]:
-                    chat_records.append(
-                        {"type": "System", "name": "System", "msg": msg}
-                    )
-                    continue
-                if "撤回了一条消息" in msg or "尝试撤回上一条消息" in msg:
-                    chat_records.append(
-                        {
-                            "type": "Other",
-                            "name": "".join(msg.split(" ")[:-1]),
-                            "msg": msg.split(" ")[-1],
-                        }
-                    )
-                    continue
-                if msg in [
-                    "发出红包，请在手机上查看",
-                    "收到红包，请在手机上查看",
-                    "你发送了一次转账收款提醒，请在手机上查看",
-                    "你收到了一次转账收款提醒，请在手机上查看",
-                ]:
-                    chat_records.append(
-                        {"type": "RedEnvelope", "name": "System", "msg": msg}
-                    )
-                    continue
-                if "领取了你的红包" in msg:
-                    _ = msg.split("领取了你的红包")
-                    chat_records.append(
-                        {"type": "RedEnvelope", "name": _[0], "msg": _[1]}
-                    )
-                    continue
-                name = msg_node.ButtonControl(foundIndex=1).Name
-                if msg == "[文件]":
-                    file_name = msg_node.PaneControl().TextControl(foundIndex=1).Name
-                    size = msg_node.PaneControl().TextControl(foundIndex=2).Name
-                    chat_records.append(
-                        {
-                            "type": "File",
-                            "name": name,
-                            "msg": f"size: {size}  ---  file_name: {file_name}",
-                        }
-                    )
-                    continue
-                if msg == "微信转账":
-                    operation = msg_node.PaneControl().TextControl(foundIndex=2).Name
-                    amount = msg_node.PaneControl().TextControl(foundIndex=3).Name
-                    chat_records.append(
-                        {
-                            "type": "RedEnvelope",
-                            "name": name,
-                            "msg": msg + f"    {operation}    " + amount,
-                        }
-                    )
-                    continue
-                if "引用" in msg and "的消息" in msg:
-                    chat_records.append({"type": "Cited", "name": name, "msg": msg})
-                    continue
-                if msg == "[聊天记录]":
-                    if not name:
-                        name = msg_node.ButtonControl(foundIndex=2).Name
-                chat_records.append({"type": "Content", "name": name, "msg": msg})
-
         for _ in range(page):
             self.wx_window.WheelUp(wheelTimes=15)
-        extract_msg()
-        return chat_records
+
+        # 每条消息只读取一次控件子树，按规则表分类，见 wechat.chat_records
+        records = list()
+        all_msgs = self.controls.get(
+            MESSAGE_LIST, lambda: self.wx_window.ListControl(Name="消息"), name="消息"
+        ).GetChildren()
+        for msg_node in all_msgs:
+            record = chat_records.classify(snapshot(msg_node))
+            if record is not None:
+                records.append(record)
+        return records
 
     
 
-    def __send_msg2(
-        self, input_name: str, wechatname: str, msg: str, mockit: bool
+    def __send_text(self, msg: str, mockit: bool) -> bool:
+        """在已经定位的聊天输入框中粘贴一段文字并回车发出；模拟时粘贴空内容"""
+        with self.timing.step("paste"):
+            self.input_edit.SendKeys(text="{Ctrl}a", waitTime=0)
+            self.input_edit.SendKey(key=self.backend.key("DELETE"), waitTime=0)
+            # self.input_edit.SendKeys(text=msg, waitTime=0.1) # 一个个字符插入,不建议使用该方法
+            # 设置到剪切板再黏贴到输入框
+            if not mockit:
+                self.backend.set_clipboard_text(text=msg)
+            else:
+                self.backend.set_clipboard_text("")
+
+            self.input_edit.SendKeys(text="{Ctrl}v", waitTime=0)
+            # 确认粘贴完成再回车
+            pasted = self.__wait_edit_filled(self.input_edit, not mockit)
+        if not pasted:
+            print("粘贴消息超时")
+            self.timing.timeout("paste")
+            return False
+
+        if self.signals.get_flag():
+            return False
+
+        with self.timing.step("enter"):
+            self.wx_window.SendKey(key=self.backend.key("ENTER"), waitTime=0)
+            self.__entered = True
+            cleared = self.__wait_edit_filled(self.input_edit, False)
+        # 输入框清空说明消息已经发出；回车已经按下，超时也不能当作发送失败，以免重复发送
+        if not cleared:
+            print("等待输入框清空超时")
+            self.timing.timeout("enter")
+        return True
+
+    def __send_payload(
+        self,
+        input_name: str,
+        payload: Payload,
+        mockit: bool,
+        resolution: ResolutionCache = None,
     ) -> bool:
+        """
+        向一个接收人发送多段消息：跳转聊天窗口、定位输入框只做一次，依次发出每段文字，
+        再把图片和文件一起粘贴发出.
+
+        Args:
+            input_name(str): 必选参数，搜索的好友名称
+            payload(Payload): 必选参数，多段消息
+            mockit(bool): 必选参数，为 True 时只模拟操作，点而不发
+            resolution(ResolutionCache): 可选参数，接收人解析缓存
+
+        Returns:
+            bool: 是否全部发出
+        """
+        # 是否已经按过回车：中途停止时据此判断有没有发出一部分
+        self.__entered = False
+        # 是否因为找不到、有重名而没有发送：与微信是否限流无关，不计入发送节奏
+        self.__missed = False
         try:
             # 如果当前面板已经是需发送好友, 则无需再次搜索跳转
-            if self.__get_current_panel_nickname() != input_name:
-                if not self.__goto_chat_box(name=input_name):
+            with self.timing.step("panel"):
+                current = self.__get_current_panel_nickname()
+            if current != input_name:
+                if not self.__goto_chat_box(name=input_name, resolution=resolution):
                     print("昵称不匹配:::", input_name)
                     return False
         except Exception as ex:
@@ -567,192 +1061,500 @@ class WxOperation(QRunnable):
         try:
             self.input_edit = None
             print("定位聊天编辑控件--->", input_name)
-            self.input_edit = self.wx_window.EditControl(Name=input_name)
+            with self.timing.step("edit"):
+                self.input_edit = self.__wait_control(
+                    lambda: self.wx_window.EditControl(Name=input_name),
+                    CHAT_EDIT,
+                    input_name,
+                )
+            if not self.input_edit:
+                self.timing.miss("edit")
+                raise LookupError("找不到聊天输入框")
         except Exception as ex:
             print("定位聊天编辑控件失败：：：", input_name, str(ex))
             return False
 
-        if self.signals.get_flag():
-            return False
-
+        sent = 0
         try:
+            for msg in payload.texts:
+                if self.signals.get_flag():
+                    return False
+                if not self.__send_text(msg, mockit):
+                    print("发送消息失败：：：", input_name, "消息（", msg, "）")
+                    return False
+                sent += 1
 
-            self.input_edit.SendKeys(text="{Ctrl}a", waitTime=0.1)
-            self.input_edit.SendKey(key=auto.SpecialKeyNames["DELETE"])
-            # self.input_edit.SendKeys(text=msg, waitTime=0.1) # 一个个字符插入,不建议使用该方法
-            # 设置到剪切板再黏贴到输入框
-            if not mockit:
-                auto.SetClipboardText(text=msg)
-            else:
-                auto.SetClipboardText("")
-
-            self.input_edit.SendKeys(text="{Ctrl}v", waitTime=0.1)
-
-            if self.signals.get_flag():
-                return False
-
-            self.wx_window.SendKey(key=auto.SpecialKeyNames["ENTER"], waitTime=0.2)
-
+            if payload.files and not mockit:
+                if self.signals.get_flag():
+                    return False
+                if not self.__send_file(*payload.files):
+                    print("发送文件失败：：：", input_name, payload.files)
+                    return False
         except Exception as ex:
-            print("发送消息失败：：：", input_name, "消息（", msg, "）", str(ex))
+            print(
+                "发送消息失败：：：",
+                input_name,
+                "已发出",
+                sent,
+                "段文字",
+                str(ex),
+            )
             return False
 
         return True
 
-    def parse_mgs(self, msg_template, title, you):
-        return msg_template.replace("{称谓}", title).replace("{敬语}", you)
+    def send_payload(self, input_name: str, payload: Payload, mockit: bool = False) -> bool:
+        """向一个接收人发送多段消息，见 __send_payload"""
+        return self.__send_payload(input_name, payload, mockit)
 
     @Slot()
-    def process_send_message(self, msg_template: str, csvfile: str, only_log: bool):
+    def process_resolve(
+        self, csvfile: str, refresh: bool = False, recipients: str = None
+    ):
+        """
+        解析联系人 csv 中的每个接收人：搜索一遍，记录能否唯一找到，不打开聊天窗口.
 
-        if not msg_template or not msg_template.strip():
-            print("Empty message, just return")
-            self.signals.statusinfo.emit("发送的消息为空")
+        结果记入接收人解析缓存，并写出解析报告（<csvfile>_resolve.csv）。
+
+        Args:
+            csvfile(str): 联系人 csv 文件
+            refresh(bool): 可选参数，为 True 时有效期内已解析为唯一的接收人也重新搜索
+            recipients(str): 可选参数，筛选条件，只解析选中的接收人，见 wechat.filters
+
+        Returns:
+            dict: 唯一、重名、找不到的接收人个数，筛选条件有问题时返回 None
+        """
+        recipients = self.make_recipient_filter(recipients, csvfile)
+        if recipients is None:
             return
+        selected = recipients.rows(csvfile)
+        self.signals.statusinfo.emit("开始解析接收人")
+        stats = plan.PlanStats()
+        # 有筛选条件时总数从已读入的表中算出；没有时不为了总数先读一遍 csv，读完才知道
+        progress = ProgressReporter(
+            self.signals.progress.emit, recipients.planned(csvfile)
+        )
+        resolved = dict()
+        searched = 0
+        with ResolutionCache() as resolution, ResolveReport(
+            resolve.report_path(csvfile)
+        ) as report:
+            for task in plan.iter_plan(csvfile, stats, selected=selected):
+                if not self.checkpoint():
+                    break
+                name = plan.target_name(task)
+                if name not in resolved:
+                    status = resolution.status(name)
+                    matches = resolution.matches(name)
+                    # 找不到和重名的接收人可能已经在微信中修正，每次都重新搜索
+                    if refresh or status != resolve.UNIQUE:
+                        try:
+                            results = self.__search_contacts(name)
+                        except Exception as ex:
+                            print("搜索接收人失败：：：", name, str(ex))
+                            results = None
+                        searched += 1
+                        if self.signals.get_flag():
+                            # 搜索中途停止，不写入报告
+                            break
+                        if results is None:
+                            # 搜索结果没有出现，不能确定是否找不到，只写入报告，不记入缓存
+                            status, matches = resolve.MISSING, 0
+                        else:
+                            status, matches = resolve.classify(
+                                name, [_name for _name, _ in results]
+                            )
+                            # 列表可能没有刷新时只写入报告，不记入缓存，发送时重新判断
+                            if not self.search_stale:
+                                resolution.record(name, status, matches)
+                    resolved[name] = (status, matches)
+                report.write(task, name, *resolved[name])
+                if resolved[name][0] == resolve.UNIQUE:
+                    progress.update(done=1)
+                else:
+                    progress.update(failed=1)
+            # 清空搜索框
+            self.wx_window.SendKey(key=self.backend.key("ESC"), waitTime=0)
+
+        if progress.total is None and not self.signals.get_flag():
+            progress.total = stats.planned
+        progress.finish()
+        counts = report.counts
+        print("解析接收人：：", counts, "搜索次数：：", searched)
+        self.signals.statusinfo.emit(
+            "解析结束，唯一"
+            + str(counts[resolve.UNIQUE])
+            + "个，重名"
+            + str(counts[resolve.AMBIGUOUS])
+            + "个，找不到"
+            + str(counts[resolve.MISSING])
+            + "个，详见"
+            + report.filename
+        )
+        return counts
 
-        msg_logs = list()
-
-        plan = []
-        # 打开CSV文件
-        with open(csvfile, mode="r", encoding="utf-8-sig") as file:
-            # 创建CSV读取器
-            csv_reader = csv.reader(file)
-            # 跳过头部
-            header = next(csv_reader)
-            #'昵称','备注名','微信名','地区','标签','称谓','敬语','标志'
-            nickname_idx = header.index("昵称") if "昵称" in header else -1
-            namecomment_idx = header.index("备注名") if "备注名" in header else -1
-            wechatname_idx = header.index("微信名") if "微信名" in header else -1
-            location_idx = header.index("地区") if "地区" in header else -1
-            tag_idx = header.index("标签") if "标签" in header else -1
-            title_idx = header.index("称谓") if "称谓" in header else -1
-            you_idx = header.index("敬语") if "敬语" in header else -1
-            mark_idx = header.index("标志") if "标志" in header else -1
-
-            # 初始化行计数器
-            row_count = 0
-            skip_count = 0
-            # 遍历CSV文件中的每一行
-            for row in csv_reader:
-                # 更新行计数器
-                row_count += 1
-                row_entry = {}
-                if mark_idx > -1 and mark_idx < len(row):
-                    # 如果标记为N，就忽略这一行
-                    if row[mark_idx] == "N":
-                        skip_count += 1
-                        print("skip:::", row)
-                        continue
-                    else:
-                        row_entry["mark"] = row[mark_idx]
+    def make_recipient_filter(self, expression: str, csvfile: str):
+        """
+        编译筛选条件，检查条件中的列都在 csv 中、名单文件都能读取.
 
-                if nickname_idx > -1 and nickname_idx < len(row):
-                    row_entry["nickname"] = row[nickname_idx]
+        Args:
+            expression(str): 筛选条件，可以为空（不筛选）
+            csvfile(str): 联系人 csv 文件
 
-                if namecomment_idx > -1 and namecomment_idx < len(row):
-                    row_entry["namecomment"] = row[namecomment_idx]
+        Returns:
+            RecipientFilter: 有问题时返回 None，原因已经显示在状态栏
+        """
+        try:
+            return compile_filter(expression, csvfile)
+        except OSError as ex:
+            print("读取筛选名单出错：", ex)
+            self.signals.statusinfo.emit("读取筛选名单出错：" + str(ex))
+        except ValueError as ex:
+            print(ex)
+            self.signals.statusinfo.emit(str(ex))
+        return None
+
+    def make_payload_builder(
+        self,
+        msg_template: str,
+        csvfile: str,
+        campaign: str = None,
+        attachments: list = None,
+    ):
+        """
+        读取活动定义、编译消息模板，并检查模板中的占位符都能在 csv 中找到.
 
-                if utils.is_empty_entry(row_entry, "nickname") and utils.is_empty_entry(
-                    row_entry, "namecomment"
-                ):
-                    skip_count += 1
-                    print("skip nameless:::", row)
-                    continue
+        Args:
+            msg_template(str): 消息模板
+            csvfile(str): 联系人 csv 文件
+            campaign(str): 可选参数，活动定义 JSON 文件
+            attachments(list): 可选参数，对所有接收人都发送的图片和文件路径
 
-                if wechatname_idx > -1 and wechatname_idx < len(row):
-                    row_entry["wechatname"] = row[wechatname_idx]
+        Returns:
+            PayloadBuilder: 有问题时返回 None，原因已经显示在状态栏
+        """
+        header = plan.read_header(csvfile)
+        try:
+            builder = PayloadBuilder(
+                msg_template,
+                header,
+                Campaign.load(campaign) if campaign else None,
+                attachments,
+                os.path.dirname(os.path.abspath(csvfile)),
+            )
+        except (OSError, ValueError) as ex:
+            print("读取活动定义出错：", ex)
+            self.signals.statusinfo.emit("读取活动定义出错：" + str(ex))
+            return None
+        if builder.is_empty():
+            print("Empty message, just return")
+            self.signals.statusinfo.emit("发送的消息为空")
+            return None
+
+        # 模板只编译一次，发送前检查占位符都能在 csv 中找到
+        unknown = builder.unknown_placeholders(header)
+        if unknown:
+            print("Unknown placeholders:", unknown)
+            self.signals.statusinfo.emit(
+                "消息模板中有csv不存在的列：" + "、".join(unknown)
+            )
+            return None
+        return builder
+
+    def iter_send_steps(
+        self,
+        builder: PayloadBuilder,
+        csvfile: str,
+        only_log: bool,
+        resume: bool = False,
+        greeting_index: GreetingIndex = None,
+        greeted_since: float = 0,
+        pacer: Pacer = None,
+        summary: plan.SendSummary = None,
+        session: str = "",
+        task_filter=None,
+        progress: ProgressReporter = None,
+        recipients: RecipientFilter = None,
+    ):
+        """
+        逐条发送的步骤.
 
-                if location_idx > -1 and location_idx < len(row):
-                    row_entry["location"] = row[location_idx]
+        生成器在每次正式发送之前 yield，由调用方按节奏等待令牌（多个窗口同时发送时还要把
+        本窗口切换到前台）之后 send(True) 发出这一条，send(False) 则停止发送。模拟发送不需要
+        等待，不会 yield。单个窗口发送见 process_send_message，多个窗口见 SessionPool。
 
-                if tag_idx > -1 and tag_idx < len(row):
-                    row_entry["tag"] = row[tag_idx]
+        Args:
+            builder(PayloadBuilder): 消息生成
+            csvfile(str): 联系人 csv 文件
+            only_log(bool): 为 True 时只模拟操作，点而不发，仅记录日志
+            resume(bool): 可选参数，为 True 时按发送流水从上次中断处继续
+            greeting_index(GreetingIndex): 可选参数，已问候索引，最近已问候过的联系人跳过
+            greeted_since(float): 可选参数，此时间之后问候过的联系人视为最近已问候
+            pacer(Pacer): 可选参数，记录每次正式发送的结果和耗时，用于自动降速
+            summary(plan.SendSummary): 可选参数，发送计数
+            session(str): 可选参数，会话标签，用于区分各个窗口的日志、流水和解析缓存
+            task_filter(Callable): 可选参数，只发送返回 True 的行，见 plan.iter_plan
+            progress(ProgressReporter): 可选参数，多个窗口同时发送时共用的进度，
+                                        默认按本次要处理的行数新建，结束时发出最终进度
+            recipients(RecipientFilter): 可选参数，编译后的筛选条件，只发送选中的行；
+                                         每个筛选条件的发送流水分开记录
+        """
+        if summary is None:
+            summary = plan.SendSummary(session)
+        selected = None
+        segment = ""
+        if recipients is not None:
+            selected = recipients.rows(csvfile)
+            segment = recipients.key
+        own_progress = progress is None
+        if own_progress:
+            # 有筛选条件时总数从已读入的表中算出；没有时不为了总数先读一遍 csv，读完才知道
+            progress = ProgressReporter(
+                self.signals.progress.emit,
+                recipients.planned(csvfile) if recipients is not None else None,
+            )
+        stats = plan.PlanStats()
+        tasks = plan.iter_plan(csvfile, stats, task_filter, selected)
+        # 本次发送的分步耗时，结束后写到发送日志旁边
+        self.timing = StepTimer()
+
+        # 逐行读取、过滤、生成消息并发送，发送结果逐行写入日志，同时实时写入发送流水
+        with plan.SendLog(plan.log_filename(only_log, session)) as send_log, SendJournal(
+            journal_path(csvfile, only_log, session, segment), resume
+        ) as journal, ResolutionCache(resolve.cache_path(session)) as resolution:
+            for task, payload in builder.build_many(tasks):
+                msg = payload.summary()
+                if not self.checkpoint():
+                    summary.stopped = True
+                    break
+                input_name = plan.target_name(task)
+                key = plan.task_key(task)
 
-                if title_idx > -1 and title_idx < len(row):
-                    row_entry["title"] = row[title_idx]
+                if key in journal.delivered:
+                    summary.resumed += 1
+                    progress.update(skipped=1)
+                    continue
+                if key in journal.uncertain:
+                    # 上次发送到一半中断，可能已经发出，不再重复发送，留给人工核对
+                    print("未确认是否已发送:::", input_name)
+                    send_log.write(task, "U", msg)
+                    progress.update(skipped=1)
+                    continue
+                if greeting_index is not None and greeting_index.greeted_since(
+                    task, greeted_since
+                ):
+                    summary.greeted += 1
+                    progress.update(skipped=1)
+                    continue
+                # 解析阶段或之前的发送已经确认找不到、有重名的接收人，不再搜索
+                status = resolution.status(input_name)
+                if status in resolve.SKIP_MARKS:
+                    print("接收人无法唯一确定:::", input_name, status)
+                    send_log.write(task, resolve.SKIP_MARKS[status], msg)
+                    summary.unresolved += 1
+                    progress.update(skipped=1)
+                    continue
 
-                if utils.is_empty_entry(row_entry, "title"):
-                    row_entry["title"] = "您"
+                if not payload:
+                    print("没有要发送的内容:::", input_name)
+                    stats.skipped += 1
+                    progress.update(skipped=1)
+                    continue
+                if payload.unknown_placeholders:
+                    print(
+                        "附加消息中有csv不存在的列:::",
+                        input_name,
+                        payload.unknown_placeholders,
+                    )
+                    journal.record(key, "E")
+                    send_log.write(task, "E", msg)
+                    summary.failed += 1
+                    progress.update(failed=1)
+                    continue
+                missing = payload.missing_files()
+                if missing:
+                    print("附件不存在:::", input_name, missing)
+                    journal.record(key, "E")
+                    send_log.write(task, "E", msg)
+                    summary.failed += 1
+                    progress.update(failed=1)
+                    continue
 
-                if you_idx > -1 and you_idx < len(row):
-                    row_entry["you"] = row[you_idx]
+                # 由调用方按节奏等待发送的令牌，等待中按了停止则不再发送
+                if not only_log and not (yield):
+                    summary.stopped = True
+                    break
+                # 等待令牌期间按了暂停，在发送之前暂停
+                if not self.checkpoint():
+                    summary.stopped = True
+                    break
 
-                if utils.is_empty_entry(row_entry, "you"):
-                    row_entry["you"] = "您"
+                journal.begin_send(key)
+                started = time.monotonic()
+                sent = self.__send_payload(input_name, payload, only_log, resolution)
+                if not sent and self.signals.get_flag():
+                    summary.stopped = True
+                    if self.__entered:
+                        # 发出了一部分，与发送中崩溃相同，留给人工核对
+                        send_log.write(task, "U", msg)
+                        summary.uncertain += 1
+                        progress.update(skipped=1)
+                    else:
+                        # 按下回车之前停止，什么也没有发出，续发时照常发送
+                        journal.record(key, CANCELLED)
+                    break
+                if pacer is not None and not only_log and not self.__missed:
+                    pacer.record(sent, time.monotonic() - started)
+                if not sent and self.__entered:
+                    # 发出了一部分后出错：流水中保留 P，续发时不再重复发送，留给人工核对
+                    print("发出一部分后出错，未确认:::", input_name)
+                    send_log.write(task, "U", msg)
+                    summary.uncertain += 1
+                    progress.update(skipped=1)
+                elif sent:
+                    journal.record(key, "D")
+                    send_log.write(task, "D", msg)
+                    if greeting_index is not None and not only_log:
+                        greeting_index.add(task)
+                    summary.succeeded += 1
+                    progress.update(done=1)
+                else:
+                    journal.record(key, "E")
+                    send_log.write(task, "E", msg)
+                    summary.failed += 1
+                    progress.update(failed=1)
+
+            if not summary.stopped:
+                journal.finish()
+
+        if own_progress:
+            if progress.total is None and not summary.stopped:
+                progress.total = stats.planned
+            progress.finish()
+
+        summary.processed += send_log.count
+        summary.skipped += stats.skipped
+        if send_log.count:
+            summary.log_files.append(send_log.filename)
+            self.timing.save(timing_path(send_log.filename))
 
-                plan.append(row_entry)
+    @Slot()
+    def process_send_message(
+        self,
+        msg_template: str,
+        csvfile: str,
+        only_log: bool,
+        resume: bool = False,
+        skip_greeted_days: float = None,
+        campaign: str = None,
+        attachments: list = None,
+        pacer: Pacer = None,
+        recipients: str = None,
+    ):
+        """
+        按联系人 csv 逐个发送消息.
 
-        print("计划处理记录条数：：", len(plan))
-        self.signals.statusinfo.emit("处理发送消息，接收人个数：" + str(len(plan)))
+        每个接收人的消息可以有多段：消息模板、活动定义中的文字和附件、csv 附加列中的文字和
+        附件、界面上添加的附件，在一次聊天窗口跳转中全部发出。
 
-        suc_count = 0
-        for task in plan:
-            if self.signals.get_flag():
-                break
-            msg = self.parse_mgs(msg_template, task["title"], task["you"])
-            input_name = (
-                task["namecomment"]
-                if not utils.is_empty_entry(task, "namecomment")
-                else task["nickname"]
-            )
+        Args:
+            msg_template(str): 消息模板
+            csvfile(str): 联系人 csv 文件
+            only_log(bool): 为 True 时只模拟操作，点而不发，仅记录日志
+            resume(bool): 为 True 时按发送流水从上次中断处继续，已发送成功的接收人直接跳过
+            skip_greeted_days(float): 可选参数，跳过最近这么多天内在历次发送中已问候过的联系人
+            campaign(str): 可选参数，活动定义 JSON 文件
+            attachments(list): 可选参数，对所有接收人都发送的图片和文件路径
+            pacer(Pacer): 可选参数，正式发送的节奏控制，默认不限速、按失败和耗时自动降速；
+                          模拟发送不限速
+            recipients(str): 可选参数，筛选条件，只发送给选中的接收人，见 wechat.filters
 
-            if self.__send_msg2(input_name, task["wechatname"], msg, only_log):
-                msg_logs.append(
-                    [
-                        task["nickname"] if "nickname" in task else "",
-                        task["namecomment"] if "namecomment" in task else "",
-                        task["wechatname"] if "wechatname" in task else "",
-                        task["location"] if "location" in task else "",
-                        task["tag"] if "tag" in task else "",
-                        task["title"] if "title" in task else "",
-                        task["you"] if "you" in task else "",
-                        "D",
-                        msg,
-                    ]
-                )
-                suc_count += 1
-                self.signals.statusinfo.emit(
-                    "处理 " + input_name + " 成功，总共成功" + str(suc_count) + "条"
-                )
-            else:
-                msg_logs.append(
-                    [
-                        task["nickname"] if "nickname" in task else "",
-                        task["namecomment"] if "namecomment" in task else "",
-                        task["wechatname"] if "wechatname" in task else "",
-                        task["location"] if "location" in task else "",
-                        task["tag"] if "tag" in task else "",
-                        task["title"] if "title" in task else "",
-                        task["you"] if "you" in task else "",
-                        "E",
-                        msg,
-                    ]
-                )
-                self.signals.statusinfo.emit(
-                    "处理 " + input_name + " 失败，总共成功" + str(suc_count) + "条"
-                )
+        Returns:
+            plan.SendSummary: 发送计数，消息模板、活动定义或筛选条件有问题时返回 None
+        """
 
-        # write logs
-        if len(msg_logs) == 0:
+        builder = self.make_payload_builder(msg_template, csvfile, campaign, attachments)
+        if builder is None:
             return
-        with open(
-            file=utils.fmtfn("_log[%Y%m%d-%H%M%S].csv"),
-            mode="w",
-            newline="",
-            encoding="utf-8-sig",
-        ) as afile:
-            writer = csv.writer(afile)
-            writer.writerow(
-                [
-                    "昵称",
-                    "备注名",
-                    "微信名",
-                    "地区",
-                    "标签",
-                    "称谓",
-                    "敬语",
-                    "标志",
-                    "已发送信息",
-                ]
-            )
-            writer.writerows(msg_logs)
+        recipients = self.make_recipient_filter(recipients, csvfile)
+        if recipients is None:
+            return
+
+        # 汇总历次发送日志，最近已问候过的联系人在搜索跳转之前就跳过
+        greeting_index = None
+        greeted_since = 0
+        if skip_greeted_days:
+            greeting_index = GreetingIndex()
+            greeting_index.refresh()
+            greeted_since = time.time() - skip_greeted_days * 86400
+
+        if pacer is None:
+            pacer = Pacer()
+
+        self.signals.statusinfo.emit("处理发送消息，开始逐条发送")
+
+        summary = plan.SendSummary()
+        steps = self.iter_send_steps(
+            builder,
+            csvfile,
+            only_log,
+            resume,
+            greeting_index,
+            greeted_since,
+            pacer,
+            summary,
+            recipients=recipients,
+        )
+        go = None
+        while True:
+            try:
+                steps.send(go)
+            except StopIteration:
+                break
+            # 按节奏等待发送的令牌，等待中按了停止则不再发送
+            go = pacer.acquire(self.signals.get_flag)
+
+        if greeting_index is not None:
+            if not only_log:
+                for logfile in summary.log_files:
+                    greeting_index.mark_ingested(logfile)
+            greeting_index.save()
+
+        print("控件缓存：：", self.cache_stats())
+        print("发送节奏：：", pacer.stats())
+        self.timing.print_stats()
+        print_summary(summary)
+        self.signals.statusinfo.emit(summary_text(summary))
+        return summary
+
+
+def print_summary(summary: plan.SendSummary) -> None:
+    """在控制台打印发送计数"""
+    print(
+        "处理记录条数：：",
+        summary.processed,
+        "跳过条数：：",
+        summary.skipped,
+        "续发跳过条数：：",
+        summary.resumed,
+        "已问候跳过条数：：",
+        summary.greeted,
+        "无法唯一确定跳过条数：：",
+        summary.unresolved,
+        "未确认条数：：",
+        summary.uncertain,
+    )
+
+
+def summary_text(summary: plan.SendSummary) -> str:
+    """发送结束时状态栏显示的内容"""
+    return (
+        "发送结束，处理"
+        + str(summary.processed)
+        + "条，成功"
+        + str(summary.succeeded)
+        + "条，跳过"
+        + str(summary.skipped_total())
+        + "条"
+        + ("，未确认" + str(summary.uncertain) + "条" if summary.uncertain else "")
+    )
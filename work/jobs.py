@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Author:       JayZ
+# Description:  后台任务：抓取好友、检查接收人、模拟发送、正式发送，各自有状态、结果和停止令牌
+
+"""
+后台任务。
+
+Worker 把每次按钮操作包装成一个 Job，放进只有一个线程的线程池里排队执行：同一时刻只有
+一个任务在操作微信，键盘、剪切板不会交错。每个任务有自己的 CancelToken，开始执行时换到
+会话的信号上，停止、暂停只影响这个任务；排队中被停止的任务不再执行。
+"""
+
+import time
+import traceback
+
+from PySide6.QtCore import QRunnable, Slot
+
+from wechat.cancel import CancelToken
+
+# 任务类型
+FETCH = "抓取好友"
+RESOLVE = "检查接收人"
+DRY_RUN = "模拟发送"
+SEND = "正式发送"
+
+# 任务状态
+QUEUED = "排队中"
+RUNNING = "执行中"
+DONE = "完成"
+STOPPED = "已停止"
+FAILED = "出错"
+CANCELLED = "已取消"
+
+
+class Job(QRunnable):
+    """
+    一个后台任务.
+
+    Args:
+        job_id(int): 任务编号
+        kind(str): 任务类型，FETCH、RESOLVE、DRY_RUN、SEND
+        operation: 执行任务的会话，WxOperation 或 SessionPool
+        fn(Callable): 会话的方法，如 operation.process_send_message
+        args(tuple): fn 的参数
+        notify(Callable): 可选参数，状态变化时调用，参数为 Job
+    """
+
+    def __init__(self, job_id: int, kind: str, operation, fn, args: tuple, notify=None):
+        super(Job, self).__init__()
+        # 任务对象由 Worker 保存，执行完不能被线程池删除
+        self.setAutoDelete(False)
+        self.job_id = job_id
+        self.kind = kind
+        self.operation = operation
+        self.fn = fn
+        self.args = args
+        self.notify = notify
+        self.token = CancelToken()
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def active(self) -> bool:
+        """排队中或执行中"""
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def text(self) -> str:
+        """状态栏显示的内容"""
+        text = "任务" + str(self.job_id) + "（" + self.kind + "）" + self.status
+        if self.status == FAILED and self.error:
+            text += "：" + self.error.strip().splitlines()[-1]
+        return text
+
+    def _set_status(self, status: str) -> None:
+        self.status = status
+        if self.notify is not None:
+            self.notify(self)
+
+    @Slot()
+    def run(self):
+        if self.token.cancelled:
+            self._set_status(CANCELLED)
+            return
+        # 本任务的停止、暂停令牌
+        self.operation.signals.token = self.token
+        self.started = time.time()
+        self._set_status(RUNNING)
+        try:
+            # 复用的会话的窗口可能已经被挡住或最小化
+            self.operation.activate()
+            self.result = self.fn(*self.args)
+        except Exception:
+            traceback.print_exc()
+            self.error = traceback.format_exc()
+            status = FAILED
+        else:
+            status = STOPPED if self.token.cancelled else DONE
+        self.finished = time.time()
+        print("任务：：", self.job_id, self.kind, status, round(self.elapsed, 2), "秒")
+        self._set_status(status)
@@ -3,21 +3,141 @@
 # Date:         2023/11/28 10:37
 # Description:
 
-from PySide6.QtCore import QObject, QThreadPool
-from wechat.wx_operation import WxOperation
+import time
 
+from PySide6.QtCore import QObject, QThreadPool, Signal
+import wechat.startup as startup
+from wechat.pacing import Pacer
+from work.jobs import DRY_RUN, FETCH, RESOLVE, RUNNING, SEND, Job
 
-class Worker(QObject):
+# 操作微信的模块（WxOperation、SessionPool 及其依赖）在第一次连接微信窗口时才导入，
+# 不拖慢界面显示
 
-    def __init__(self):
-        try:
-            self.threadpool = QThreadPool()
-            # self.wx_operation = WxOperation()
-        except AssertionError:
-            pass
 
-    def reset_WxOperation(self):
-        self.wx_operation = WxOperation()
+class Worker(QObject):
+    """
+    界面和微信操作之间的任务队列.
+
+    连接微信窗口（唤醒窗口、定位控件、读取账号）只在第一次使用或窗口关闭后才做，之后的任务
+    都复用同一个连接：多窗口发送用整个会话池，抓取、检查接收人等单窗口任务用会话池中第一个
+    窗口的会话，同一个微信窗口只有一个 WxOperation（和它的控件缓存）在操作。任务在只有一个
+    线程的线程池里按提交顺序逐个执行，两个任务不会同时操作微信。连接的状态、进度转发到
+    Worker 自己的信号上，界面只需连接一次。
+
+    Args:
+        multi_window(bool): 可选参数，同时登录了多个微信时是否连接所有窗口，按账号分片发送
+
+    Signals:
+        statusinfo(str): 状态栏消息
+        progress(Progress): 发送进度
+        job_changed(Job): 任务状态变化（排队、执行、完成、停止、出错、取消）
+    """
+
+    statusinfo = Signal(str)
+    progress = Signal(object)
+    job_changed = Signal(object)
+
+    def __init__(self, multi_window: bool = False):
+        super(Worker, self).__init__()
+        self.multi_window = multi_window
+        # 已连接的会话：多个微信窗口时为 SessionPool，否则为 WxOperation，所有任务共用
+        self.connection = None
+        # 下一个任务使用的会话，见 attach
+        self.wx_operation = None
+        self.jobs = list()
+        self.threadpool = QThreadPool()
+        # 只有一个线程：任务排队逐个执行
+        self.threadpool.setMaxThreadCount(1)
+
+    def busy(self) -> bool:
+        """有任务排队或正在执行"""
+        return any(job.active for job in self.jobs)
+
+    def current_job(self):
+        """正在执行的任务，没有时返回 None"""
+        for job in self.jobs:
+            if job.status == RUNNING:
+                return job
+        return None
+
+    def attach(self, multi_window: bool = False):
+        """
+        取得下一个任务使用的会话，没有连接或微信窗口已经关闭时重新连接.
+
+        有任务排队或正在执行时不检查窗口（不与任务同时操作微信），直接复用，新任务排在后面.
+
+        Args:
+            multi_window(bool): 可选参数，为 True 时取整个会话池（多窗口发送），
+                                否则取第一个窗口的会话
+        """
+        if self.connection is None or not (self.busy() or self.connection.is_alive()):
+            return self.reset_WxOperation(multi_window)
+        self.wx_operation = self.__select(multi_window)
+        return self.wx_operation
+
+    def reset_WxOperation(self, multi_window: bool = False):
+        """重新连接微信窗口"""
+        if self.busy():
+            raise RuntimeError("有任务正在执行，请等任务结束或停止后再重新连接")
+        started = time.perf_counter()
+        connection = self.__attach(self.multi_window)
+        startup.record("attach", time.perf_counter() - started)
+        # 每个连接只转发一次，不会因为多次点击重复转发；会话池中各个窗口共用会话池的信号
+        connection.signals.statusinfo.connect(self.statusinfo)
+        connection.signals.progress.connect(self.progress)
+        self.connection = connection
+        self.wx_operation = self.__select(multi_window)
+        return self.wx_operation
+
+    def __select(self, multi_window: bool):
+        """多窗口发送用整个会话池，其他任务用会话池中第一个窗口的会话"""
+        sessions = getattr(self.connection, "sessions", None)
+        if multi_window or sessions is None:
+            return self.connection
+        return sessions[0].operation
+
+    @staticmethod
+    def __attach(multi_window: bool):
+        """连接微信窗口"""
+        if multi_window:
+            from wechat.session_pool import SessionPool
+
+            # 同时登录了多个微信时，每个窗口一个会话，分片发送；只有一个窗口时与平常相同
+            pool = SessionPool()
+            if len(pool.sessions) > 1:
+                return pool
+            return pool.sessions[0].operation
+        from wechat.wx_operation import WxOperation
+
+        return WxOperation()
+
+    def session_labels(self) -> list:
+        """各个会话的标签，用于查找各自的发送流水；单个窗口时为 [""]"""
+        return getattr(self.wx_operation, "labels", [""])
+
+    def submit(self, kind: str, fn, *args) -> Job:
+        """
+        把会话的一个操作加入任务队列.
+
+        Args:
+            kind(str): 任务类型，见 work.jobs
+            fn(Callable): 会话的方法，任务在这个会话上执行
+            *args: fn 的参数
+
+        Returns:
+            Job: 任务，状态和结果在执行过程中更新
+        """
+        job = Job(
+            len(self.jobs) + 1, kind, fn.__self__, fn, args, self.job_changed.emit
+        )
+        waiting = sum(1 for queued in self.jobs if queued.active)
+        self.jobs.append(job)
+        self.threadpool.start(job)
+        if waiting:
+            self.statusinfo.emit(
+                job.text() + "，前面还有" + str(waiting) + "个任务"
+            )
+        return job
 
     def send_message(self, msgs, newline_msg, files, friend, add_remark_name, target):
         # 包装 wx_operation 的逻辑
@@ -26,12 +146,18 @@ class Worker(QObject):
             msgs_list = [msg for msg in msgs.split("\n")]
         if newline_msg:
             msgs_list.extend(["\n".join(newline_msg.split("\n"))])
+        from wechat.payload import Payload
+
+        payload = Payload()
+        for msg in msgs_list:
+            payload.add_text(msg)
+        for path in files or list():
+            payload.add_file(path)
         # 这里可以添加错误处理、日志记录等
         try:
-            self.wx_operation.send_msg2(friend, target, msgs=msgs_list)
+            # 所有文字和文件在一次聊天窗口跳转中发出
+            return self.__select(False).send_payload(friend, payload)
             # self.wx_operation.send_text_filetransfer('大年初一给您和家人拜年啦，祝虎年大吉，如虎添翼，诸事顺意！[福][福][福][烟花][烟花][烟花]')
-
-            return True
         except Exception as e:
             print(f"{friend}  ==> 发送消息时出现错误: {e}")
             return False
@@ -39,33 +165,82 @@ class Worker(QObject):
     # def get_tag_friend_list(self, tag: str):
     #     return self.wx_operation.get_friend_list(tag=tag)
 
-    def thread_complete(self):
-        print("THREAD COMPLETE!")
-
     # def set_message(self, text: str):
     #     self.mainwindow.statusBar().showMessage(str)
 
-    def fetch_friend_list(self, tag: str, csvfile: str, count: int):
-
-        self.wx_operation.set_command(
-            self.wx_operation.print_friend_list, tag, csvfile, count
+    def fetch_friend_list(
+        self,
+        tag: str,
+        csvfile: str,
+        count: int,
+        resume: bool = False,
+        previous: str = None,
+    ) -> Job:
+        # 抓取只操作一个窗口：会话池中第一个窗口的会话
+        return self.submit(
+            FETCH,
+            self.__select(False).print_friend_list,
+            tag,
+            csvfile,
+            count,
+            resume,
+            previous,
         )
-        self.wx_operation.signals.finished.connect(self.thread_complete)
 
-        self.threadpool.start(self.wx_operation)
-        # self.threadpool.finished.connect(self.handle_worker_finished)
+    def resolve_recipients(
+        self, csvfile: str, refresh: bool = False, recipients: str = None
+    ) -> Job:
+        return self.submit(
+            RESOLVE, self.__select(False).process_resolve, csvfile, refresh, recipients
+        )
 
     def send_out_messages_to_friends(
-        self, msg: str, csvfile: str, only_log: bool = True
-    ):
-        self.wx_operation.set_command(
-            self.wx_operation.process_send_message, msg, csvfile, only_log
+        self,
+        msg: str,
+        csvfile: str,
+        only_log: bool = True,
+        resume: bool = False,
+        skip_greeted_days: float = None,
+        campaign: str = None,
+        attachments: list = None,
+        pacer: Pacer = None,
+        recipients: str = None,
+    ) -> Job:
+        return self.submit(
+            DRY_RUN if only_log else SEND,
+            self.wx_operation.process_send_message,
+            msg,
+            csvfile,
+            only_log,
+            resume,
+            skip_greeted_days,
+            campaign,
+            attachments,
+            pacer,
+            recipients,
         )
-        self.wx_operation.signals.finished.connect(self.thread_complete)
-
-        self.threadpool.start(self.wx_operation)
 
     def set_stop_flag(self):
-        if self.wx_operation:
-            print("inform to stop~~~~~~~~~~~~~~~~~")
-            self.wx_operation.signals.set_flag(True)
+        """停止正在执行的任务，排队中的任务一并取消"""
+        print("inform to stop~~~~~~~~~~~~~~~~~")
+        for job in self.jobs:
+            if job.active:
+                job.token.cancel()
+
+    def toggle_pause(self) -> bool:
+        """
+        暂停或继续正在执行的任务：暂停后停在下一个接收人（好友）之前，继续后从那里接着处理.
+
+        Returns:
+            bool: 切换后是否处于暂停
+        """
+        job = self.current_job()
+        if job is None:
+            return False
+        paused = not job.token.paused
+        print("inform to", "pause" if paused else "resume", "~~~~~~~~~~~~~~~~~")
+        if paused:
+            job.token.pause()
+        else:
+            job.token.resume()
+        return paused